@@ -12,7 +12,7 @@ interface ContentItem {
     title?: string | null;
     url?: string | null;
     source_location: string;
-    source_type: 'youtube' | 'mp4';
+    source_type: 'youtube' | 'mp4' | 'file';
     speaker?: string | null;
     location?: string | null;
     category?: string | null; // Renamed from 'type'
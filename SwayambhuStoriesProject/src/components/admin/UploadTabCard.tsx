@@ -83,13 +83,13 @@ const UploadTabCard: React.FC = () => {
         // --- End Modified API Call ---
       } else { // uploadMode === "file"
         if (!fileInput) {
-          setBannerMessage("Please select an MP4 file.");
+          setBannerMessage("Please select an audio or video file.");
           setLoading(false);
           return;
         }
         // --- Modified API Call for File ---
         const formData = new FormData();
-        formData.append("source_type", "mp4"); // Assuming 'mp4' for file mode
+        formData.append("source_type", "file"); // Any audio or video file
         formData.append("source", fileInput); // The file itself
         // Send boolean as string 'true' or 'false' for FormData
         formData.append("generate_metadata", String(generateMetadata));
@@ -156,7 +156,7 @@ const UploadTabCard: React.FC = () => {
             onChange={() => handleModeChange("file")}
             className="form-radio h-4 w-4 text-blue-600" // Tailwind styling
           />
-          <span className="ml-2 text-gray-700">Upload MP4 File</span>
+          <span className="ml-2 text-gray-700">Upload Audio/Video File</span>
         </label>
       </div>
 
@@ -182,7 +182,7 @@ const UploadTabCard: React.FC = () => {
         {/* File Input Section */}
         <div className={uploadMode === "file" ? "" : "hidden"}> {/* Show/hide based on mode */}
           <label htmlFor="fileInput" className="block font-medium text-sm text-gray-600 mb-1"> {/* Adjusted label style */}
-            MP4 File
+            Audio or Video File
           </label>
           <input
             id="fileInput"
@@ -192,7 +192,7 @@ const UploadTabCard: React.FC = () => {
             className={`w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-md file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100 ${
                uploadMode !== "file" ? "opacity-50 cursor-not-allowed" : "cursor-pointer"
             }`}
-            accept=".mp4,video/mp4" // More specific accept attribute
+            accept="audio/*,video/*,.mp4,.mov,.mkv,.webm,.wav,.m4a,.mp3,.flac,.ogg" // Format is detected server-side by probing
             // Use a key to force re-render and allow selecting the same file after reset
             key={fileInput ? fileInput.name : 'file-input'}
           />
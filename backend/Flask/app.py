@@ -1,81 +1,132 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson.objectid import ObjectId # Needed for working with MongoDB document IDs
 import os
 import re
+import json
 import datetime
 import subprocess
-import glob
 import requests
 from datetime import datetime as dt # Keep datetime as dt for consistency
 from dotenv import load_dotenv
-import yt_dlp as youtube_dl
-from google.cloud import translate_v2 as translate
 import time
 from collections import Counter
-import traceback
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+import vad
+import pipeline
+import youtube_playlist
+import youtube_audio
+import media_tools
+import transcript_store
+import http_cache
+import response_cache
+import metrics
+import logging_setup
+import profiling
+import services
+import database
+import checkpoints
+import language_id
+import routing
+import scheduler
+import workspace
+from transcription_client import API_AUDIO_EXTENSIONS, API_MAX_UPLOAD_BYTES
+from transcription_client import get_transcription_client, TranscriptionError
 
 load_dotenv()
+logging_setup.configure()
 
 app = Flask(__name__)
 # Allow all origins for /api/* routes and support credentials
 CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
 
 # --- Constants ---
-AUDIO_DIR = "audio_files"
-TRANSCRIPTS_DIR = "transcripts"
-
+# Scratch files live in per-job workspaces under WORKSPACE_ROOT (see workspace.py)
+# Transcripts are kept in memory and stored in Mongo; set this to also keep VTT files
+TRANSCRIPT_EXPORT_DIR = os.getenv("TRANSCRIPT_EXPORT_DIR", "")
+# Uploads whose content hash matches an archived item return that item instead of being processed
+UPLOAD_DEDUP = os.getenv("UPLOAD_DEDUP", "true").lower() in ("1", "true", "yes", "on")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 # ------------------------------------------------------
-# Set up Google Translate credentials and OpenAI API key.
-try:
-    google_creds_path = os.path.expanduser(
-        # --- !!! UPDATE THIS PATH TO YOUR CREDENTIALS FILE !!! ---
-        "/Users/tuckr/APIs/Google Cloud/swayambhu-451702-e759a9ee59ab.json"
-    )
-    if not os.path.exists(google_creds_path):
-        raise FileNotFoundError(f"Google Cloud credentials not found at: {google_creds_path}")
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_creds_path
-    google_client = translate.Client()
-    print("Google Translate client initialized successfully.")
-except FileNotFoundError as e:
-    print(f"Error: {e}")
-    print("Google Translate features will be disabled.")
-    google_client = None
-except Exception as e:
-    print(f"Error initializing Google Translate client: {e}")
-    print("Google Translate features will be disabled.")
-    google_client = None
+# External services are created on first use, not at import (see services.py):
+# each gunicorn worker builds its own Mongo client after the fork and only
+# loads the Google SDK, yt-dlp or Whisper when a request needs them.
+GOOGLE_CREDENTIALS_PATH = os.path.expanduser(
+    # --- !!! UPDATE THIS PATH TO YOUR CREDENTIALS FILE !!! ---
+    "/Users/tuckr/APIs/Google Cloud/swayambhu-451702-e759a9ee59ab.json"
+)
+# Exported now, not with the client: the async service authenticates from the environment
+if not services.export_google_credentials(GOOGLE_CREDENTIALS_PATH) and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+    app.logger.warning("Google Cloud credentials not found at: %s", GOOGLE_CREDENTIALS_PATH)
+# None when unavailable: translation is skipped, the rest of the ingest still runs
+translator = services.register("google_translate",
+                               lambda: services.google_translate_client(GOOGLE_CREDENTIALS_PATH), required=False)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
-    print("Warning: OPENAI_API_KEY environment variable not set. OpenAI transcription will fail.")
+    app.logger.warning("OPENAI_API_KEY environment variable not set. OpenAI transcription will fail.")
+WHISPER_LOCAL_MODEL = os.getenv("WHISPER_LOCAL_MODEL", "base")
 # ------------------------------------------------------
 
 
 # ------------------------------------------------------
-# Connect to MongoDB using pymongo:
+# MongoDB (pymongo), connected lazily:
 mongodb_uri = os.getenv("MONGODB_URI")
 if not mongodb_uri:
-    print("Error: MONGODB_URI environment variable not set.")
-    exit(1)
-
-print(f"Attempting to connect to MongoDB at: {mongodb_uri.split('@')[-1] if '@' in mongodb_uri else mongodb_uri}")
-try:
-    client = MongoClient(mongodb_uri)
-    client.admin.command('ismaster')
-    print("MongoDB connection successful.")
-    db = client["transcript_db"]
-    collection = db["media_transcripts"]
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    exit(1)
+    app.logger.error("MONGODB_URI environment variable not set.")
+
+
+def connect_mongo():
+    if not mongodb_uri:
+        raise RuntimeError("MONGODB_URI environment variable not set.")
+    app.logger.info("Connecting to MongoDB at: %s", mongodb_uri.split('@')[-1] if '@' in mongodb_uri else mongodb_uri)
+    mongo_client = database.connect(mongodb_uri)  # Pool, timeouts and compression: see database.py
+    try:
+        transcript_store.ensure_indexes(mongo_client[database.MONGO_DB_NAME]["transcript_chunks"])
+        checkpoints.ensure_indexes(mongo_client[database.MONGO_DB_NAME][checkpoints.CHECKPOINT_COLLECTION])
+        # Upload deduplication looks documents up by the SHA-256 of their source file
+        mongo_client[database.MONGO_DB_NAME]["media_transcripts"].create_index("source_hash", sparse=True)
+    except Exception as e:
+        app.logger.warning("could not create transcript_chunks / job checkpoint / source_hash indexes: %s", e)
+    return mongo_client
+
+
+mongo = services.register("mongodb", connect_mongo, health_check=lambda c: c.admin.command("ping"))
+
+
+def media_collection():
+    return mongo.get()[database.MONGO_DB_NAME]["media_transcripts"]
+
+
+def chunks_collection():
+    """Segment/word timings, see transcript_store.py."""
+    return mongo.get()[database.MONGO_DB_NAME]["transcript_chunks"]
+
+
+def jobs_collection():
+    """Durable ingest job records, see checkpoints.py."""
+    return mongo.get()[database.MONGO_DB_NAME][checkpoints.CHECKPOINT_COLLECTION]
+
+
+# Cached search results, invalidated by bumping the collection's version on every write
+search_cache = response_cache.ResponseCache()
+CONTENT_CACHE_NAMESPACE = "media_transcripts"
 # ------------------------------------------------------
 
-# Create necessary directories if they don't exist
-os.makedirs(AUDIO_DIR, exist_ok=True)
-os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+# ffmpeg/ffprobe discovery also happens on first use (media_tools.get_toolkit)
+if services.SERVICES_EAGER:
+    # Fail fast at startup, as before lazy initialization. With gunicorn --preload this runs
+    # before the fork; services.py then has each worker build its own clients again.
+    import yt_dlp  # noqa: F401  (the downloaders import it on first use otherwise)
+    media_tools.init()
+    if "mongodb" in services.init_all() or not mongo.check():
+        app.logger.error("Error connecting to MongoDB: %s", mongo.status()["error"])
+        exit(1)
 
 # ------------------------------------------------------------
 # Define allowed search fields (matching frontend for validation)
@@ -89,6 +140,9 @@ allowed_search_fields = [
     "job_id",
     # Add more fields if needed, matching frontend searchFields
 ]
+SEARCH_PAGE_SIZE = 100
+# Fields searched case-insensitively; their queries are cached case-folded
+case_insensitive_search_fields = ['title', 'source_location', 'speaker']
 
 
 # ---------------------
@@ -103,13 +157,14 @@ def test_db_insert():
     if not data:
         return jsonify({"status": "error", "message": "No data provided"}), 400
     try:
-        result = collection.insert_one(data)
+        result = media_collection().insert_one(data)
+        search_cache.invalidate(CONTENT_CACHE_NAMESPACE)
         return jsonify({
             "status": "success",
             "inserted_id": str(result.inserted_id)
         }), 201
     except Exception as e:
-        app.logger.error(f"Database insertion failed: {e}")
+        app.logger.error("Database insertion failed: %s", e)
         return jsonify({
             "status": "error",
             "message": f"An internal server error occurred: {e}"
@@ -124,10 +179,17 @@ def search_content():
     """
     Searches for content items in the database based on a field and query.
     Supports searching by: title, source_location, keywords, speaker, job_id.
-    Returns a list of matching content items.
+    Returns a list of matching content items, SEARCH_PAGE_SIZE per ?page= (default 1).
+    Results are served from search_cache until the collection is next written.
     """
     field = request.args.get("field")
     query = request.args.get("query")
+    try:
+        page = int(request.args.get("page", 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        return jsonify({"status": "error", "message": "'page' must be a positive integer"}), 400
 
     if not field or not query:
         return jsonify({"status": "error", "message": "Missing 'field' or 'query' parameters"}), 400
@@ -143,6 +205,15 @@ def search_content():
     if not search_term:
          return jsonify({"status": "error", "message": "Search query cannot be empty"}), 400
 
+    search_started = time.perf_counter()
+    # Versioned before the query: a write while it runs leaves these results under the old version
+    cache_key = search_cache.key(CONTENT_CACHE_NAMESPACE, [
+        "search", field, search_term.casefold() if field in case_insensitive_search_fields else search_term, page])
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        metrics.SEARCH_SECONDS.observe(time.perf_counter() - search_started, field=field, cache="hit")
+        return jsonify(cached), 200
+
     try:
         if field == 'job_id':
             # Exact match for job_id
@@ -160,12 +231,14 @@ def search_content():
         # elif field == 'category':
         #      mongo_query = {field: search_term} # Exact match for category
 
-        app.logger.info(f"Executing search query: {mongo_query}")
+        app.logger.debug("Executing search query: %s", mongo_query)
 
         # Execute the query
         # Use a limit to prevent fetching too many results, can add pagination later
         # Also sort to get a consistent order, e.g., by date added descending
-        results = list(collection.find(mongo_query).sort("date_added", -1).limit(100)) # Limit to 100 results, sort by date
+        with metrics.backend_call("mongodb", "search"):
+            results = list(database.for_search(media_collection()).find(mongo_query).sort("date_added", -1)
+                           .skip((page - 1) * SEARCH_PAGE_SIZE).limit(SEARCH_PAGE_SIZE)) # One page of results, sort by date
 
         # Prepare results for JSON response
         # Convert ObjectId to string and handle potential nulls
@@ -193,13 +266,27 @@ def search_content():
             }
             content_list.append(item)
 
-        app.logger.info(f"Found {len(results)} results for query '{query}' in field '{field}'")
+        app.logger.debug("Found %s results for query '%s' in field '%s'", len(results), query, field)
+        search_cache.set(cache_key, content_list)
+        metrics.SEARCH_SECONDS.observe(time.perf_counter() - search_started, field=field, cache="miss")
         return jsonify(content_list), 200
 
     except Exception as e:
-        app.logger.error(f"Error during search: {e}\n{traceback.format_exc()}")
+        app.logger.exception("Error during search: %s", e)
         return jsonify({"status": "error", "message": "An internal server error occurred during search"}), 500
 
+
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Hit ratio and memory use of the search response cache."""
+    return jsonify(search_cache.stats()), 200
+
+
+@app.route("/api/services", methods=["GET"])
+def get_services_status():
+    """Which external clients this worker has initialized, and their last background health check."""
+    return jsonify({"services": services.status(), "mongodb_options": database.describe()}), 200
+
 # ------------------------------------------------------------
 # --- NEW ENDPOINT: Update Content ---
 # ------------------------------------------------------------
@@ -245,24 +332,28 @@ def update_content(doc_id):
     for field in non_editable_required_fields:
         if field in update_data:
             # This shouldn't happen if frontend only sends editable fields, but log if it does
-            app.logger.warning(f"Received unexpected non-editable field '{field}' in update payload for {doc_id}.")
+            app.logger.warning("Received unexpected non-editable field '%s' in update payload for %s.", field, doc_id)
             # Optionally remove it from update_data if you strictly forbid updating these
             # del update_data[field]
             # Or let $set update it if it's harmless (e.g., rewriting same value)
 
-    app.logger.info(f"Attempting to update document ID: {doc_id} with data: {update_data}")
+    # Field names only: the payload can hold whole transcripts
+    app.logger.info("Attempting to update document ID: %s (fields: %s)", doc_id, sorted(update_data))
 
     try:
         # Perform the update operation
-        result = collection.update_one({"_id": object_id}, update_document)
+        result = media_collection().update_one({"_id": object_id}, update_document)
+        if result.matched_count:
+            search_cache.invalidate(CONTENT_CACHE_NAMESPACE)
+            reindex_edited_transcripts(object_id, update_data)
 
         if result.matched_count == 0:
             return jsonify({"status": "error", "message": f"Document with ID {doc_id} not found"}), 404
         elif result.modified_count == 0:
              # Matched but not modified - data was likely identical
-             app.logger.info(f"Document ID {doc_id} matched but not modified.")
+             app.logger.info("Document ID %s matched but not modified.", doc_id)
              # Fetch and return the current document state
-             updated_doc = collection.find_one({"_id": object_id})
+             updated_doc = media_collection().find_one({"_id": object_id})
              if updated_doc:
                  # Format the document for the frontend response
                   item = {
@@ -283,13 +374,13 @@ def update_content(doc_id):
                   }
                   return jsonify(item), 200
              else:
-                  app.logger.warning(f"Document ID {doc_id} matched but not found when attempting to retrieve after no modification.")
+                  app.logger.warning("Document ID %s matched but not found when attempting to retrieve after no modification.", doc_id)
                   return jsonify({"status": "warning", "message": f"Document with ID {doc_id} matched but could not be retrieved after no modification."}), 404
 
         else: # Successfully modified (result.modified_count > 0)
-            app.logger.info(f"Document ID {doc_id} updated successfully ({result.modified_count} modified).")
+            app.logger.info("Document ID %s updated successfully (%s modified).", doc_id, result.modified_count)
             # Fetch and return the updated document to ensure frontend state is correct
-            updated_doc = collection.find_one({"_id": object_id})
+            updated_doc = media_collection().find_one({"_id": object_id})
             if updated_doc:
                  # Format the document for the frontend response
                  item = {
@@ -310,15 +401,212 @@ def update_content(doc_id):
                  }
                  return jsonify(item), 200
             else:
-                app.logger.error(f"Document ID {doc_id} modified but could not be retrieved after update.")
+                app.logger.error("Document ID %s modified but could not be retrieved after update.", doc_id)
                 return jsonify({"status": "error", "message": f"Document with ID {doc_id} updated but failed to retrieve."}), 500
 
 
     except Exception as e:
-        app.logger.error(f"Error during update for document ID {doc_id}: {e}\n{traceback.format_exc()}")
+        app.logger.exception("Error during update for document ID %s: %s", doc_id, e)
         return jsonify({"status": "error", "message": "An internal server error occurred during update"}), 500
 
 
+# ------------------------------------------------------------
+# --- Delete Content ---
+# ------------------------------------------------------------
+@app.route("/api/delete-content/<string:doc_id>", methods=["DELETE"])
+def delete_content(doc_id):
+    """Deletes a content item and its transcript timing index."""
+    try:
+        object_id = ObjectId(doc_id)
+    except Exception:
+        return jsonify({"status": "error", "message": "Invalid Document ID format"}), 400
+
+    try:
+        doc = media_collection().find_one({"_id": object_id}, {"job_id": 1})
+        if not doc:
+            return jsonify({"status": "error", "message": f"Document with ID {doc_id} not found"}), 404
+        media_collection().delete_one({"_id": object_id})
+        search_cache.invalidate(CONTENT_CACHE_NAMESPACE)
+        if doc.get("job_id"):
+            chunks_collection().delete_many({"job_id": doc["job_id"]})
+    except Exception as e:
+        app.logger.exception("Error deleting document ID %s: %s", doc_id, e)
+        return jsonify({"status": "error", "message": "An internal server error occurred during delete"}), 500
+
+    app.logger.info("Document ID %s (%s) deleted.", doc_id, doc.get('job_id'))
+    return jsonify({"status": "success", "deleted_id": doc_id, "job_id": doc.get("job_id")}), 200
+
+
+def reindex_edited_transcripts(object_id, update_data):
+    """Keeps the chunk index in step with manual edits of transcript_content (whole or per language)."""
+    edited = {}
+    for key, value in update_data.items():
+        if key == "transcript_content" and isinstance(value, dict):
+            edited.update(value)
+        elif key.startswith("transcript_content.") and isinstance(value, str):
+            edited[key.split(".", 1)[1]] = value
+    if not edited:
+        return
+    try:
+        doc = media_collection().find_one({"_id": object_id}, {"job_id": 1})
+        segments_by_lang = {
+            lang: [{"start": s["start_ms"] / 1000.0, "end": s["end_ms"] / 1000.0, "text": s["text"]}
+                   for s in transcript_store.parse_vtt(vtt_content)]
+            for lang, vtt_content in edited.items() if isinstance(vtt_content, str)
+        }
+        transcript_store.replace_languages(chunks_collection(), doc["job_id"], segments_by_lang)
+    except Exception as e:
+        app.logger.warning("Could not re-index edited transcripts of %s: %s", object_id, e)
+
+
+# ------------------------------------------------------------
+# --- Transcript time range (segments with word timings) ---
+# ------------------------------------------------------------
+@app.route("/api/transcripts/<string:job_id>/<string:lang>/range", methods=["GET"])
+def get_transcript_range(job_id, lang):
+    """
+    Returns the segments (with word-level timings, where available) of one transcript
+    overlapping [t0, t1), given in seconds. Only the stored chunks covering the window
+    are read. All returned times are integer milliseconds.
+    """
+    try:
+        t0 = float(request.args["t0"]) if request.args.get("t0") else None
+        t1 = float(request.args["t1"]) if request.args.get("t1") else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "'t0' and 't1' must be numbers of seconds"}), 400
+    if t0 is not None and t1 is not None and t1 <= t0:
+        return jsonify({"status": "error", "message": "'t1' must be greater than 't0'"}), 400
+
+    t0_ms = transcript_store.to_ms(t0) if t0 is not None else None
+    t1_ms = transcript_store.to_ms(t1) if t1 is not None else None
+    try:
+        chunks = chunks_collection()
+        segments = transcript_store.load_range(chunks, job_id, lang, t0_ms, t1_ms)
+        if not segments and not chunks.find_one({"job_id": job_id, "lang": lang}, {"_id": 1}):
+            return jsonify({"status": "error", "message": f"No timing index for job '{job_id}' in '{lang}'"}), 404
+    except Exception as e:
+        app.logger.exception("Error loading transcript range for %s/%s: %s", job_id, lang, e)
+        return jsonify({"status": "error", "message": "An internal server error occurred while loading the transcript"}), 500
+
+    return jsonify({
+        "job_id": job_id,
+        "lang": lang,
+        "t0_ms": t0_ms,
+        "t1_ms": t1_ms,
+        "segments": segments,
+    }), 200
+
+
+# ------------------------------------------------------------
+# --- Transcript rendering (VTT / SRT / JSON, cacheable) ---
+# ------------------------------------------------------------
+TRANSCRIPT_FORMATS = {
+    "vtt": "text/vtt; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "json": "application/json",
+}
+
+
+def parse_transcript_slice(args):
+    """
+    Reads t0/t1 (seconds) and from_segment/to_segment (0-based, to exclusive) from the
+    query string. Returns (t0_ms, t1_ms, first_segment, last_segment); raises ValueError.
+    """
+    try:
+        t0 = float(args["t0"]) if args.get("t0") else None
+        t1 = float(args["t1"]) if args.get("t1") else None
+    except ValueError:
+        raise ValueError("'t0' and 't1' must be numbers of seconds")
+    if t0 is not None and t1 is not None and t1 <= t0:
+        raise ValueError("'t1' must be greater than 't0'")
+    try:
+        first = int(args["from_segment"]) if args.get("from_segment") else None
+        last = int(args["to_segment"]) if args.get("to_segment") else None
+    except ValueError:
+        raise ValueError("'from_segment' and 'to_segment' must be integers")
+    if (first is not None and first < 0) or (last is not None and last < 0):
+        raise ValueError("Segment numbers must not be negative")
+    if first is not None and last is not None and last <= first:
+        raise ValueError("'to_segment' must be greater than 'from_segment'")
+    t0_ms = transcript_store.to_ms(t0) if t0 is not None else None
+    t1_ms = transcript_store.to_ms(t1) if t1 is not None else None
+    return t0_ms, t1_ms, first, last
+
+
+def load_transcript_segments(job_id, lang, t0_ms, t1_ms, first, last):
+    """Segments from the chunk index, or parsed from the stored VTT for older documents. None if absent."""
+    chunks = chunks_collection()
+    segments = transcript_store.load_range(chunks, job_id, lang, t0_ms, t1_ms, first, last)
+    if segments or chunks.find_one({"job_id": job_id, "lang": lang}, {"_id": 1}):
+        return segments
+    doc = media_collection().find_one({"job_id": job_id}, {f"transcript_content.{lang}": 1})
+    vtt_content = ((doc or {}).get("transcript_content") or {}).get(lang)
+    if not vtt_content:
+        return None
+    return transcript_store.filter_segments(transcript_store.parse_vtt(vtt_content), t0_ms, t1_ms, first, last)
+
+
+@app.route("/api/transcripts/<string:job_id>/<string:lang>", methods=["GET"])
+def get_transcript(job_id, lang):
+    """
+    Renders one transcript as ?format=vtt|srt|json (default vtt), optionally limited to
+    [t0, t1) seconds and/or segments [from_segment, to_segment). Responses carry a strong
+    ETag derived from the document's last_updated, so a revalidation is answered with 304
+    before the transcript is read. Large bodies are compressed (br/gzip).
+    """
+    output_format = (request.args.get("format") or "vtt").lower()
+    if output_format not in TRANSCRIPT_FORMATS:
+        return jsonify({"status": "error", "message": f"'format' must be one of {sorted(TRANSCRIPT_FORMATS)}"}), 400
+    try:
+        t0_ms, t1_ms, first, last = parse_transcript_slice(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        meta = media_collection().find_one({"job_id": job_id}, {"last_updated": 1})
+    except Exception as e:
+        app.logger.exception("Error loading transcript metadata for %s: %s", job_id, e)
+        return jsonify({"status": "error", "message": "An internal server error occurred while loading the transcript"}), 500
+    if not meta:
+        return jsonify({"status": "error", "message": f"No document with job_id '{job_id}'"}), 404
+
+    last_updated = meta.get("last_updated")
+    version = last_updated.isoformat() if isinstance(last_updated, datetime.datetime) else str(last_updated)
+    encoding = http_cache.choose_encoding(request.headers.get("Accept-Encoding"))
+    etag = http_cache.strong_etag(job_id, lang, version, output_format, t0_ms, t1_ms, first, last, encoding)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if http_cache.etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status=304, headers=headers)
+
+    try:
+        segments = load_transcript_segments(job_id, lang, t0_ms, t1_ms, first, last)
+    except Exception as e:
+        app.logger.exception("Error loading transcript %s/%s: %s", job_id, lang, e)
+        return jsonify({"status": "error", "message": "An internal server error occurred while loading the transcript"}), 500
+    if segments is None:
+        return jsonify({"status": "error", "message": f"No '{lang}' transcript for job '{job_id}'"}), 404
+
+    if output_format == "vtt":
+        body = transcript_store.render_vtt(segments)
+    elif output_format == "srt":
+        body = transcript_store.render_srt(segments)
+    else:
+        body = json.dumps({
+            "job_id": job_id,
+            "lang": lang,
+            "t0_ms": t0_ms,
+            "t1_ms": t1_ms,
+            "from_segment": first,
+            "to_segment": last,
+            "segments": segments,
+        }, ensure_ascii=False)
+
+    payload, applied = http_cache.encode_body(body, encoding)
+    if applied != "identity":
+        headers["Content-Encoding"] = applied
+    return Response(payload, status=200, headers=headers, content_type=TRANSCRIPT_FORMATS[output_format])
+
+
 # ---------------------
 # Helper Functions (from part 1 and 2)
 # ---------------------
@@ -336,6 +624,61 @@ def format_vtt_timestamp(seconds):
     millisecs = int((seconds % 1) * 1000)
     return f"{hours:02}:{minutes:02}:{secs:02}.{millisecs:03}"
 
+def render_vtt(segments):
+    """Renders transcription segments as a VTT string; returns None if no segment has timestamps and text."""
+    vtt_lines = ["WEBVTT", ""]
+    skipped = []
+    for index, segment in enumerate(segments):
+        start_sec = segment.get("start")
+        end_sec = segment.get("end")
+        text = segment.get("text", "").strip()
+        if start_sec is not None and end_sec is not None and text:
+            start_time = format_vtt_timestamp(start_sec)
+            end_time = format_vtt_timestamp(end_sec)
+            vtt_lines.extend([f"{start_time} --> {end_time}", text, ""])
+        else:
+            skipped.append(index)
+    if skipped:
+        # One line per transcript, not per segment
+        app.logger.warning("Skipped %d of %d segments with missing timestamp or text (first indices: %s)",
+                           len(skipped), len(segments), skipped[:5])
+    if len(vtt_lines) <= 2:
+        return None
+    return "\n".join(vtt_lines)
+
+def render_translated_vtt(segments, translated_texts):
+    """
+    Renders a translated VTT string, pairing each non-empty source segment with the next
+    translated text. Returns None if no segment has timestamps.
+    """
+    vtt_lines = ["WEBVTT", ""]
+    missing = []
+    for segment in transcript_store.pair_translations(segments, translated_texts):
+        start_time = format_vtt_timestamp(segment["start"])
+        end_time = format_vtt_timestamp(segment["end"])
+        if segment["text"] is None:
+            missing.append(start_time)
+            vtt_lines.extend([f"{start_time} --> {end_time}", "[Translation Failed]", ""])
+        else:
+            vtt_lines.extend([f"{start_time} --> {end_time}", segment["text"], ""])
+    if missing:
+        app.logger.warning("Missing translation for %d segments (first at %s)", len(missing), missing[0])
+
+    if len(vtt_lines) <= 2:
+        return None
+    return "\n".join(vtt_lines)
+
+def standardize_language(detected_lang):
+    """Maps Whisper's language names/codes onto the codes used as transcript_content keys."""
+    lang_standardization_map = {'english': 'en', 'en': 'en', 'nepali': 'ne', 'ne': 'ne'}
+    return lang_standardization_map.get(detected_lang.lower(), detected_lang.lower())
+
+def translation_targets(standardized_lang):
+    """Languages a transcript in standardized_lang should be translated into."""
+    if standardized_lang == 'en': return ['ne']
+    if standardized_lang == 'ne': return ['en']
+    return ['en', 'ne']
+
 def sanitize_filename(name):
     """Removes or replaces characters unsafe for filenames."""
     if not name:
@@ -356,17 +699,21 @@ def safe_delete(file_path):
     try:
         if file_path and os.path.exists(file_path):
             os.remove(file_path)
-            print(f"Cleaned up: {file_path}")
+            app.logger.info("Cleaned up: %s", file_path)
     except OSError as e:
-        print(f"Error deleting file {file_path}: {e.strerror}")
+        app.logger.error("Error deleting file %s: %s", file_path, e.strerror)
     except Exception as e:
-        print(f"Unexpected error deleting file {file_path}: {e}")
+        app.logger.error("Unexpected error deleting file %s: %s", file_path, e)
 
 # ---------------------
 # MEDIA PROCESSING FUNCTIONS (from part 1)
 # ---------------------
-def extract_audio_from_video(input_path, output_dir=AUDIO_DIR):
-    """Extracts audio from a video file using ffmpeg."""
+def extract_audio_from_video(input_path, output_dir):
+    """
+    Extracts the audio of a media file with ffmpeg as compact speech audio for the API:
+    mono 16 kHz MP3 at the speech cut's bitrate (vad.VAD_AUDIO_BITRATE), which is what
+    Whisper resamples to anyway.
+    """
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input video file not found: {input_path}")
 
@@ -377,97 +724,58 @@ def extract_audio_from_video(input_path, output_dir=AUDIO_DIR):
     output_audio_path = os.path.join(output_dir, output_audio_filename)
 
     command = [
-        "ffmpeg", "-i", input_path, "-vn", "-acodec", "mp3",
-        "-ar", "44100", "-ac", "2", "-loglevel", "error", output_audio_path
+        media_tools.ffmpeg_bin(), "-i", input_path, "-vn", "-acodec", "mp3",
+        "-ar", "16000", "-ac", "1", "-b:a", vad.VAD_AUDIO_BITRATE, "-loglevel", "error", output_audio_path
     ]
     try:
         process = subprocess.run(command, check=True, capture_output=True, text=True)
-        print(f"Audio extracted successfully to: {output_audio_path}")
+        app.logger.info("Audio extracted successfully to: %s", output_audio_path)
         return output_audio_path
     except FileNotFoundError:
-        print("Error: 'ffmpeg' command not found. Install ffmpeg and ensure it's in PATH.")
+        app.logger.error("'ffmpeg' command not found. Install ffmpeg and ensure it's in PATH.")
         raise
     except subprocess.CalledProcessError as e:
-        print(f"ffmpeg error during audio extraction: {e.stderr}")
+        app.logger.error("ffmpeg error during audio extraction: %s", e.stderr)
         safe_delete(output_audio_path)
         raise RuntimeError(f"ffmpeg failed: {e.stderr}") from e
 
-def download_youtube_audio(url, output_dir=AUDIO_DIR):
+def download_youtube_audio(url, output_dir):
     """Downloads audio from a YouTube URL using yt-dlp."""
     timestamp = get_timestamp() # Re-generate timestamp here
-    temp_output_template = os.path.join(output_dir, f"youtube_download_{timestamp}.%(ext)s")
-
-    ffmpeg_location = None
-    try:
-        result = subprocess.run(['which', 'ffmpeg'], capture_output=True, text=True, check=False)
-        if result.returncode == 0:
-            ffmpeg_location = result.stdout.strip()
-            print(f"Found ffmpeg at: {ffmpeg_location}")
-        else:
-             brew_path = '/opt/homebrew/bin/ffmpeg' # Common path on macOS Homebrew
-             if os.path.exists(brew_path):
-                 ffmpeg_location = brew_path
-                 print(f"Using ffmpeg at: {ffmpeg_location}")
-    except FileNotFoundError:
-        pass
+    # The video id keeps concurrent downloads (playlist entries) started in the same second apart
+    temp_output_template = os.path.join(output_dir, f"youtube_download_{timestamp}_%(id)s.%(ext)s")
 
+    ffmpeg_location = media_tools.get_toolkit().ffmpeg
     if not ffmpeg_location:
-        print("Warning: ffmpeg location not found automatically. Ensure it's installed and in PATH or set 'ffmpeg_location' manually in download_youtube_audio.")
-
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': temp_output_template,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'noplaylist': True,
-        'quiet': False,
-        'no_warnings': True,
-        'restrictfilenames': True,
-        'writethumbnail': False,
-        'keepvideo': False,
-    }
-    if ffmpeg_location:
-        ydl_opts['ffmpeg_location'] = ffmpeg_location
+        app.logger.warning("ffmpeg not found. Install it or set FFMPEG_BIN; remuxing downloads will fail.")
 
     downloaded_file_path = None
     final_audio_path = None
     source_title_base = None
 
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            print(f"Starting YouTube download for: {url}")
-            info = ydl.extract_info(url, download=True)
-
-            downloaded_audio_search_pattern = os.path.join(output_dir, f"youtube_download_{timestamp}.mp3")
-            matching_files = glob.glob(downloaded_audio_search_pattern)
-
-            if not matching_files:
-                 raise FileNotFoundError(f"Could not find downloaded MP3 matching pattern: '{downloaded_audio_search_pattern}'. Check yt-dlp output.")
-            elif len(matching_files) > 1:
-                print(f"Warning: Multiple files match {downloaded_audio_search_pattern}. Using first: {matching_files[0]}")
-                downloaded_file_path = matching_files[0]
-            else:
-                downloaded_file_path = matching_files[0]
+        app.logger.info("Starting YouTube download for: %s", url)
+        # Keeps the native audio container (m4a/webm) unless YOUTUBE_AUDIO_MODE=mp3
+        with metrics.backend_call("youtube", "download"):
+            downloaded_file_path, info = youtube_audio.download_audio(url, temp_output_template, ffmpeg_location)
+
+        downloaded_title = info.get('title', 'youtube_audio')
+        source_title_base = sanitize_filename(downloaded_title)
+        extension = os.path.splitext(downloaded_file_path)[1]
+        final_audio_filename = f"{source_title_base}_{info.get('id')}_{timestamp}{extension}"
+        final_audio_path = os.path.join(output_dir, final_audio_filename)
+
+        os.rename(downloaded_file_path, final_audio_path)
+        app.logger.info("YouTube audio downloaded and renamed to: %s", final_audio_path)
+        app.logger.info("Base name for VTT: %s", source_title_base)
+        return final_audio_path, source_title_base
 
-            downloaded_title = info.get('title', 'youtube_audio')
-            source_title_base = sanitize_filename(downloaded_title)
-            final_audio_filename = f"{source_title_base}_{timestamp}.mp3"
-            final_audio_path = os.path.join(output_dir, final_audio_filename)
-
-            os.rename(downloaded_file_path, final_audio_path)
-            print(f"YouTube audio downloaded and renamed to: {final_audio_path}")
-            print(f"Base name for VTT: {source_title_base}")
-            return final_audio_path, source_title_base
-
-    except youtube_dl.utils.DownloadError as e:
-        print(f"yt-dlp download error: {e}")
-        safe_delete(downloaded_file_path)
-        raise RuntimeError(f"Failed to download/process YouTube URL: {url}") from e
     except Exception as e:
-        print(f"An unexpected error occurred during YouTube download: {e}")
+        if services.is_download_error(e):
+            app.logger.error("yt-dlp download error: %s", e)
+            safe_delete(downloaded_file_path)
+            raise RuntimeError(f"Failed to download/process YouTube URL: {url}") from e
+        app.logger.error("An unexpected error occurred during YouTube download: %s", e)
         safe_delete(downloaded_file_path)
         safe_delete(final_audio_path)
         raise
@@ -476,8 +784,17 @@ def download_youtube_audio(url, output_dir=AUDIO_DIR):
 # ---------------------
 # TRANSCRIPTION FUNCTIONS (from part 1)
 # ---------------------
-def transcribe_audio(audio_path, transcript_output_path, local=False):
-    """Transcribes audio using OpenAI Whisper (API or local), saves VTT."""
+def transcribe_audio(audio_path, transcript_output_path=None, local=False, speech_regions=None,
+                     language=None, model_name=None):
+    """
+    Transcribes audio using OpenAI Whisper (API or local) and renders it as VTT in memory.
+    Returns (segments, detected_language, vtt_content); (None, None, None) on failure.
+    language forces the spoken language (else Whisper detects it); model_name picks the
+    local model (default WHISPER_LOCAL_MODEL).
+    If speech_regions is given, audio_path is a VAD-cut file and segment times are
+    mapped back onto the original timeline before rendering. The VTT is also written to
+    transcript_output_path when one is given (export).
+    """
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found for transcription: {audio_path}")
 
@@ -487,24 +804,24 @@ def transcribe_audio(audio_path, transcript_output_path, local=False):
     if local:
         try:
             try:
-                import whisper
-            except ImportError:
-                print("Error: 'openai-whisper' library not installed. Cannot perform local transcription.")
-                print("Install it via pip: pip install -U openai-whisper")
-                return None, None
-
-            print("Loading local Whisper model (using 'base', consider size vs performance)...")
-            model = whisper.load_model("base") # Model size can be configurable
-            print("Starting local transcription...")
-            result = model.transcribe(audio_path, word_timestamps=True, verbose=False)
-            print("Local transcription finished.")
+                # Loaded once per worker, on the first local transcription
+                model = services.whisper_model(model_name or WHISPER_LOCAL_MODEL)
+            except services.ServiceUnavailable as e:
+                app.logger.error("%s. Is 'openai-whisper' installed? (pip install -U openai-whisper)", e)
+                return None, None, None
+
+            app.logger.info("Starting local transcription...")
+            with metrics.backend_call("whisper_local", "transcribe"):
+                result = model.transcribe(audio_path, language=language, word_timestamps=True, verbose=False)
+            app.logger.info("Local transcription finished.")
 
             detected_language = result.get("language", "unknown")
             segments = result.get("segments", [])
 
             if not segments:
-                print("Warning: Local Whisper transcription returned no segments.")
-                return [], detected_language
+                app.logger.warning("Local Whisper transcription returned no segments.")
+                return [], detected_language, None
+            vad.remap_segments(segments, speech_regions)
 
             vtt_lines = ["WEBVTT", ""]
             for segment in segments:
@@ -512,168 +829,127 @@ def transcribe_audio(audio_path, transcript_output_path, local=False):
                 end_time = format_vtt_timestamp(segment["end"])
                 text = segment["text"].strip()
                 vtt_lines.extend([f"{start_time} --> {end_time}", text, ""])
-
-            with open(transcript_output_path, "w", encoding="utf-8") as file:
-                file.write("\n".join(vtt_lines))
-            print(f"Local transcription saved to: {transcript_output_path}")
+            vtt_content = "\n".join(vtt_lines)
 
         except Exception as e:
-            print(f"Local Whisper transcription error: {e}")
-            safe_delete(transcript_output_path)
-            return None, None
+            app.logger.error("Local Whisper transcription error: %s", e)
+            return None, None, None
     else:
         # --- OpenAI API Whisper Transcription ---
         if not OPENAI_API_KEY:
-            print("Error: OPENAI_API_KEY not set. Cannot use OpenAI API.")
-            return None, None
+            app.logger.error("OPENAI_API_KEY not set. Cannot use OpenAI API.")
+            return None, None, None
 
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
-        data = {
-            "model": "whisper-1", "response_format": "verbose_json",
-            "timestamp_granularities[]": "segment"
-        }
-        files = {}
         try:
             file_size = os.path.getsize(audio_path)
-            max_size = 25 * 1024 * 1024 # 25 MB limit
+            max_size = API_MAX_UPLOAD_BYTES
             if file_size > max_size:
-                 print(f"Error: Audio file size ({file_size / (1024*1024):.2f} MB) exceeds OpenAI 25MB limit.")
-                 return None, None
-
-            print(f"Starting OpenAI API transcription for {os.path.basename(audio_path)}...")
-            with open(audio_path, "rb") as audio_file:
-                files["file"] = (os.path.basename(audio_path), audio_file)
-                response = requests.post(
-                    "https://api.openai.com/v1/audio/transcriptions",
-                    headers=headers, files=files, data=data, timeout=600
-                )
-            print(f"OpenAI API response status: {response.status_code}")
-
-            if response.status_code == 200:
-                result = response.json()
+                 app.logger.error("Audio file size (%.2f MB) exceeds OpenAI 25MB limit.", file_size / (1024*1024))
+                 return None, None, None
+
+            app.logger.info("Starting OpenAI API transcription for %s...", os.path.basename(audio_path))
+            # Pooled session with retry/backoff on 429/5xx and per-key concurrency limits
+            with metrics.backend_call("openai", "transcribe"):
+                result = get_transcription_client(OPENAI_API_KEY).transcribe(
+                    audio_path, language=language, timestamp_granularities=("segment", "word"))
+            app.logger.info("OpenAI API transcription response received.")
+
+            if result:
                 detected_language = result.get("language", "unknown").lower()
                 segments = result.get("segments", [])
 
                 if not segments:
-                     print("Warning: OpenAI API transcription returned no segments.")
-                     safe_delete(transcript_output_path)
-                     return [], detected_language
-
-                vtt_lines = ["WEBVTT", ""]
-                for segment in segments:
-                    start_sec = segment.get("start")
-                    end_sec = segment.get("end")
-                    text = segment.get("text", "").strip()
-                    if start_sec is not None and end_sec is not None and text:
-                        start_time = format_vtt_timestamp(start_sec)
-                        end_time = format_vtt_timestamp(end_sec)
-                        vtt_lines.extend([f"{start_time} --> {end_time}", text, ""])
-                    else:
-                        print(f"Warning: Skipping segment with missing timestamp or text: {segment}")
-
-                if len(vtt_lines) <= 2:
-                    print("Warning: No valid segments with timestamps found after processing.")
-                    safe_delete(transcript_output_path)
-                    return [], detected_language
-
-                with open(transcript_output_path, "w", encoding="utf-8") as file:
-                    file.write("\n".join(vtt_lines))
-                print(f"API transcription saved to: {transcript_output_path}")
+                     app.logger.warning("OpenAI API transcription returned no segments.")
+                     return [], detected_language, None
+                # Word timings come back as one flat list; keep them with their segments
+                transcript_store.attach_words(segments, result.get("words"))
+                vad.remap_segments(segments, speech_regions)
+
+                vtt_content = render_vtt(segments)
+                if vtt_content is None:
+                    app.logger.warning("No valid segments with timestamps found after processing.")
+                    return [], detected_language, None
 
             else:
-                error_details = response.text
-                print(f"OpenAI API Error: {response.status_code} - {error_details}")
-                safe_delete(transcript_output_path)
-                return None, None
+                app.logger.error("OpenAI API Error: empty response body.")
+                return None, None, None
 
+        except TranscriptionError as e:
+            app.logger.error("%s", e)
+            return None, None, None
         except requests.exceptions.Timeout:
-             print(f"Network Timeout during OpenAI API request after 600 seconds.")
-             safe_delete(transcript_output_path)
-             return None, None
+             app.logger.error("Network Timeout during OpenAI API request (retries exhausted).")
+             return None, None, None
         except requests.exceptions.RequestException as e:
-            print(f"Network error during OpenAI API request: {e}")
-            safe_delete(transcript_output_path)
-            return None, None
+            app.logger.error("Network error during OpenAI API request: %s", e)
+            return None, None, None
         except Exception as e:
-            print(f"Error during OpenAI API transcription processing: {e}")
-            safe_delete(transcript_output_path)
-            return None, None
+            app.logger.error("Error during OpenAI API transcription processing: %s", e)
+            return None, None, None
 
-    return segments, detected_language
+    if transcript_output_path:
+        write_vtt_file(transcript_output_path, vtt_content)
+    return segments, detected_language, vtt_content
+
+
+def write_vtt_file(path, vtt_content):
+    """Writes rendered VTT to disk (CLI/export only; ingest keeps transcripts in memory)."""
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(vtt_content)
+    app.logger.info("Transcript saved to: %s", path)
 
 # ---------------------
 # TRANSLATION FUNCTIONS (from part 1)
 # ---------------------
-def translate_vtt_segments(segments, target_lang, base_vtt_filename, output_dir=TRANSCRIPTS_DIR):
-    """Translates VTT segments using Google Translate and saves a new VTT file."""
+def translate_vtt_segments(segments, target_lang, output_path=None):
+    """
+    Translates VTT segments using Google Translate and renders the translated VTT in memory.
+    Returns (vtt_content, translated_texts), or (None, None) on failure. The VTT is also
+    written to output_path when one is given (export).
+    """
+    google_client = translator.get()
     if not google_client:
-        print("Error: Google Translate client not available. Skipping translation.")
-        return None
+        app.logger.error("Google Translate client not available. Skipping translation.")
+        return None, None
 
     if not segments:
-        print("Warning: No segments provided for translation. Skipping.")
-        return None
+        app.logger.warning("No segments provided for translation. Skipping.")
+        return None, None
 
     texts_to_translate = [segment["text"].strip() for segment in segments if segment.get("text", "").strip()]
 
     if not texts_to_translate:
-        print("Warning: No actual text found in segments to translate.")
-        return None
+        app.logger.warning("No actual text found in segments to translate.")
+        return None, None
 
     translated_texts = []
     try:
-        print(f"Attempting translation of {len(texts_to_translate)} non-empty segments to '{target_lang}'...")
-        results = google_client.translate(texts_to_translate, target_language=target_lang)
+        app.logger.info("Attempting translation of %s non-empty segments to '%s'...", len(texts_to_translate), target_lang)
+        metrics.TRANSLATED_CHARS.inc(sum(len(text) for text in texts_to_translate), target_lang=target_lang)
+        with metrics.backend_call("google_translate", "translate"):
+            results = google_client.translate(texts_to_translate, target_language=target_lang)
         translated_texts = [result['translatedText'] for result in results]
-        print("Translation successful.")
+        app.logger.info("Translation successful.")
     except Exception as e:
-        print(f"Error during Google Translate API call: {e}")
-        return None
+        app.logger.error("Error during Google Translate API call: %s", e)
+        return None, None
 
     if len(translated_texts) != len(texts_to_translate):
-         print(f"Warning: Mismatch in count between non-empty original segments ({len(texts_to_translate)}) and translated texts ({len(translated_texts)}). This might indicate partial failure.")
-
+         app.logger.warning("Mismatch in count between non-empty original segments (%s) and translated texts (%s). "
+                            "This might indicate partial failure.", len(texts_to_translate), len(translated_texts))
 
-    translated_vtt_filename = f"{base_vtt_filename}_transcription_{target_lang}.vtt"
-    translated_vtt_path = os.path.join(output_dir, translated_vtt_filename)
 
-    vtt_lines = ["WEBVTT", ""]
-    translation_idx = 0
-    for segment in segments:
-        start_sec = segment.get("start")
-        end_sec = segment.get("end")
-        original_text = segment.get("text", "").strip()
-
-        if start_sec is None or end_sec is None:
-            continue
-
-        start_time = format_vtt_timestamp(start_sec)
-        end_time = format_vtt_timestamp(end_sec)
-
-        if original_text:
-            if translation_idx < len(translated_texts):
-                translated_text = translated_texts[translation_idx]
-                vtt_lines.extend([f"{start_time} --> {end_time}", translated_text, ""])
-                translation_idx += 1
-            else:
-                print(f"Warning: Missing translation for segment (originally '{original_text[:30]}...'): {start_time} --> {end_time}")
-                vtt_lines.extend([f"{start_time} --> {end_time}", "[Translation Failed]", ""])
-        else:
-             vtt_lines.extend([f"{start_time} --> {end_time}", "", ""])
-
-
-    if len(vtt_lines) <= 2:
-        print(f"Warning: No valid translated segments generated for {target_lang}. Skipping file write.")
-        return None
+    vtt_content = render_translated_vtt(segments, translated_texts)
+    if vtt_content is None:
+        app.logger.warning("No valid translated segments generated for %s.", target_lang)
+        return None, None
 
-    try:
-        with open(translated_vtt_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(vtt_lines))
-        print(f"Generated translation VTT: {translated_vtt_path}")
-        return translated_vtt_path
-    except IOError as e:
-        print(f"Error writing translated VTT file {translated_vtt_path}: {e}")
-        return None
+    if output_path:
+        try:
+            write_vtt_file(output_path, vtt_content)
+        except IOError as e:
+            app.logger.error("Error writing translated VTT file %s: %s", output_path, e)
+    return vtt_content, translated_texts
 
 
 # ------------------------------------------------------------
@@ -727,7 +1003,7 @@ def extract_keywords_from_text(text, num_keywords=10):
         common_keywords = [word for word, freq in word_freq.most_common(num_keywords)]
         return common_keywords
     except Exception as e:
-         print(f"Error during keyword extraction: {e}")
+         app.logger.error("Error during keyword extraction: %s", e)
          return []
 
 
@@ -739,10 +1015,10 @@ def generate_and_populate_metadata(doc_data):
     Extracts text from VTT, generates keywords, and potentially other metadata,
     updating the provided doc_data dictionary IN PLACE.
     """
-    print(f"--- Running automatic metadata generation for job: {doc_data.get('job_id')} ---")
+    app.logger.info("--- Running automatic metadata generation for job: %s ---", doc_data.get('job_id'))
     job_id = doc_data.get("job_id")
     if not job_id:
-        print("Warning: Cannot generate metadata without job_id in doc_data.")
+        app.logger.warning("Cannot generate metadata without job_id in doc_data.")
         return
 
     transcript_content_map = doc_data.get("transcript_content", {})
@@ -750,7 +1026,7 @@ def generate_and_populate_metadata(doc_data):
     selected_lang = None
 
     if not transcript_content_map:
-         print(f"Warning: No transcript content available in doc_data for job_id '{job_id}'. Skipping metadata generation.")
+         app.logger.warning("No transcript content available in doc_data for job_id '%s'. Skipping metadata generation.", job_id)
          return
 
     detected_lang = doc_data.get("detected_language")
@@ -761,7 +1037,7 @@ def generate_and_populate_metadata(doc_data):
             selected_lang = lang
             selected_vtt_content = transcript_content_map[lang]
             if isinstance(selected_vtt_content, str) and selected_vtt_content.startswith("Error: Could not read file"):
-                print(f"Warning: Content for preferred language '{selected_lang}' is an error message. Trying next.")
+                app.logger.warning("Content for preferred language '%s' is an error message. Trying next.", selected_lang)
                 selected_vtt_content = None
                 selected_lang = None
             else:
@@ -772,24 +1048,24 @@ def generate_and_populate_metadata(doc_data):
              if isinstance(content, str) and not content.startswith("Error: Could not read file"):
                  selected_lang = lang
                  selected_vtt_content = content
-                 print(f"Warning: Using first available valid language '{selected_lang}' for keyword extraction.")
+                 app.logger.warning("Using first available valid language '%s' for keyword extraction.", selected_lang)
                  break
 
     if not selected_lang or not selected_vtt_content:
-        print("Could not select any valid transcript content for keyword extraction. Skipping.")
+        app.logger.info("Could not select any valid transcript content for keyword extraction. Skipping.")
         doc_data['keywords'] = doc_data.get('keywords', [])
         return
 
-    print(f"Selected language '{selected_lang}' for keyword extraction.")
+    app.logger.info("Selected language '%s' for keyword extraction.", selected_lang)
 
     vtt_text_for_keywords = extract_text_from_vtt_string(selected_vtt_content)
     if not vtt_text_for_keywords:
-        print("Warning: Could not extract plain text from selected VTT content. Skipping keyword extraction.")
+        app.logger.warning("Could not extract plain text from selected VTT content. Skipping keyword extraction.")
         doc_data['keywords'] = doc_data.get('keywords', [])
         return
 
     keywords = extract_keywords_from_text(vtt_text_for_keywords)
-    print(f"Extracted keywords ({len(keywords)}): {keywords}")
+    app.logger.info("Extracted keywords (%s): %s", len(keywords), keywords)
 
     doc_data['keywords'] = keywords
 
@@ -799,29 +1075,966 @@ def generate_and_populate_metadata(doc_data):
             potential_title = first_sentence_match.group(0).strip()
             if len(potential_title) > 10 and len(potential_title) < 100 :
                 doc_data['title'] = potential_title
-                print(f"Inferred title: {potential_title}")
+                app.logger.info("Inferred title: %s", potential_title)
 
     if not doc_data.get('summary') and vtt_text_for_keywords:
          words = vtt_text_for_keywords.split()
          potential_summary = " ".join(words[:50]) + ("..." if len(words) > 50 else "")
          doc_data['summary'] = potential_summary
-         print(f"Generated simple summary (first 50 words).")
+         app.logger.info("Generated simple summary (first 50 words).")
 
     if not doc_data.get('location') and vtt_text_for_keywords:
         # Look for patterns like "in Kathmandu", "at Swayambhu" etc.
         loc_match = re.search(r'\b(?:in|at|near)\s+([A-Z][A-Za-z\s\-]+)\b', vtt_text_for_keywords)
         if loc_match:
             doc_data['location'] = f"Possibly: {loc_match.group(1).strip()}"
-            print(f"Inferred location: {doc_data['location']}")
+            app.logger.info("Inferred location: %s", doc_data['location'])
 
     if not doc_data.get('speaker') and vtt_text_for_keywords:
          # Look for patterns like "Speaker: John Doe", "by Jane Smith"
         sp_match = re.search(r'\b(?:by|from|speaker[:]?|voiced by)\s+([A-Z][A-Za-z\s\.\-]+)\b', vtt_text_for_keywords)
         if sp_match:
             doc_data['speaker'] = f"Possibly: {sp_match.group(1).strip()}"
-            print(f"Inferred speaker: {doc_data['speaker']}")
+            app.logger.info("Inferred speaker: %s", doc_data['speaker'])
 
-    print(f"--- Finished automatic metadata generation for job: {job_id} ---")
+    app.logger.info("--- Finished automatic metadata generation for job: %s ---", job_id)
+
+
+# ------------------------------------------------------------
+# --- INGEST STAGES (shared by the synchronous endpoint and the job pipeline) ---
+# ------------------------------------------------------------
+# Any local audio or video file; "mp4" is the name the upload form has always sent
+FILE_SOURCE_TYPES = ("mp4", "file")
+
+
+def _as_bool(value, default=False):
+    """Interprets JSON booleans and 'true'/'false' form strings alike."""
+    if value is None:
+        return default
+    return str(value).lower() == 'true' if isinstance(value, str) else bool(value)
+
+
+def build_ingest_context(data, upload_filename=None):
+    """
+    Validates ingest parameters into a job context dict, independent of the web framework.
+    `data` holds the JSON body or the form fields; upload_filename is the uploaded file's
+    name for multipart requests. For uploads, the caller opens the job's workspace
+    (open_job_workspace), which sets ctx["uploaded_file_path"], and saves the file there.
+    Returns (ctx, None) on success or (None, (error_payload, status)) on a client error.
+    """
+    timestamp = get_timestamp()
+    job_key = str(data.get("job_key") or "").strip()[:128]
+    try:
+        priority = scheduler.parse_priority(data.get("priority"))
+    except ValueError as e:
+        return None, ({"status": "error", "message": str(e)}, 400)
+    language_hint = standardize_language(str(data.get("language") or "").strip())
+    if language_hint and not re.fullmatch(r"[a-z]{2,3}", language_hint):
+        return None, ({"status": "error", "message": "'language' must be a language code such as 'en' or 'ne'"}, 400)
+    ctx = {
+        "job_id": uuid.uuid4().hex[:12],  # Correlates the job's log lines; also its pipeline job id
+        "job_key": job_key or None,  # Identifies the job across retries (see checkpoints.py)
+        "job_key_source": "client" if job_key else "derived",
+        "timestamp": timestamp,
+        "source_type": (data.get("source_type") or "").lower(),
+        "source": None,
+        "original_media_name": None,
+        "uploaded_file_path": None,
+        "upload_name": None,
+        "should_generate_metadata": _as_bool(data.get("generate_metadata"), False),
+        # local_transcription: true, false or "auto" (any other string means the API);
+        # None until routed when it is "auto" (see routing.py)
+        "use_local_whisper": routing.requested_local(data.get("local_transcription")),
+        "skip_silence": _as_bool(data.get("skip_silence"), True),
+        "language_hint": language_hint or None,  # Skips the language ID pre-pass (see language_id.py)
+        "profile": profiling.PROFILING_ALLOWED and _as_bool(data.get("profile"), False),
+        "dedupe": UPLOAD_DEDUP and _as_bool(data.get("dedupe"), True),  # "false" forces reprocessing
+        "source_hash": None,
+        "priority": priority,  # Scheduling class, see scheduler.py
+        "submitter": str(data.get("submitter") or "").strip()[:64] or None,
+        "files_to_clean": [],
+    }
+    source_type = ctx["source_type"]
+
+    if upload_filename is None:
+        source = data.get("source", "")
+        if not source_type or not source:
+             return None, ({"status": "error", "message": "Missing 'source_type' or 'source' in JSON body"}, 400)
+        if source_type != "youtube" and source_type not in FILE_SOURCE_TYPES:
+             return None, ({"status": "error", "message": f"Invalid 'source_type' '{source_type}'. Must be 'youtube', 'file' or 'mp4'."}, 400)
+        ctx["source"] = source
+        ctx["original_media_name"] = source
+        return ctx, None
+
+    if not source_type:
+         return None, ({"status": "error", "message": "Missing 'source_type' form field or 'source' file"}, 400)
+    if source_type not in FILE_SOURCE_TYPES:
+         return None, ({"status": "error", "message": f"Invalid source_type '{source_type}' for file upload. Use 'file' (or 'mp4')."}, 400)
+    if not upload_filename:
+         return None, ({"status": "error", "message": "Uploaded file has no filename."}, 400)
+
+    # The real format is detected by probing once saved (see accept_uploaded_media)
+    uploaded_file_extension = re.sub(r'[^a-z0-9.]', '', os.path.splitext(upload_filename)[1].lower())[:10]
+
+    # The job's own workspace directory, so the name cannot collide with another upload
+    ctx["upload_name"] = f"{sanitize_filename(os.path.splitext(upload_filename)[0])}{uploaded_file_extension}"
+    ctx["original_media_name"] = upload_filename
+    return ctx, None
+
+
+def inspect_media(ctx, path):
+    """Probes the job's media (cached), rejecting unreadable input, and records a cost estimate."""
+    with metrics.step(ctx, "probe"):
+        media_info = media_tools.require_audio(path)
+    ctx["media_info"] = media_info
+    ctx["cost_estimate"] = media_tools.estimate_job_cost(
+        media_info["duration_sec"], transcription_method(ctx))
+    return media_info
+
+
+def spend_collection():
+    """Daily API transcription spend, see routing.py."""
+    return database.for_ingest(mongo.get()[database.MONGO_DB_NAME][routing.ROUTING_SPEND_COLLECTION])
+
+
+def transcription_method(ctx):
+    return routing.LOCAL if ctx["use_local_whisper"] else routing.API
+
+
+def route_transcription(ctx):
+    """Chooses the backend of a job sent with local_transcription "auto" (see routing.py); others keep theirs."""
+    if ctx["use_local_whisper"] is not None:
+        ctx.setdefault("transcription_routing", {"mode": "manual", "backend": transcription_method(ctx)})
+        return
+    duration = ctx["media_info"]["duration_sec"]
+    decision = routing.decide(
+        duration,
+        local_available=routing.local_whisper_available(),
+        api_available=bool(OPENAI_API_KEY),
+        local_load=scheduler.load("whisper_local"),
+        api_load=scheduler.load("openai"),
+        api_headroom=get_transcription_client(OPENAI_API_KEY).headroom() if OPENAI_API_KEY else None,
+        budget_left_usd=routing.budget_left(spend_collection),
+    )
+    if decision["backend"] == routing.API and decision["reason"] != "local_unavailable":
+        # Concurrent jobs saw the same budget; only those whose reservation fits use the API
+        decision["reservation"] = routing.reserve_spend(spend_collection, decision["estimates"]["api_usd"])
+        if decision["reservation"] is None:
+            decision.update(backend=routing.LOCAL, reason="over_budget")
+    ctx["use_local_whisper"] = decision["backend"] == routing.LOCAL
+    ctx["transcription_routing"] = decision
+    ctx["cost_estimate"] = media_tools.estimate_job_cost(duration, decision["backend"])
+    metrics.TRANSCRIPTION_ROUTES.inc(backend=decision["backend"], reason=decision["reason"])
+    app.logger.info("Routed %.0fs of audio to %s (%s; estimated local %.0fs, API %.0fs for $%.4f)", duration,
+                    decision["backend"], decision["reason"], decision["estimates"]["local_sec"],
+                    decision["estimates"]["api_sec"], decision["estimates"]["api_usd"])
+
+
+def record_transcription_outcome(ctx, wait_sec, elapsed_sec, ok):
+    """Stores the realized wait and latency with the routing decision and updates the speed estimates and spend."""
+    method = transcription_method(ctx)
+    duration = (ctx.get("media_info") or {}).get("duration_sec") or 0.0
+    # VAD-cut audio is what the backend actually processed (and what the API bills)
+    audio_sec = duration * (1.0 - ((ctx.get("vad_report") or {}).get("skipped_fraction") or 0.0))
+    info = ctx.setdefault("transcription_routing", {"mode": "manual", "backend": method})
+    info["realized"] = routing.realized(method, ok, audio_sec, wait_sec, elapsed_sec)
+    if ok:
+        routing.observe(method, audio_sec, elapsed_sec)
+        if method == routing.API:
+            reservation = info.get("reservation")
+            routing.settle_spend(spend_collection, reservation, audio_sec)
+            if reservation:
+                reservation["settled"] = True
+
+
+def release_transcription_budget(ctx):
+    """Refunds the API budget a failed job reserved when it was routed (see routing.reserve_spend)."""
+    reservation = (ctx.get("transcription_routing") or {}).get("reservation")
+    if reservation and reservation["usd"] and not reservation.get("settled"):
+        routing.settle_spend(spend_collection, reservation, 0.0)
+        reservation["settled"] = True
+
+
+def accept_uploaded_media(ctx):
+    """
+    Probes a saved upload (raising MediaProbeError for unreadable files) and renames it
+    to the extension of the format actually inside, so a WAV sent as .bin or an M4A
+    sent as .mp4 is handled as what it is.
+    """
+    uploaded_file_path = ctx["uploaded_file_path"]
+    media_info = inspect_media(ctx, uploaded_file_path)
+    current_extension = os.path.splitext(uploaded_file_path)[1].lower()
+    extension = media_tools.natural_extension(media_info, current_extension)
+    if extension and extension != current_extension:
+        renamed_path = os.path.splitext(uploaded_file_path)[0] + extension
+        os.rename(uploaded_file_path, renamed_path)
+        ctx["files_to_clean"] = [renamed_path if p == uploaded_file_path else p for p in ctx["files_to_clean"]]
+        ctx["source"] = ctx["uploaded_file_path"] = renamed_path
+        app.logger.info("Upload detected as %s; renamed to %s", media_info['format_name'], os.path.basename(renamed_path))
+    return media_info
+
+
+def select_transcription_audio(ctx, input_path, media_info):
+    """
+    Chooses the file to transcribe from a local media file, converting only what the
+    backend needs. Local Whisper decodes anything ffmpeg can, so the input is used as-is.
+    The API wants audio in one of its accepted containers and under its upload limit:
+    video gets its audio stream copied out, and only files that still do not fit are
+    encoded to compact speech MP3 (RuntimeError when even that is over the limit).
+    Returns (path, conversion) with conversion "none", "remux" or "transcode".
+    """
+    extension = os.path.splitext(input_path)[1].lower()
+    if ctx["use_local_whisper"]:
+        return input_path, "none"
+    if (not media_info["has_video"] and extension in API_AUDIO_EXTENSIONS
+            and media_info["size_bytes"] <= API_MAX_UPLOAD_BYTES):
+        return input_path, "none"
+
+    if media_info["has_video"] or media_info["size_bytes"] <= API_MAX_UPLOAD_BYTES:
+        output_base = job_workspace(ctx).file(f"{ctx['vtt_base_filename']}_audio")
+        remuxed_path = media_tools.extract_audio(input_path, output_base, media_info["audio_codec"],
+                                                 media_tools.ffmpeg_bin())
+        if (os.path.splitext(remuxed_path)[1] in API_AUDIO_EXTENSIONS
+                and os.path.getsize(remuxed_path) <= API_MAX_UPLOAD_BYTES):
+            return remuxed_path, "remux"
+        safe_delete(remuxed_path)
+
+    transcoded_path = extract_audio_from_video(input_path, job_workspace(ctx).path)
+    size = os.path.getsize(transcoded_path)
+    if size > API_MAX_UPLOAD_BYTES:
+        safe_delete(transcoded_path)
+        raise RuntimeError(f"Audio is {size / (1024 * 1024):.1f} MB even as 16 kHz mono MP3, over the API's "
+                           f"{API_MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit; send it with "
+                           f"local_transcription=true")
+    return transcoded_path, "transcode"
+
+
+def log_ingest_request(ctx):
+    app.logger.info("Processing request: source_type='%s', source='%s', generate_metadata=%s, use_local_whisper=%s, "
+                    "skip_silence=%s, profile=%s, job_key=%s, priority=%s, submitter=%s", ctx['source_type'], ctx['source'],
+                    ctx['should_generate_metadata'], ctx['use_local_whisper'], ctx['skip_silence'], ctx['profile'],
+                    ctx.get('job_key'), ctx.get('priority'), ctx.get('submitter'))
+
+
+def parse_ingest_request():
+    """
+    Reads an ingest request (JSON or multipart upload) into a job context dict,
+    saving any uploaded file. Returns (ctx, None) or (None, (response, status)).
+    """
+    if request.is_json:
+        data = request.json
+        if not data:
+             return None, (jsonify({"status": "error", "message": "Received JSON content type but empty request body"}), 400)
+        ctx, error = build_ingest_context(data)
+    elif request.files:
+        source_input = request.files.get("source")
+        if not source_input:
+             return None, (jsonify({"status": "error", "message": "Missing 'source_type' form field or 'source' file"}), 400)
+        ctx, error = build_ingest_context(request.form, upload_filename=source_input.filename or "")
+        if ctx:
+            apply_idempotency_key(ctx)
+            try:
+                # Waits for (or is refused) disk quota before the file is written
+                open_job_workspace(ctx, upload_reserve_bytes(request.content_length))
+            except (workspace.WorkspaceFull, workspace.WorkspaceBusy) as e:
+                 payload, status = ingest_error_response(e)
+                 return None, (jsonify(payload), status, ingest_error_headers(e))
+            try:
+                ctx["source_hash"] = save_upload(source_input.stream, ctx["uploaded_file_path"])
+                app.logger.info("Saved uploaded file temporarily to: %s", ctx['uploaded_file_path'])
+            except Exception as e:
+                 app.logger.error("Error saving uploaded file: %s", e)
+                 cleanup_job_files(ctx)
+                 return None, (jsonify({"status": "error", "message": f"Failed to save uploaded file: {e}"}), 500)
+            duplicate = find_duplicate_upload(ctx)
+            if duplicate:
+                 # Already archived: no probe, ffmpeg or API calls
+                 cleanup_job_files(ctx)
+                 return None, (jsonify(duplicate_upload_response(ctx, duplicate)), 200)
+            try:
+                key_upload_by_content(ctx)
+            except (workspace.WorkspaceFull, workspace.WorkspaceBusy) as e:
+                 cleanup_job_files(ctx)
+                 payload, status = ingest_error_response(e)
+                 return None, (jsonify(payload), status, ingest_error_headers(e))
+            try:
+                accept_uploaded_media(ctx)
+            except media_tools.MediaProbeError as e:
+                 # Reject unreadable uploads now rather than after queueing
+                 cleanup_job_files(ctx)
+                 return None, (jsonify({"status": "error", "message": f"Invalid media file: {e}"}), 400)
+    else:
+         return None, (jsonify({"status": "error", "message": "Request must be JSON or multipart/form-data"}), 415)
+
+    if error:
+        payload, status = error
+        return None, (jsonify(payload), status)
+    if profiling.PROFILING_ALLOWED and request.headers.get("X-Profile", "").lower() in ("1", "true", "yes"):
+        ctx["profile"] = True
+    apply_idempotency_key(ctx)
+    ctx["submitter"] = ctx["submitter"] or request_submitter()
+    log_ingest_request(ctx)
+    return ctx, None
+
+
+def request_submitter():
+    """Who sent the request, for fair sharing between submitters: X-Submitter header, else the client address."""
+    return (request.headers.get("X-Submitter") or "").strip()[:64] or request.remote_addr or None
+
+
+def apply_idempotency_key(ctx):
+    """Takes the job key from the Idempotency-Key header, else derives one (see checkpoints.py)."""
+    if request.headers.get("Idempotency-Key"):
+        ctx["job_key"] = request.headers["Idempotency-Key"].strip()[:128]
+        ctx["job_key_source"] = "client"
+    ctx["job_key"] = ctx["job_key"] or checkpoints.derive_job_key(ctx) or ctx["job_id"]
+
+
+def key_upload_by_content(ctx):
+    """
+    Re-keys an upload without a client key by its content hash and options (see checkpoints.py),
+    so a retry of the same file resumes the failed attempt. The saved file moves into the
+    workspace of that key; WorkspaceBusy when the same upload is being processed.
+    """
+    key = checkpoints.derive_job_key(ctx)
+    if ctx["job_key_source"] == "client" or not key or key == ctx["job_key"]:
+        return
+    job_ws = ctx["workspace"]
+    saved_path = ctx["uploaded_file_path"]
+    if not job_ws.rename(key):
+        # The failed attempt kept its workspace: continue in it
+        retry_ws = workspace.Workspace(key).open(job_ws.reserved)
+        os.replace(saved_path, retry_ws.file(ctx["upload_name"]))
+        job_ws.cleanup()
+        job_ws = ctx["workspace"] = retry_ws
+    ctx["job_key"] = key
+    uploaded_file_path = job_ws.file(ctx["upload_name"])
+    ctx["source"] = ctx["uploaded_file_path"] = uploaded_file_path
+    ctx["files_to_clean"] = [uploaded_file_path if path == saved_path else path for path in ctx["files_to_clean"]]
+
+
+def save_upload(stream, path):
+    """Copies an upload to path in chunks, hashing it on the way; returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    with open(path, "wb") as out:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+DUPLICATE_PROJECTION = {"job_id": 1, "detected_language": 1, "source_location": 1, "title": 1, "date_added": 1}
+
+
+def find_duplicate_upload(ctx):
+    """The archived document whose source file had the same content as this upload, or None."""
+    if not ctx.get("dedupe") or not ctx.get("source_hash"):
+        return None
+    try:
+        # Primary read: a copy archived a moment ago must be found
+        doc = media_collection().find_one({"source_hash": ctx["source_hash"]}, DUPLICATE_PROJECTION)
+    except Exception as e:
+        app.logger.warning("could not check for a duplicate upload, processing it: %s", e)
+        return None
+    if doc:
+        metrics.UPLOAD_DEDUP_HITS.inc()
+    return doc
+
+
+def duplicate_upload_response(ctx, doc):
+    """The response for an upload whose content is already archived (as doc)."""
+    app.logger.info("Upload %s is a duplicate of %s; returning the archived item.", ctx["original_media_name"],
+                    doc["job_id"])
+    date_added = doc.get("date_added")
+    return {
+        "status": "duplicate",
+        "job_id": doc["job_id"],
+        "inserted_or_updated_id": str(doc["_id"]),
+        "detected_language": doc.get("detected_language"),
+        "message": f"{ctx['original_media_name']} is already archived as {doc['job_id']}; it was not processed again.",
+        "filename": ctx["original_media_name"],
+        "original_filename": doc.get("source_location"),
+        "title": doc.get("title"),
+        "date_added": date_added.isoformat() if isinstance(date_added, datetime.datetime) else date_added,
+    }
+
+
+def upload_reserve_bytes(content_length):
+    """Scratch space to reserve for an upload: the file plus its extracted audio and speech copies."""
+    return max(int(workspace.WORKSPACE_JOB_RESERVE_MB * 1024 * 1024), 3 * (content_length or 0))
+
+
+def archive_job_id(ctx, name_base):
+    """
+    The job's archive id (media_transcripts.job_id, chunk and VTT names): the source name and
+    timestamp for readability, plus the job's own id, since the same file can be uploaded
+    twice within a second and the two jobs must not share a document.
+    """
+    return f"{name_base}_{ctx['timestamp']}_{ctx['job_id']}"
+
+
+def stage_acquire_audio(ctx):
+    """Stage 1: download (YouTube) or pick/extract (local file) the audio and derive the job's base name."""
+    source_type = ctx["source_type"]
+
+    if source_type == "youtube":
+        with scheduler.backend_slot("youtube", ctx), metrics.step(ctx, "download"):
+            processed_audio_path, source_title_base = download_youtube_audio(ctx["source"], job_workspace(ctx).path)
+        ctx["files_to_clean"].append(processed_audio_path)
+        inspect_media(ctx, processed_audio_path)
+        route_transcription(ctx)
+        ctx["source_id"] = ctx.get("source_id") or youtube_playlist.youtube_video_id(ctx["source"])
+        if ctx.get("playlist_run_id"):
+            # Channels often reuse titles ("Dharma Talk"); the video id tells the entries apart
+            source_title_base = f"{source_title_base}_{ctx['source_id']}"
+        ctx["vtt_base_filename"] = archive_job_id(ctx, source_title_base)
+    elif source_type in FILE_SOURCE_TYPES:
+         input_media_path = ctx["source"]
+         if not os.path.exists(input_media_path):
+              raise FileNotFoundError(f"Input media file not found or inaccessible: {input_media_path}")
+         media_info = ctx.get("media_info") or inspect_media(ctx, input_media_path)
+         route_transcription(ctx)  # Before the conversion, which depends on the backend
+         original_name_base_for_vtt = sanitize_filename(os.path.splitext(os.path.basename(ctx["original_media_name"]))[0])
+         ctx["vtt_base_filename"] = archive_job_id(ctx, original_name_base_for_vtt)
+         with metrics.step(ctx, "ffmpeg"):
+             processed_audio_path, conversion = select_transcription_audio(ctx, input_media_path, media_info)
+         ctx["audio_conversion"] = conversion
+         if processed_audio_path != input_media_path:
+             ctx["files_to_clean"].append(processed_audio_path)
+         app.logger.info("Using %s for transcription (%s, audio %s, conversion: %s)", os.path.basename(processed_audio_path),
+                         media_info['format_name'], media_info['audio_codec'], conversion)
+    else:
+        processed_audio_path = None
+
+    ctx["processed_audio_path"] = processed_audio_path
+    if not processed_audio_path or not ctx.get("vtt_base_filename") or not ctx["original_media_name"]:
+         raise RuntimeError("Audio processing failed: Could not determine processed audio path or base filename.")
+
+
+def stage_prepare_audio(ctx):
+    """Stage 2: voice activity detection, so only speech is sent for transcription, then language ID."""
+    ctx["audio_to_transcribe"] = ctx["processed_audio_path"]
+    ctx["speech_regions"] = None
+    ctx["vad_report"] = None
+    if ctx["skip_silence"]:
+        cut_silence(ctx)
+    identify_language(ctx)
+
+
+def cut_silence(ctx):
+    """Replaces ctx["audio_to_transcribe"] with its speech regions; keeps the full audio if VAD fails."""
+    processed_audio_path = ctx["processed_audio_path"]
+    try:
+        with metrics.step(ctx, "vad"):
+            audio_to_transcribe, speech_regions, vad_report = vad.prepare_speech_audio(
+                processed_audio_path, job_workspace(ctx).path, ffmpeg_bin=media_tools.ffmpeg_bin())
+        if audio_to_transcribe != processed_audio_path:
+            ctx["files_to_clean"].append(audio_to_transcribe)
+            if not ctx["use_local_whisper"] and os.path.getsize(audio_to_transcribe) > API_MAX_UPLOAD_BYTES:
+                # The audio picked in acquire fits the API; a cut that does not is no saving
+                app.logger.warning("VAD cut of %s is over the API upload limit, transcribing the full audio",
+                                   os.path.basename(processed_audio_path))
+                safe_delete(audio_to_transcribe)
+                audio_to_transcribe, speech_regions = processed_audio_path, None
+                vad_report.update(applied=False, skipped_fraction=0.0, fallback="over_upload_limit")
+        app.logger.info("VAD: skipping %.1f%% of %.1fs audio (%s speech regions)", vad_report['skipped_fraction'] * 100,
+                        vad_report['total_duration_sec'], vad_report['speech_regions'])
+        ctx["audio_to_transcribe"] = audio_to_transcribe
+        ctx["speech_regions"] = speech_regions
+        ctx["vad_report"] = vad_report
+    except Exception as e:
+        # VAD is an optimization only; fall back to transcribing the full audio
+        app.logger.warning("VAD pre-pass failed, transcribing full audio: %s", e)
+        ctx["vad_report"] = {"applied": False, "skipped_fraction": 0.0, "error": str(e)}
+
+
+def identify_language(ctx):
+    """
+    Language ID pre-pass on sampled windows of the audio to transcribe (see language_id.py):
+    fixes the transcription language and local model, and the translation targets, before the full pass.
+    Skipped for API-routed jobs (report source "api"); run inside the local Whisper slot otherwise.
+    """
+    duration = (ctx.get("media_info") or {}).get("duration_sec") or 0.0
+    if ctx.get("speech_regions"):
+        duration = sum(end - start for start, end in ctx["speech_regions"])
+    hint, api = ctx.get("language_hint"), not ctx["use_local_whisper"]
+    # The detector is a local Whisper model: count it against the local backend's cap and load
+    slot = scheduler.backend_slot("whisper_local", ctx) if language_id.will_detect(hint, api) else nullcontext()
+    with slot, metrics.step(ctx, "language_id"):
+        report = language_id.plan(ctx["audio_to_transcribe"], duration, WHISPER_LOCAL_MODEL,
+                                  hint=hint, api=api, ffmpeg_bin=media_tools.ffmpeg_bin())
+    if report["language"]:
+        report["translation_targets"] = translation_targets(standardize_language(report["language"]))
+        app.logger.info("Transcribing as '%s' (%s); translating to %s", report["language"], report["source"],
+                        report["translation_targets"])
+    elif report["applied"]:
+        app.logger.info("Language ID inconclusive (top '%s', confidence %.2f, mixed=%s); the transcription detects it",
+                        report["top_language"], report["confidence"], report["mixed"])
+    ctx["language_id"] = report
+
+
+def stage_transcribe(ctx):
+    """Stage 3: transcribe the audio into segments and the original-language VTT (kept in ctx)."""
+    vtt_base_filename = ctx["vtt_base_filename"]
+    backend = "whisper_local" if ctx["use_local_whisper"] else "openai"
+    language_plan = ctx.get("language_id") or {}
+    queued = time.perf_counter()
+    with scheduler.backend_slot(backend, ctx):
+        started = time.perf_counter()
+        with metrics.step(ctx, "transcription"):
+            segments, detected_lang, vtt_content = transcribe_audio(
+                ctx["audio_to_transcribe"], local=ctx["use_local_whisper"], speech_regions=ctx["speech_regions"],
+                language=language_plan.get("language"), model_name=language_plan.get("model"))
+    record_transcription_outcome(ctx, started - queued, time.perf_counter() - started,
+                                 ok=segments is not None and detected_lang is not None)
+
+    if segments is None or detected_lang is None:
+        raise RuntimeError(f"Audio transcription failed for job: {vtt_base_filename}")
+    record_transcribed_audio(ctx)
+
+    standardized_lang = standardize_language(detected_lang)
+    app.logger.info("Detected language: '%s', Standardized to: '%s'", detected_lang, standardized_lang)
+    if not vtt_content:
+         app.logger.warning("Transcription resulted in empty segments. No transcript generated.")
+
+    ctx["segments"] = segments
+    ctx["standardized_lang"] = standardized_lang
+    ctx["original_vtt"] = vtt_content
+    export_transcript(ctx, standardized_lang, vtt_content)
+
+
+def export_transcript(ctx, lang, vtt_content):
+    """Also writes the VTT to TRANSCRIPT_EXPORT_DIR when that is set (the database copy is the one served)."""
+    if not TRANSCRIPT_EXPORT_DIR or not vtt_content:
+        return
+    path = os.path.join(TRANSCRIPT_EXPORT_DIR, f"{ctx['vtt_base_filename']}_transcription_{lang}.vtt")
+    try:
+        os.makedirs(TRANSCRIPT_EXPORT_DIR, exist_ok=True)
+        write_vtt_file(path, vtt_content)
+        ctx.setdefault("exported_transcripts", {})[lang] = path
+    except OSError as e:
+        app.logger.error("Error exporting transcript %s: %s", path, e)
+
+
+def record_transcribed_audio(ctx):
+    """Counts the audio a finished transcription consumed (bytes sent, seconds of source media)."""
+    method = transcription_method(ctx)
+    try:
+        metrics.AUDIO_BYTES.inc(os.path.getsize(ctx["audio_to_transcribe"]), method=method)
+    except OSError:
+        pass
+    metrics.AUDIO_SECONDS.inc((ctx.get("media_info") or {}).get("duration_sec") or 0.0, method=method)
+
+
+def job_translation_targets(ctx):
+    """
+    The job's translation targets: the ones the language ID pre-pass planned when the
+    transcription came back in the language it fixed, else those of the detected language.
+    """
+    planned = ctx.get("language_id") or {}
+    if planned.get("language") and standardize_language(planned["language"]) == ctx["standardized_lang"]:
+        return planned["translation_targets"]
+    return translation_targets(ctx["standardized_lang"])
+
+
+def stage_translate(ctx):
+    """Stage 4: translate the segments into the other archive languages."""
+    segments = ctx["segments"]
+    # Non-empty when resuming: languages translated by an earlier attempt are not sent again
+    translated_vtts = ctx.setdefault("translated_vtts", {})
+    translated = ctx.setdefault("translated_texts", {})
+
+    target_langs = job_translation_targets(ctx)
+
+    if not translator.get():
+         app.logger.warning("Skipping translation: Google client not available.")
+    elif not segments:
+          app.logger.warning("Skipping translation: No segments available from transcription.")
+    else:
+        for lang_code in target_langs:
+            if lang_code in translated and lang_code in translated_vtts:
+                app.logger.info("Translation to '%s' restored from checkpoint.", lang_code)
+                continue
+            with scheduler.backend_slot("google_translate", ctx), metrics.step(ctx, "translation"):
+                vtt_content, translated_texts = translate_vtt_segments(segments, lang_code)
+            if vtt_content:
+                translated_vtts[lang_code] = vtt_content
+                translated[lang_code] = translated_texts
+                export_transcript(ctx, lang_code, vtt_content)
+                if ctx.get("checkpointed"):
+                    checkpoints.save_translation(checkpoint_collection(), ctx, lang_code)
+            else:
+                app.logger.warning("Translation to '%s' failed or produced no output.", lang_code)
+
+
+def timing_segments_by_lang(ctx):
+    """Segments to index in transcript_chunks: the original (with words) and each translation."""
+    segments = ctx.get("segments") or []
+    if not segments:
+        return {}
+    segments_by_lang = {ctx["standardized_lang"]: segments}
+    for lang, translated_texts in (ctx.get("translated_texts") or {}).items():
+        segments_by_lang[lang] = transcript_store.pair_translations(segments, translated_texts)
+    return segments_by_lang
+
+
+def build_ingest_document(ctx, db_transcript_content, content_read_errors=None):
+    """Builds the media_transcripts document for a finished job (metadata generation included)."""
+    vtt_base_filename = ctx["vtt_base_filename"]
+    processed_audio_path = ctx.get("processed_audio_path")
+    uploaded_file_path = ctx.get("uploaded_file_path")
+    original_media_name = ctx["original_media_name"]
+    source_type = ctx["source_type"]
+
+    doc_data = {
+        "job_id": vtt_base_filename,
+        "source_type": source_type,
+        "source_location": original_media_name,
+        "processing_timestamp": ctx["timestamp"],
+        "detected_language": ctx["standardized_lang"],
+        "transcript_content": db_transcript_content,
+        "url": original_media_name if source_type == "youtube" else None,
+        "source_id": ctx.get("source_id"),  # YouTube video id, used to skip re-ingesting playlist entries
+        "source_hash": ctx.get("source_hash"),  # SHA-256 of an uploaded file, used to skip duplicate uploads
+        "processing_info": {
+            "processed_at": dt.now().isoformat(),
+            "transcription_method": transcription_method(ctx),
+            "transcription_routing": ctx.get("transcription_routing"),
+            "temp_audio_file": os.path.basename(processed_audio_path) if processed_audio_path else None,
+            "exported_transcript_files": ctx.get("exported_transcripts"),
+            "temp_uploaded_file": os.path.basename(uploaded_file_path) if uploaded_file_path else None,
+            "vad": ctx.get("vad_report"),
+            "language_id": ctx.get("language_id"),
+            "media": media_tools.media_summary(ctx.get("media_info")),
+            "audio_conversion": ctx.get("audio_conversion"),
+            "cost_estimate": ctx.get("cost_estimate"),
+            "resumed_stages": ctx.get("resumed_stages") or [],  # Restored from an earlier attempt's checkpoint
+        },
+        # Initialize descriptive metadata fields (might be populated by generate_and_populate_metadata)
+        "date_added": None,
+        "location": None,
+        "speaker": None,
+        "category": None,
+        "keywords": [],
+        "title": None,
+        "summary": None,
+        "last_updated": None,
+    }
+    if content_read_errors:
+         doc_data["processing_info"]["content_read_errors"] = content_read_errors
+
+    # --- CONDITIONAL: Generate Additional Metadata ---
+    if ctx["should_generate_metadata"]:
+        app.logger.info("Flag 'generate_metadata' is True. Calling metadata generation function for job: %s", vtt_base_filename)
+        try:
+            with metrics.step(ctx, "metadata"):
+                generate_and_populate_metadata(doc_data) # Modifies doc_data in place
+        except Exception as e:
+            app.logger.exception("Error during metadata generation step: %s", e)
+            doc_data["processing_info"]["metadata_generation_error"] = str(e)
+    else:
+         app.logger.info("Flag 'generate_metadata' is False. Skipping automatic metadata generation.")
+
+    return doc_data
+
+
+def build_ingest_response(ctx, doc_data, db_status, inserted_id):
+    """Builds the JSON payload returned to the client once a job is stored."""
+    db_transcript_content = doc_data.get("transcript_content", {})
+    vad_report = ctx.get("vad_report")
+    original_media_name = ctx["original_media_name"]
+    # Convert datetime objects to ISO strings for the final JSON response
+    return {
+        "status": db_status,
+        "job_id": ctx["vtt_base_filename"],
+        "job_key": ctx.get("job_key"),
+        "detected_language": ctx["standardized_lang"],
+        "message": f"Processing complete for {original_media_name}. Status: {db_status}.",
+        "inserted_or_updated_id": inserted_id,
+        "audio_skipped_fraction": vad_report.get("skipped_fraction", 0.0) if vad_report else 0.0,
+        # Shorten content preview for response
+        "transcript_en_preview": db_transcript_content.get('en', '')[:100] + "..." if isinstance(db_transcript_content.get('en'), str) and db_transcript_content.get('en') else "N/A",
+        "transcript_ne_preview": db_transcript_content.get('ne', '')[:100] + "..." if isinstance(db_transcript_content.get('ne'), str) and db_transcript_content.get('ne') else "N/A",
+        "filename": original_media_name,
+        "date_added": doc_data.get('date_added').isoformat() if isinstance(doc_data.get('date_added'), datetime.datetime) else doc_data.get('date_added'),
+        "last_updated": doc_data.get('last_updated').isoformat() if isinstance(doc_data.get('last_updated'), datetime.datetime) else doc_data.get('last_updated'),
+        "title": doc_data.get("title"),
+        "speaker": doc_data.get("speaker"),
+        "location": doc_data.get("location"),
+        "category": doc_data.get("category"),
+        "keywords": doc_data.get("keywords"),
+        "summary": doc_data.get("summary")
+    }
+
+
+def stage_store(ctx):
+    """Stage 5: generate metadata, upsert the document with the VTT content and clean up."""
+    vtt_base_filename = ctx["vtt_base_filename"]
+    standardized_lang = ctx["standardized_lang"]
+
+    # --- Prepare Base DB Data (transcripts come from memory, not from files) ---
+    db_transcript_content = {}
+    if ctx.get("original_vtt") and standardized_lang:
+        db_transcript_content[standardized_lang] = ctx["original_vtt"]
+    db_transcript_content.update(ctx.get("translated_vtts") or {})
+
+    doc_data = build_ingest_document(ctx, db_transcript_content)
+
+    # --- Segment/word timing index (written first so it exists once the document does) ---
+    try:
+        with metrics.step(ctx, "mongo"), metrics.backend_call("mongodb", "save_timings"):
+            doc_data["processing_info"]["timing_index"] = transcript_store.save_transcript(
+                database.for_ingest(chunks_collection()), vtt_base_filename, timing_segments_by_lang(ctx))
+    except Exception as e:
+        app.logger.warning("could not store transcript timings for %s: %s", vtt_base_filename, e)
+        doc_data["processing_info"]["timing_index_error"] = str(e)
+    # Stages and steps finished so far, over all attempts (this stage's upsert is only in the metrics)
+    doc_data["processing_info"]["timings"] = metrics.timings_summary(ctx)
+
+    # --- Insert or Update in DB ---
+    with metrics.step(ctx, "mongo"), metrics.backend_call("mongodb", "upsert"):
+        db_status, inserted_id = upsert_ingest_document(doc_data)
+    search_cache.invalidate(CONTENT_CACHE_NAMESPACE)
+
+    # --- Cleanup Temporary Files ---
+    app.logger.info("Performing cleanup (deleting temporary audio files)...")
+    cleanup_job_files(ctx)
+
+    ctx["db_status"] = db_status
+    ctx["response_data"] = build_ingest_response(ctx, doc_data, db_status, inserted_id)
+
+
+def upsert_ingest_document(doc_data):
+    """Inserts the job's document, or updates the existing one (keeping date_added). Returns (db_status, id)."""
+    vtt_base_filename = doc_data["job_id"]
+    existing = media_collection().find_one({"job_id": vtt_base_filename})
+    current_iso_time = dt.now() # Keep as datetime object until final conversion for DB/JSON
+    # Use dt.now().isoformat() only for JSON output, keep datetime objects for DB
+    doc_data["last_updated"] = current_iso_time # Set last updated time as datetime object
+
+    if existing:
+        app.logger.info("Updating DB entry for job_id: %s", vtt_base_filename)
+        update_payload = doc_data.copy()
+        if "date_added" in update_payload:
+             del update_payload["date_added"]
+
+        update_result = database.for_ingest(media_collection()).update_one(
+             {"_id": existing["_id"]},
+             {"$set": update_payload}
+         )
+        db_status = "updated" if update_result.modified_count > 0 else "no change"
+        inserted_id = str(existing["_id"])
+
+    else:
+        app.logger.info("Creating new DB entry for job_id: %s", vtt_base_filename)
+        doc_data["date_added"] = current_iso_time # Set date_added as datetime object
+        insert_result = database.for_ingest(media_collection()).insert_one(doc_data)
+        if insert_result.inserted_id:
+             db_status = "created"
+             inserted_id = str(insert_result.inserted_id)
+        else:
+             db_status = "creation failed"
+             inserted_id = None
+             raise RuntimeError("Database insertion failed unexpectedly.")
+    return db_status, inserted_id
+
+
+def cleanup_job_files(ctx):
+    """Deletes the job's workspace and any other temporary file recorded for it."""
+    job_ws = ctx.get("workspace")
+    if job_ws is not None:
+        job_ws.cleanup()
+        app.logger.info("Cleaned up workspace of job %s", ctx["job_key"])
+    for path in ctx.get("files_to_clean", []):
+        safe_delete(path)
+
+
+# ---------------------
+# Job workspaces (see workspace.py)
+# ---------------------
+def open_job_workspace(ctx, reserve_bytes=None):
+    """
+    Opens the job's scratch directory once, waiting for disk quota (WorkspaceFull when
+    none frees up, WorkspaceBusy when the same job key is running). For uploads it also
+    sets where the file is saved.
+    """
+    job_ws = ctx.get("workspace")
+    if job_ws is not None:
+        return job_ws
+    ctx["job_key"] = ctx.get("job_key") or checkpoints.derive_job_key(ctx) or ctx["job_id"]
+    job_ws = workspace.Workspace(ctx["job_key"]).open(reserve_bytes)
+    ctx["workspace"] = job_ws
+    if ctx.get("upload_name") and not ctx.get("uploaded_file_path"):
+        uploaded_file_path = job_ws.file(ctx["upload_name"])
+        ctx["source"] = ctx["uploaded_file_path"] = uploaded_file_path
+        ctx["files_to_clean"].append(uploaded_file_path)
+    return job_ws
+
+
+def job_workspace(ctx):
+    """The job's workspace, opened on first use (jobs from JSON requests and playlists)."""
+    return ctx.get("workspace") or open_job_workspace(ctx)
+
+
+# ---------------------
+# Job checkpoints (see checkpoints.py)
+# ---------------------
+def checkpoint_collection():
+    return database.for_ingest(jobs_collection())
+
+
+def begin_job_checkpoint(ctx):
+    """
+    Claims the job's durable record before its first stage. A retry of a failed or
+    abandoned job gets the earlier attempt's stage outputs back in ctx, and those
+    stages are skipped; a client job_key whose job already completed replays its response.
+    """
+    if not checkpoints.CHECKPOINTS_ENABLED or "checkpointed" in ctx:
+        return
+    ctx["checkpointed"] = False
+    ctx["job_key"] = ctx.get("job_key") or checkpoints.derive_job_key(ctx) or ctx["job_id"]
+    try:
+        collection = checkpoint_collection()
+        checkpoints.sweep(collection, safe_delete)
+        checkpoints.claim(collection, ctx)
+    except checkpoints.JobLocked:
+        raise
+    except Exception as e:
+        app.logger.warning("Job checkpoints unavailable, running %s without them: %s", ctx["job_key"], e)
+        return
+
+    if "completed_response" in ctx:
+        ctx["resumed_stages"] = list(checkpoints.STAGES)
+        ctx["response_data"] = ctx["completed_response"]
+        ctx["db_status"] = ctx["response_data"].get("status")
+        app.logger.info("Job %s already completed; returning its stored result.", ctx["job_key"])
+        cleanup_job_files(ctx)
+        return
+    if ctx.get("workspace") is not None:
+        # From here on a crash leaves files a retry can use; the janitor keeps them
+        ctx["workspace"].mark_resumable()
+    if ctx["resumed_stages"]:
+        metrics.INGEST_RESUMED.inc(stage=ctx["resumed_stages"][-1])
+        if "transcribe" in ctx["resumed_stages"]:
+            restore_rendered_transcripts(ctx)
+
+
+def restore_rendered_transcripts(ctx):
+    """Re-renders the VTT content of a resumed job from its checkpointed segments and translations."""
+    segments = ctx.get("segments")
+    if not segments:
+        ctx["original_vtt"] = None
+        return
+    ctx["original_vtt"] = render_vtt(segments)
+    ctx["translated_vtts"] = {lang: render_translated_vtt(segments, texts)
+                              for lang, texts in (ctx.get("translated_texts") or {}).items()}
+
+
+def save_job_checkpoint(ctx, stage_name):
+    if not ctx.get("checkpointed"):
+        return
+    if stage_name == checkpoints.STAGES[-1]:
+        checkpoints.complete(checkpoint_collection(), ctx, ctx.get("response_data"))
+    else:
+        checkpoints.save(checkpoint_collection(), ctx, stage_name)
+
+
+def release_failed_job(ctx, exc):
+    """After a failure: keeps the job's files when its checkpoint lets a retry resume, deletes them otherwise."""
+    try:
+        kept = bool(ctx.get("checkpointed")) and checkpoints.fail(checkpoint_collection(), ctx, exc)
+    except Exception as e:
+        app.logger.warning("Could not record failure of job %s: %s", ctx.get("job_key"), e)
+        kept = False
+    if kept:
+        app.logger.info("Keeping %d files of job %s so a retry can resume it.", len(ctx.get("files_to_clean", [])),
+                        ctx["job_key"])
+        if ctx.get("workspace") is not None:
+            ctx["workspace"].release()
+    else:
+        # A retry resumes with the reservation; without one it goes back to the budget
+        release_transcription_budget(ctx)
+        cleanup_job_files(ctx)
+
+
+def ingest_error_response(exc):
+    """Maps an exception raised by an ingest stage to a (JSON response, HTTP status) pair."""
+    if isinstance(exc, FileNotFoundError):
+        return {"status": "error", "message": f"File not found or inaccessible: {exc}"}, 404
+    if isinstance(exc, media_tools.MediaProbeError):
+        return {"status": "error", "message": f"Invalid media file: {exc}"}, 400
+    if isinstance(exc, (checkpoints.JobLocked, workspace.WorkspaceBusy)):
+        return {"status": "error", "message": str(exc)}, 409
+    if isinstance(exc, workspace.WorkspaceFull):
+        return {"status": "error", "message": str(exc)}, 507
+    if services.is_download_error(exc):
+        return {"status": "error", "message": f"YouTube download failed: {exc}"}, 500
+    if isinstance(exc, RuntimeError):
+        return {"status": "error", "message": f"Processing error: {exc}"}, 500
+    return {"status": "error", "message": f"An unexpected internal server error occurred: {exc}"}, 500
+
+
+def ingest_error_headers(exc):
+    """Extra response headers for an ingest error: Retry-After when scratch space ran out."""
+    if isinstance(exc, workspace.WorkspaceFull):
+        return {"Retry-After": str(int(workspace.WORKSPACE_QUOTA_WAIT_SEC))}
+    return {}
+
+
+def ingest_stage(name, func):
+    """
+    Wraps a stage function so it logs under the job's id and records its timings,
+    and checkpoints the job after the stage (skipping it when a checkpoint restored it).
+    """
+    timed = metrics.instrument_stage(name, func)
+
+    def run(ctx):
+        with logging_setup.job_context(ctx.get("job_id")):
+            if name == checkpoints.STAGES[0]:
+                open_job_workspace(ctx)
+                begin_job_checkpoint(ctx)
+            if name in ctx.get("resumed_stages", ()):
+                app.logger.info("Stage %s restored from checkpoint.", name)
+                return None
+            result = timed(ctx)
+            save_job_checkpoint(ctx, name)
+            return result
+    run.__name__ = func.__name__
+    return run
+
+
+# --- Stage graph: worker counts and queue sizes are tunable per stage ---
+# acquire/prepare are ffmpeg + network heavy, transcribe/translate mostly wait on remote APIs.
+INGEST_STAGES = [
+    pipeline.Stage("acquire", ingest_stage("acquire", stage_acquire_audio),
+                   workers=os.getenv("PIPELINE_ACQUIRE_WORKERS", 2), queue_size=os.getenv("PIPELINE_ACQUIRE_QUEUE", 16)),
+    pipeline.Stage("prepare", ingest_stage("prepare", stage_prepare_audio),
+                   workers=os.getenv("PIPELINE_PREPARE_WORKERS", 2), queue_size=os.getenv("PIPELINE_PREPARE_QUEUE", 4)),
+    pipeline.Stage("transcribe", ingest_stage("transcribe", stage_transcribe),
+                   workers=os.getenv("PIPELINE_TRANSCRIBE_WORKERS", 4), queue_size=os.getenv("PIPELINE_TRANSCRIBE_QUEUE", 4)),
+    pipeline.Stage("translate", ingest_stage("translate", stage_translate),
+                   workers=os.getenv("PIPELINE_TRANSLATE_WORKERS", 4), queue_size=os.getenv("PIPELINE_TRANSLATE_QUEUE", 4)),
+    pipeline.Stage("store", ingest_stage("store", stage_store),
+                   workers=os.getenv("PIPELINE_STORE_WORKERS", 2), queue_size=os.getenv("PIPELINE_STORE_QUEUE", 8)),
+]
+
+
+def on_ingest_job_failed(job, exc):
+    metrics.INGEST_JOBS.inc(status="failed")
+    release_failed_job(job.ctx, exc)
+    notify_playlist_entry(job, exc)
+
+
+def on_ingest_job_completed(job):
+    metrics.INGEST_JOBS.inc(status="completed")
+    notify_playlist_entry(job)
+
+
+ingest_pipeline = pipeline.StagePipeline(INGEST_STAGES, on_error=on_ingest_job_failed,
+                                         on_complete=on_ingest_job_completed)
 
 
 # ------------------------------------------------------------
@@ -833,299 +2046,283 @@ def generate_transcription_endpoint():
     Handles media processing, transcription, translation,
     and stores VTT *content* in the database. Deletes local VTT files afterwards.
     Optionally generates and adds further metadata based on a request parameter.
+    Runs every stage synchronously in the request; see /api/jobs for the pipelined path.
     """
     if request.method == "OPTIONS":
         response = jsonify({"message": "Preflight OK"})
         return response, 200
 
-    source_type = None
-    source = None
-    original_media_name = None
-    vtt_base_filename = None
-    uploaded_file_path = None
-    should_generate_metadata = False
-    use_local_whisper = False
-    files_to_clean = []
-    processed_audio_path = None
-    final_transcript_path = None
-    translation_paths = {}
-    doc_data = {}
-
+    ctx = None
     try:
-        timestamp = get_timestamp()
+        ctx, error_response = parse_ingest_request()
+        if error_response:
+            return error_response
 
-        if request.is_json:
-            data = request.json
-            if not data:
-                 return jsonify({"status": "error", "message": "Received JSON content type but empty request body"}), 400
+        try:
+            # Opt-in per request ("profile" field or X-Profile header); the profile is written even if the job fails
+            with profiling.profile_job(ctx["job_id"], ctx["profile"]) as profile:
+                pipeline.run_inline(INGEST_STAGES, ctx)
+        except Exception:
+            metrics.INGEST_JOBS.inc(status="failed")
+            raise
+        metrics.INGEST_JOBS.inc(status="completed")
+        if profile:
+            # The files are under PROFILE_DIR/<job_id>.* on the server
+            ctx["response_data"]["profile"] = profiling.client_summary(profile)
+
+        db_status = ctx["db_status"]
+        return jsonify(ctx["response_data"]), 200 if db_status in ["created", "updated", "no change"] else 500
 
-            source_type = data.get("source_type", "").lower()
-            source = data.get("source", "")
+    # --- Error Handling ---
+    except Exception as e:
+        app.logger.exception("Ingest failed: %s", e)
+        payload, status = ingest_error_response(e)
+        if ctx:
+            release_failed_job(ctx, e)
+            if ctx.get("checkpointed"):
+                # Retrying with this key resumes after the last completed stage
+                payload["job_key"] = ctx["job_key"]
+        return jsonify(payload), status, ingest_error_headers(e)
 
-            raw_gen_meta = data.get("generate_metadata", False)
-            should_generate_metadata = str(raw_gen_meta).lower() == 'true' if isinstance(raw_gen_meta, str) else bool(raw_gen_meta)
-            raw_local = data.get("local_transcription", False)
-            use_local_whisper = str(raw_local).lower() == 'true' if isinstance(raw_local, str) else bool(raw_local)
 
-            if not source_type or not source:
-                 return jsonify({"status": "error", "message": "Missing 'source_type' or 'source' in JSON body"}), 400
-            if source_type not in ["youtube", "mp4"]:
-                 return jsonify({"status": "error", "message": f"Invalid 'source_type' '{source_type}'. Must be 'youtube' or 'mp4'."}), 400
+# ------------------------------------------------------------
+# --- PIPELINED JOB ENDPOINTS ---
+# ------------------------------------------------------------
+@app.route("/api/jobs", methods=["POST", "OPTIONS"])
+def submit_ingest_job():
+    """
+    Accepts the same payload as /api/generate-transcription but queues the job on the
+    stage pipeline and returns 202 immediately. Poll /api/jobs/<job_id> for the result.
+    Returns 503 if the pipeline is saturated (backpressure).
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"message": "Preflight OK"}), 200
 
-            original_media_name = source
+    ctx, error_response = parse_ingest_request()
+    if error_response:
+        return error_response
 
-        elif request.files:
-            source_type = request.form.get("source_type", "").lower()
-            source_input = request.files.get("source")
+    try:
+        job = ingest_pipeline.submit(ctx, job_id=ctx["job_id"], block=True,
+                                     timeout=float(os.getenv("PIPELINE_SUBMIT_TIMEOUT", 2)))
+    except pipeline.PipelineFull as e:
+        cleanup_job_files(ctx)
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    return jsonify({"status": "queued", "pipeline_job_id": job.job_id, "job_key": ctx["job_key"],
+                    "cost_estimate": ctx.get("cost_estimate")}), 202
+
+
+@app.route("/api/jobs/<string:pipeline_job_id>", methods=["GET"])
+def get_ingest_job(pipeline_job_id):
+    """Returns the status of a pipelined ingest job, including the result once completed."""
+    job = ingest_pipeline.get_job(pipeline_job_id)
+    if not job:
+        return jsonify({"status": "error", "message": f"Unknown job: {pipeline_job_id}"}), 404
+
+    payload = job.to_dict()
+    if job.status == "completed":
+        payload["result"] = job.ctx.get("response_data")
+    elif job.status == "failed":
+        payload["result"], _ = ingest_error_response(job.ctx.get("exception"))
+        if job.ctx.get("checkpointed"):
+            payload["result"]["job_key"] = job.ctx["job_key"]
+    return jsonify(payload), 200
+
+
+@app.route("/api/pipeline/stats", methods=["GET"])
+def get_pipeline_stats():
+    """Per-stage throughput, queue depth and worker utilisation of the ingest pipeline, backend slot usage
+    and the transcription speed estimates used for routing."""
+    return jsonify({**ingest_pipeline.stats(), "backends": scheduler.stats(),
+                    "transcription_routing": routing.estimates()}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus scrape endpoint (this worker process only)."""
+    for name, stage_stats in ingest_pipeline.stats()["stages"].items():
+        metrics.QUEUE_DEPTH.set(stage_stats["queue_depth"], stage=name)
+        metrics.BUSY_WORKERS.set(stage_stats["busy_workers"], stage=name)
+    return Response(metrics.render(), status=200, content_type=metrics.CONTENT_TYPE)
 
-            should_generate_metadata = request.form.get("generate_metadata", 'false').lower() == 'true'
-            use_local_whisper = request.form.get("local_transcription", 'false').lower() == 'true'
 
-            if not source_type or not source_input:
-                 return jsonify({"status": "error", "message": "Missing 'source_type' form field or 'source' file"}), 400
-            if source_type != "mp4":
-                 return jsonify({"status": "error", "message": f"Invalid source_type '{source_type}' for file upload. Only 'mp4' supported."}), 400
+# ------------------------------------------------------------
+# --- PLAYLIST / CHANNEL INGEST ---
+# ------------------------------------------------------------
+# Entries are fed into ingest_pipeline, so the acquire stage's worker pool
+# (PIPELINE_ACQUIRE_WORKERS) bounds concurrent downloads and each entry is
+# transcribed as soon as its audio lands. PLAYLIST_MAX_IN_FLIGHT caps how many
+# entries of one run may be in the pipeline at once, leaving room for other jobs.
+PLAYLIST_MAX_IN_FLIGHT = int(os.getenv("PLAYLIST_MAX_IN_FLIGHT", "4"))
+PLAYLIST_MAX_RUNS_KEPT = int(os.getenv("PLAYLIST_MAX_RUNS_KEPT", "50"))
+
+playlist_runs = OrderedDict()       # run_id -> PlaylistRun (bounded history)
+playlist_slots = {}                 # run_id -> semaphore limiting entries in flight
+playlist_runs_lock = threading.Lock()
+_source_id_index_ready = False
+
+
+def existing_youtube_ids(video_ids):
+    """Returns the subset of video_ids already archived in media_transcripts."""
+    global _source_id_index_ready
+    if not _source_id_index_ready:
+        try:
+            media_collection().create_index("source_id", sparse=True)
+            _source_id_index_ready = True
+        except Exception as e:
+            app.logger.warning("could not create source_id index: %s", e)
+
+    wanted = set(video_ids)
+    found = set()
+    for doc in media_collection().find({"source_id": {"$in": list(wanted)}}, {"source_id": 1}):
+        found.add(doc["source_id"])
+    # Documents archived before source_id existed only carry the original URL
+    for doc in media_collection().find({"source_type": "youtube", "source_id": {"$exists": False}}, {"url": 1}):
+        video_id = youtube_playlist.youtube_video_id(doc.get("url"))
+        if video_id in wanted:
+            found.add(video_id)
+    return found
+
+
+def notify_playlist_entry(job, exc=None):
+    """Pipeline hook: records the outcome of a job that belongs to a playlist run."""
+    run_id = job.ctx.get("playlist_run_id")
+    if not run_id:
+        return
+    with playlist_runs_lock:
+        run = playlist_runs.get(run_id)
+        slots = playlist_slots.get(run_id)
+    if slots:
+        slots.release()
+    if not run:
+        return
+    stage_timings = {name: round(sec, 3) for name, sec in job.stage_timings.items()}
+    if exc is None:
+        run.update_entry(job.ctx["playlist_index"], status="completed", stage=None,
+                         job_id=job.ctx.get("vtt_base_filename"), stage_timings=stage_timings)
+    else:
+        run.update_entry(job.ctx["playlist_index"], status="failed", stage=job.stage,
+                         error=str(exc), stage_timings=stage_timings)
 
-            original_filename = source_input.filename
-            if not original_filename:
-                 return jsonify({"status": "error", "message": "Uploaded file has no filename."}), 400
 
-            uploaded_file_extension = os.path.splitext(original_filename)[1].lower()
-            allowed_extensions = {'.mp4'}
-            if uploaded_file_extension not in allowed_extensions:
-                 return jsonify({"status": "error", "message": f"Unsupported file extension '{uploaded_file_extension}'. Only .mp4 allowed."}), 400
+def feed_playlist(run):
+    """Background thread: enumerates the playlist and submits each new entry to the pipeline."""
+    options = run.options
+    try:
+        entries = youtube_playlist.list_playlist_entries(run.source, max_entries=options.get("max_entries"))
+    except Exception as e:
+        app.logger.warning("[playlist %s] enumeration failed: %s", run.run_id, e)
+        run.finish("failed", f"Could not list playlist entries: {e}")
+        return
 
-            sanitized_original_filename_base = sanitize_filename(os.path.splitext(original_filename)[0])
-            uploaded_file_path = os.path.join(AUDIO_DIR, f"{sanitized_original_filename_base}_{timestamp}{uploaded_file_extension}")
+    run.set_entries(entries)
+    run.status = "running"
+    app.logger.info("[playlist %s] %s entries found in %s", run.run_id, len(entries), run.source)
 
-            try:
-                source_input.save(uploaded_file_path)
-                print(f"Saved uploaded file temporarily to: {uploaded_file_path}")
-            except Exception as e:
-                 print(f"Error saving uploaded file: {e}")
-                 safe_delete(uploaded_file_path)
-                 return jsonify({"status": "error", "message": f"Failed to save uploaded file: {e}"}), 500
+    skip_ids = set()
+    if options.get("skip_existing", True) and entries:
+        try:
+            skip_ids = existing_youtube_ids([entry["video_id"] for entry in entries])
+        except Exception as e:
+            app.logger.warning("[playlist %s] could not check existing ids, ingesting all: %s", run.run_id, e)
 
-            source = uploaded_file_path
-            original_media_name = original_filename
-            files_to_clean.append(uploaded_file_path)
+    slots = playlist_slots[run.run_id]
+    pending_jobs = []
+    for index, entry in enumerate(entries):
+        if entry["video_id"] in skip_ids:
+            run.update_entry(index, status="skipped", error=None)
+            continue
 
-        else:
-             return jsonify({"status": "error", "message": "Request must be JSON or multipart/form-data"}), 415
-
-        print(f"Processing request: source_type='{source_type}', source='{source}', "
-              f"generate_metadata={should_generate_metadata}, use_local_whisper={use_local_whisper}")
-
-        # --- 2. Process Source and Derive Names ---
-        if source_type == "youtube":
-            processed_audio_path, source_title_base = download_youtube_audio(source, AUDIO_DIR)
-            vtt_base_filename = f"{source_title_base}_{timestamp}"
-            files_to_clean.append(processed_audio_path)
-        elif source_type == "mp4":
-             input_mp4_path = source
-             if not os.path.exists(input_mp4_path):
-                  raise FileNotFoundError(f"Input MP4 file not found or inaccessible: {input_mp4_path}")
-             processed_audio_path = extract_audio_from_video(input_mp4_path, AUDIO_DIR)
-             files_to_clean.append(processed_audio_path)
-             original_name_base_for_vtt = sanitize_filename(os.path.splitext(os.path.basename(original_media_name))[0])
-             vtt_base_filename = f"{original_name_base_for_vtt}_{timestamp}"
-
-        if not processed_audio_path or not vtt_base_filename or not original_media_name:
-             raise RuntimeError("Audio processing failed: Could not determine processed audio path or base filename.")
-
-        # --- 3. Transcribe Audio ---
-        temp_transcript_path = os.path.join(TRANSCRIPTS_DIR, f"{vtt_base_filename}_transcription_temp.vtt")
-        segments, detected_lang = transcribe_audio(processed_audio_path, temp_transcript_path, local=use_local_whisper)
-
-        if segments is None or detected_lang is None:
-            raise RuntimeError(f"Audio transcription failed for job: {vtt_base_filename}")
-
-        lang_standardization_map = {'english': 'en', 'en': 'en', 'nepali': 'ne', 'ne': 'ne'}
-        standardized_lang = lang_standardization_map.get(detected_lang.lower(), detected_lang.lower())
-        print(f"Detected language: '{detected_lang}', Standardized to: '{standardized_lang}'")
-
-        final_transcript_filename = f"{vtt_base_filename}_transcription_{standardized_lang}.vtt"
-        final_transcript_path = os.path.join(TRANSCRIPTS_DIR, final_transcript_filename)
-
-        if os.path.exists(temp_transcript_path):
-            try:
-                os.rename(temp_transcript_path, final_transcript_path)
-                print(f"Created original transcript: {final_transcript_path}")
-                files_to_clean.append(final_transcript_path)
-            except OSError as e:
-                print(f"Error renaming temporary transcript file: {e}")
-                files_to_clean.append(temp_transcript_path)
-                raise RuntimeError("Failed to finalize transcript filename.")
-        elif not segments:
-             print("Warning: Transcription resulted in empty segments. No transcript file generated.")
-             final_transcript_path = None
-        else:
-             print(f"Error: Transcription segments found, but temp file '{temp_transcript_path}' does not exist.")
-             raise RuntimeError("Transcription inconsistency: segments exist but temp file missing.")
-
-        # --- 4. Generate Translations ---
-        target_langs = []
-        if standardized_lang == 'en': target_langs.append('ne')
-        elif standardized_lang == 'ne': target_langs.append('en')
-        else: target_langs.extend(['en', 'ne'])
-
-        if not google_client:
-             print("Skipping translation: Google client not available.")
-        elif not segments:
-              print("Skipping translation: No segments available from transcription.")
-        else:
-            for lang_code in target_langs:
-                translated_vtt_path = translate_vtt_segments(segments, lang_code, vtt_base_filename, TRANSCRIPTS_DIR)
-                if translated_vtt_path:
-                    translation_paths[lang_code] = translated_vtt_path
-                    files_to_clean.append(translated_vtt_path)
-                else:
-                    print(f"Translation to '{lang_code}' failed or produced no output.")
-
-        # --- 5. Read VTT Content and Prepare Base DB Data ---
-        db_transcript_content = {}
-        content_read_errors = []
-
-        if final_transcript_path and standardized_lang:
-            try:
-                with open(final_transcript_path, "r", encoding="utf-8") as f:
-                    db_transcript_content[standardized_lang] = f.read()
-            except Exception as e:
-                err_msg = f"Error reading original transcript ({standardized_lang}) {final_transcript_path}: {e}"
-                print(err_msg)
-                content_read_errors.append(err_msg)
-                db_transcript_content[standardized_lang] = f"Error: Could not read file content. {e}"
+        ctx, error = build_ingest_context({
+            "source_type": "youtube",
+            "source": entry["url"],
+            "generate_metadata": options.get("generate_metadata"),
+            "local_transcription": options.get("local_transcription"),
+            "skip_silence": options.get("skip_silence"),
+            "priority": "bulk",
+            "submitter": options.get("submitter") or f"playlist-{run.run_id}",
+        })
+        if error:
+            run.update_entry(index, status="failed", error=error[0].get("message"))
+            continue
+        ctx["source_id"] = entry["video_id"]
+        ctx["playlist_run_id"] = run.run_id
+        ctx["playlist_index"] = index
 
-        for lang, path in translation_paths.items():
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    db_transcript_content[lang] = f.read()
-            except Exception as e:
-                err_msg = f"Error reading translated transcript ({lang}) {path}: {e}"
-                print(err_msg)
-                content_read_errors.append(err_msg)
-                db_transcript_content[lang] = f"Error: Could not read file content. {e}"
-
-        # --- Prepare base document data dictionary ---
-        doc_data = {
-            "job_id": vtt_base_filename,
-            "source_type": source_type,
-            "source_location": original_media_name,
-            "processing_timestamp": timestamp,
-            "detected_language": standardized_lang,
-            "transcript_content": db_transcript_content,
-            "url": original_media_name if source_type == "youtube" else None,
-            "processing_info": {
-                "processed_at": dt.now().isoformat(),
-                "transcription_method": "local" if use_local_whisper else "openai_api",
-                "temp_audio_file": os.path.basename(processed_audio_path) if processed_audio_path else None,
-                "temp_original_transcript_file": os.path.basename(final_transcript_path) if final_transcript_path else None,
-                "temp_translated_transcript_files": {lang: os.path.basename(p) for lang, p in translation_paths.items()},
-                "temp_uploaded_file": os.path.basename(uploaded_file_path) if uploaded_file_path else None,
-            },
-            # Initialize descriptive metadata fields (might be populated by generate_and_populate_metadata)
-            "date_added": None,
-            "location": None,
-            "speaker": None,
-            "category": None,
-            "keywords": [],
-            "title": None,
-            "summary": None,
-            "last_updated": None,
-        }
-        if content_read_errors:
-             doc_data["processing_info"]["content_read_errors"] = content_read_errors
+        slots.acquire()  # Released by notify_playlist_entry when the entry finishes
+        try:
+            # Blocking submit: a saturated pipeline simply slows the feeder down
+            ctx["job_id"] = f"{run.run_id}-{index}"
+            job = ingest_pipeline.submit(ctx, job_id=ctx["job_id"], block=True)
+        except Exception as e:
+            slots.release()
+            run.update_entry(index, status="failed", error=str(e))
+            continue
+        run.update_entry(index, status="queued", pipeline_job_id=job.job_id)
+        pending_jobs.append(job)
 
-        # --- 6. CONDITIONAL: Generate Additional Metadata ---
-        if should_generate_metadata:
-            print(f"Flag 'generate_metadata' is True. Calling metadata generation function for job: {vtt_base_filename}")
-            try:
-                generate_and_populate_metadata(doc_data) # Modifies doc_data in place
-            except Exception as e:
-                print(f"Error during metadata generation step: {e}")
-                traceback.print_exc()
-                doc_data["processing_info"]["metadata_generation_error"] = str(e)
-        else:
-             print(f"Flag 'generate_metadata' is False. Skipping automatic metadata generation.")
-
-        # --- 7. Insert or Update in DB ---
-        existing = collection.find_one({"job_id": vtt_base_filename})
-        current_iso_time = dt.now() # Keep as datetime object until final conversion for DB/JSON
-        # Use dt.now().isoformat() only for JSON output, keep datetime objects for DB
-        doc_data["last_updated"] = current_iso_time # Set last updated time as datetime object
-
-        if existing:
-            print(f"Updating DB entry for job_id: {vtt_base_filename}")
-            update_payload = doc_data.copy()
-            if "date_added" in update_payload:
-                 del update_payload["date_added"]
-
-            update_result = collection.update_one(
-                 {"_id": existing["_id"]},
-                 {"$set": update_payload}
-             )
-            db_status = "updated" if update_result.modified_count > 0 else "no change"
-            inserted_id = str(existing["_id"])
+    for job in pending_jobs:
+        job.done.wait()
+    counts = run.counts()
+    app.logger.info("[playlist %s] finished: %s", run.run_id, counts)
+    run.finish()
 
-        else:
-            print(f"Creating new DB entry for job_id: {vtt_base_filename}")
-            doc_data["date_added"] = current_iso_time # Set date_added as datetime object
-            insert_result = collection.insert_one(doc_data)
-            if insert_result.inserted_id:
-                 db_status = "created"
-                 inserted_id = str(insert_result.inserted_id)
-            else:
-                 db_status = "creation failed"
-                 inserted_id = None
-                 raise RuntimeError("Database insertion failed unexpectedly.")
-
-        # --- 8. Cleanup Temporary Files ---
-        print("Performing cleanup (deleting temporary audio and VTT files)...")
-        for path in files_to_clean:
-            safe_delete(path)
-
-        # --- 9. Return Success Response ---
-        # Convert datetime objects to ISO strings for the final JSON response
-        response_data = {
-            "status": db_status,
-            "job_id": vtt_base_filename,
-            "detected_language": standardized_lang,
-            "message": f"Processing complete for {original_media_name}. Status: {db_status}.",
-            "inserted_or_updated_id": inserted_id,
-            # Shorten content preview for response
-            "transcript_en_preview": db_transcript_content.get('en', '')[:100] + "..." if isinstance(db_transcript_content.get('en'), str) and db_transcript_content.get('en') else "N/A",
-            "transcript_ne_preview": db_transcript_content.get('ne', '')[:100] + "..." if isinstance(db_transcript_content.get('ne'), str) and db_transcript_content.get('ne') else "N/A",
-            "filename": original_media_name,
-            "date_added": doc_data.get('date_added').isoformat() if isinstance(doc_data.get('date_added'), datetime.datetime) else doc_data.get('date_added'),
-            "last_updated": doc_data.get('last_updated').isoformat() if isinstance(doc_data.get('last_updated'), datetime.datetime) else doc_data.get('last_updated'),
-            "title": doc_data.get("title"),
-            "speaker": doc_data.get("speaker"),
-            "location": doc_data.get("location"),
-            "category": doc_data.get("category"),
-            "keywords": doc_data.get("keywords"),
-            "summary": doc_data.get("summary")
-        }
-        return jsonify(response_data), 200 if db_status in ["created", "updated", "no change"] else 500
 
-    # --- Error Handling ---
-    except FileNotFoundError as e:
-        print(f"Error - File Not Found: {e}")
-        for path in files_to_clean: safe_delete(path)
-        return jsonify({"status": "error", "message": f"File not found or inaccessible: {e}"}), 404
-    except youtube_dl.utils.DownloadError as e:
-        print(f"Error - YouTube Download Failed: {e}")
-        for path in files_to_clean: safe_delete(path)
-        return jsonify({"status": "error", "message": f"YouTube download failed: {e}"}), 500
-    except RuntimeError as e:
-        print(f"Error - Processing Runtime Error: {e}")
-        traceback.print_exc() # Log traceback for runtime errors
-        for path in files_to_clean: safe_delete(path)
-        return jsonify({"status": "error", "message": f"Processing error: {e}"}), 500
-    except Exception as e:
-        print(f"Error - Unexpected Internal Server Error: {e}")
-        traceback.print_exc() # Log full traceback for unexpected errors
-        for path in files_to_clean: safe_delete(path)
-        return jsonify({"status": "error", "message": f"An unexpected internal server error occurred: {e}"}), 500
+@app.route("/api/playlists", methods=["POST", "OPTIONS"])
+def submit_playlist_ingest():
+    """
+    Archives every video of a YouTube playlist or channel.
+    JSON body: {"source": <playlist/channel URL>, "generate_metadata", "local_transcription",
+    "skip_silence", "max_entries", "skip_existing" (default true)}.
+    Returns 202 with a playlist_run_id; poll /api/playlists/<id> for per-entry progress.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"message": "Preflight OK"}), 200
+    if not request.is_json or not request.json:
+        return jsonify({"status": "error", "message": "Request must be a JSON body with 'source'"}), 400
+
+    data = request.json
+    source = data.get("source", "")
+    if not source:
+        return jsonify({"status": "error", "message": "Missing 'source' playlist or channel URL"}), 400
+    try:
+        max_entries = int(data["max_entries"]) if data.get("max_entries") else None
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "'max_entries' must be an integer"}), 400
+
+    options = {
+        "generate_metadata": _as_bool(data.get("generate_metadata"), False),
+        "local_transcription": ("auto" if routing.requested_local(data.get("local_transcription")) is None
+                                else routing.requested_local(data.get("local_transcription"))),
+        "skip_silence": _as_bool(data.get("skip_silence"), True),
+        "skip_existing": _as_bool(data.get("skip_existing"), True),
+        "max_entries": max_entries,
+        "submitter": str(data.get("submitter") or "").strip()[:64] or request_submitter(),
+    }
+    run = youtube_playlist.PlaylistRun(source, options)
+    with playlist_runs_lock:
+        playlist_runs[run.run_id] = run
+        playlist_slots[run.run_id] = threading.BoundedSemaphore(max(1, PLAYLIST_MAX_IN_FLIGHT))
+        finished = [rid for rid, r in playlist_runs.items() if r.finished_at]
+        for rid in finished[:max(0, len(playlist_runs) - PLAYLIST_MAX_RUNS_KEPT)]:
+            del playlist_runs[rid]
+            playlist_slots.pop(rid, None)
+
+    threading.Thread(target=feed_playlist, args=(run,), name=f"playlist-{run.run_id}", daemon=True).start()
+    app.logger.info("Playlist ingest %s started for %s with options %s", run.run_id, source, options)
+    return jsonify({"status": "accepted", "playlist_run_id": run.run_id}), 202
+
+
+@app.route("/api/playlists/<string:run_id>", methods=["GET"])
+def get_playlist_ingest(run_id):
+    """Overall and per-entry progress of a playlist ingest (set entries=false for the summary only)."""
+    with playlist_runs_lock:
+        run = playlist_runs.get(run_id)
+    if not run:
+        return jsonify({"status": "error", "message": f"Unknown playlist run: {run_id}"}), 404
+    include_entries = request.args.get("entries", "true").lower() != "false"
+    return jsonify(run.to_dict(include_entries=include_entries, live_job=ingest_pipeline.get_job)), 200
 
 
 # ------------------------------------------------------------
@@ -1139,10 +2336,9 @@ def generate_transcription_endpoint():
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    print(f"Starting Flask server at {dt.now().isoformat()}...")
-    print(f"Audio Directory: {os.path.abspath(AUDIO_DIR)}")
-    print(f"Transcripts Directory: {os.path.abspath(TRANSCRIPTS_DIR)}")
-    print(f"Google Translate Client Available: {'Yes' if google_client else 'No'}")
-    print(f"OpenAI API Key Set: {'Yes' if OPENAI_API_KEY else 'No'}")
+    app.logger.info("Starting Flask server at %s...", dt.now().isoformat())
+    app.logger.info("Job Workspaces: %s", os.path.abspath(workspace.WORKSPACE_ROOT))
+    app.logger.info("Google Translate Client Available: %s", 'Yes' if translator.get() else 'No')
+    app.logger.info("OpenAI API Key Set: %s", 'Yes' if OPENAI_API_KEY else 'No')
     # Set debug=True for development. Set host='0.0.0.0' to make it accessible externally (use with caution).
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio ingest service: an ASGI sibling of app.py for the ingest endpoints.
+
+All network-bound stages run on the event loop (OpenAI transcription via httpx,
+Google Translate via its REST API over httpx, MongoDB via motor). Blocking or CPU
+work (yt-dlp, ffmpeg, the VAD pass, local Whisper) runs in a bounded thread pool,
+so one process can drive dozens of concurrent jobs without a thread per job.
+
+    uvicorn async_ingest:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+import app as flask_app  # Reuses the sync stage functions and document builders
+import database
+import logging_setup
+import metrics
+import transcript_store
+import vad
+from transcription_client import API_MAX_UPLOAD_BYTES, AsyncTranscriptionClient, TranscriptionError
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")
+
+MAX_CONCURRENT_JOBS = int(os.getenv("ASYNC_MAX_CONCURRENT_JOBS", "32"))
+CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", str(os.cpu_count() or 2)))
+GOOGLE_TRANSLATE_URL = os.getenv("GOOGLE_TRANSLATE_URL", "https://translation.googleapis.com/language/translate/v2")
+GOOGLE_TRANSLATE_BATCH = 128  # Maximum number of strings per v2 translate request
+
+# Per-process state, created inside the event loop on startup
+state = {
+    "cpu_pool": None,
+    "job_slots": None,
+    "transcriber": None,
+    "translator": None,
+    "mongo_client": None,
+    "collection": None,
+    "chunks": None,
+    "jobs": {},
+}
+
+
+# ---------------------
+# ASYNC CLIENTS
+# ---------------------
+class AsyncGoogleTranslator:
+    """Google Translate v2 over httpx, authorised with the application default credentials."""
+
+    def __init__(self, http_client):
+        import google.auth
+        import google.auth.transport.requests
+
+        self._auth_request = google.auth.transport.requests.Request()
+        self._credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-translation"])
+        self._http = http_client
+        self._token_lock = asyncio.Lock()
+
+    async def _token(self):
+        async with self._token_lock:
+            if not self._credentials.valid:
+                # The google-auth refresh is blocking; keep it off the event loop
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(state["cpu_pool"], self._credentials.refresh, self._auth_request)
+            return self._credentials.token
+
+    async def translate(self, texts, target_language):
+        """Translates a list of strings, batching and sending the batches concurrently."""
+        token = await self._token()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def one_batch(batch):
+            response = await self._http.post(GOOGLE_TRANSLATE_URL, headers=headers,
+                                             json={"q": batch, "target": target_language})
+            response.raise_for_status()
+            return [t["translatedText"] for t in response.json()["data"]["translations"]]
+
+        batches = [texts[i:i + GOOGLE_TRANSLATE_BATCH] for i in range(0, len(texts), GOOGLE_TRANSLATE_BATCH)]
+        results = await asyncio.gather(*(one_batch(batch) for batch in batches))
+        return [text for batch in results for text in batch]
+
+
+@app.before_serving
+async def startup():
+    state["cpu_pool"] = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="ingest-cpu")
+    state["job_slots"] = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+    if flask_app.OPENAI_API_KEY:
+        state["transcriber"] = AsyncTranscriptionClient(flask_app.OPENAI_API_KEY)
+    state["http"] = httpx.AsyncClient(timeout=httpx.Timeout(60, connect=10))
+    try:
+        state["translator"] = AsyncGoogleTranslator(state["http"])
+    except Exception as e:
+        logger.warning("Async Google Translate client unavailable, translation disabled: %s", e)
+    state["mongo_client"] = AsyncIOMotorClient(os.getenv("MONGODB_URI"), **database.client_options())
+    # This service only writes ingest results
+    state["collection"] = database.for_ingest(state["mongo_client"][database.MONGO_DB_NAME]["media_transcripts"])
+    state["chunks"] = database.for_ingest(state["mongo_client"][database.MONGO_DB_NAME]["transcript_chunks"])
+    logger.info("Async ingest service ready: %s concurrent jobs, %s CPU workers.", MAX_CONCURRENT_JOBS, CPU_WORKERS)
+
+
+@app.after_serving
+async def shutdown():
+    if state["transcriber"]:
+        await state["transcriber"].aclose()
+    await state["http"].aclose()
+    state["mongo_client"].close()
+    state["cpu_pool"].shutdown(wait=False)
+
+
+async def run_blocking(func, *args):
+    """Runs a blocking/CPU-bound function in the bounded worker pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the job's context (log correlation id) into the worker thread
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await loop.run_in_executor(state["cpu_pool"], call)
+
+
+# ---------------------
+# ASYNC STAGES
+# ---------------------
+async def transcribe_async(ctx):
+    """Transcribes ctx['audio_to_transcribe']; fills segments/standardized_lang/transcript VTT."""
+    if ctx["use_local_whisper"] or not state["transcriber"]:
+        if not ctx["use_local_whisper"]:
+            raise RuntimeError("OPENAI_API_KEY not set. Cannot use OpenAI API.")
+        # Local Whisper is pure CPU work
+        await run_blocking(flask_app.stage_transcribe, ctx)
+        return
+
+    audio_path = ctx["audio_to_transcribe"]
+    file_size = os.path.getsize(audio_path)
+    if file_size > API_MAX_UPLOAD_BYTES:
+        raise RuntimeError(f"Audio file size ({file_size / (1024*1024):.2f} MB) exceeds OpenAI 25MB limit.")
+
+    language = (ctx.get("language_id") or {}).get("language")  # Fixed by the pre-pass in the prepare stage
+    started = time.perf_counter()
+    try:
+        with metrics.step(ctx, "transcription"), metrics.backend_call("openai", "transcribe"):
+            result = await state["transcriber"].transcribe(audio_path, language=language,
+                                                           timestamp_granularities=("segment", "word"))
+    except (TranscriptionError, httpx.HTTPError) as e:
+        await run_blocking(flask_app.record_transcription_outcome, ctx, 0.0, time.perf_counter() - started, False)
+        raise RuntimeError(f"Audio transcription failed for job: {ctx['vtt_base_filename']} ({e})") from e
+    await run_blocking(flask_app.record_transcription_outcome, ctx, 0.0, time.perf_counter() - started, True)
+    flask_app.record_transcribed_audio(ctx)
+
+    segments = result.get("segments", [])
+    transcript_store.attach_words(segments, result.get("words"))
+    vad.remap_segments(segments, ctx.get("speech_regions"))
+    ctx["segments"] = segments
+    ctx["standardized_lang"] = flask_app.standardize_language(result.get("language", "unknown"))
+    ctx["original_vtt"] = flask_app.render_vtt(segments) if segments else None
+    await run_blocking(flask_app.export_transcript, ctx, ctx["standardized_lang"], ctx["original_vtt"])
+
+
+async def translate_async(ctx):
+    """Translates into every target language concurrently; fills ctx['translated_vtts']."""
+    ctx["translated_vtts"] = {}
+    ctx["translated_texts"] = {}
+    segments = ctx.get("segments")
+    if not state["translator"] or not segments:
+        logger.warning("Skipping translation: Google client or segments not available.")
+        return
+
+    texts = [segment["text"].strip() for segment in segments if segment.get("text", "").strip()]
+    if not texts:
+        return
+    targets = flask_app.job_translation_targets(ctx)
+
+    async def one_language(lang_code):
+        try:
+            metrics.TRANSLATED_CHARS.inc(sum(len(text) for text in texts), target_lang=lang_code)
+            with metrics.step(ctx, "translation"), metrics.backend_call("google_translate", "translate"):
+                translated = await state["translator"].translate(texts, lang_code)
+            return lang_code, translated, flask_app.render_translated_vtt(segments, translated)
+        except Exception as e:
+            logger.warning("Translation to '%s' failed: %s", lang_code, e)
+            return lang_code, None, None
+
+    for lang_code, translated, vtt_content in await asyncio.gather(*(one_language(lang) for lang in targets)):
+        if vtt_content:
+            ctx["translated_vtts"][lang_code] = vtt_content
+            ctx["translated_texts"][lang_code] = translated
+            await run_blocking(flask_app.export_transcript, ctx, lang_code, vtt_content)
+
+
+async def store_async(ctx):
+    """Builds the document, upserts it through motor and cleans up the job's files."""
+    transcript_content = {}
+    if ctx.get("original_vtt"):
+        transcript_content[ctx["standardized_lang"]] = ctx["original_vtt"]
+    transcript_content.update(ctx.get("translated_vtts", {}))
+
+    doc_data = flask_app.build_ingest_document(ctx, transcript_content)
+    doc_data["processing_info"]["ingest_service"] = "async"
+    now = dt.now()
+    doc_data["last_updated"] = now
+
+    # Timing index first, so it exists once the document does
+    chunk_documents = []
+    for lang, segments in flask_app.timing_segments_by_lang(ctx).items():
+        chunk_documents.extend(transcript_store.build_chunk_documents(ctx["vtt_base_filename"], lang, segments))
+    try:
+        with metrics.step(ctx, "mongo"), metrics.backend_call("mongodb", "save_timings"):
+            await state["chunks"].delete_many({"job_id": ctx["vtt_base_filename"]})
+            if chunk_documents:
+                await state["chunks"].insert_many(chunk_documents)
+        doc_data["processing_info"]["timing_index"] = {
+            "chunks": len(chunk_documents), "words": sum(len(d["word_text"]) for d in chunk_documents)}
+    except Exception as e:
+        logger.warning("could not store transcript timings for %s: %s", ctx['vtt_base_filename'], e)
+        doc_data["processing_info"]["timing_index_error"] = str(e)
+    doc_data["processing_info"]["timings"] = metrics.timings_summary(ctx)
+
+    collection = state["collection"]
+    with metrics.step(ctx, "mongo"), metrics.backend_call("mongodb", "upsert"):
+        existing = await collection.find_one({"job_id": ctx["vtt_base_filename"]}, {"_id": 1})
+        if existing:
+            update_payload = {k: v for k, v in doc_data.items() if k != "date_added"}
+            result = await collection.update_one({"_id": existing["_id"]}, {"$set": update_payload})
+            db_status = "updated" if result.modified_count > 0 else "no change"
+            inserted_id = str(existing["_id"])
+        else:
+            doc_data["date_added"] = now
+            result = await collection.insert_one(doc_data)
+            db_status = "created"
+            inserted_id = str(result.inserted_id)
+    # Reaches the Flask workers' caches only with a shared RESPONSE_CACHE_URL backend
+    await run_blocking(flask_app.search_cache.invalidate, flask_app.CONTENT_CACHE_NAMESPACE)
+
+    await run_blocking(flask_app.cleanup_job_files, ctx)
+    ctx["db_status"] = db_status
+    ctx["response_data"] = flask_app.build_ingest_response(ctx, doc_data, db_status, inserted_id)
+
+
+async def run_ingest_job(ctx):
+    """Runs one job end to end; at most MAX_CONCURRENT_JOBS run at once per process."""
+    async with state["job_slots"]:
+        with logging_setup.job_context(ctx.get("job_id")):
+            timings = {}
+            try:
+                for name, step in (
+                    ("acquire", lambda: run_blocking(flask_app.stage_acquire_audio, ctx)),
+                    ("prepare", lambda: run_blocking(flask_app.stage_prepare_audio, ctx)),
+                    ("transcribe", lambda: transcribe_async(ctx)),
+                    ("translate", lambda: translate_async(ctx)),
+                    ("store", lambda: store_async(ctx)),
+                ):
+                    started = time.perf_counter()
+                    with metrics.stage(ctx, name):
+                        await step()
+                    timings[name] = round(time.perf_counter() - started, 3)
+                ctx["response_data"]["stage_timings"] = timings
+                metrics.INGEST_JOBS.inc(status="completed")
+                return ctx["response_data"]
+            except Exception:
+                metrics.INGEST_JOBS.inc(status="failed")
+                await run_blocking(flask_app.release_transcription_budget, ctx)
+                await run_blocking(flask_app.cleanup_job_files, ctx)
+                raise
+
+
+def _retire_finished_jobs(keep=500):
+    """Keeps only the most recent `keep` finished jobs for status lookups."""
+    finished = [jid for jid, job in state["jobs"].items() if job["status"] != "running"]
+    for jid in finished[:max(0, len(finished) - keep)]:
+        del state["jobs"][jid]
+
+
+# ---------------------
+# ROUTES
+# ---------------------
+async def parse_ingest_request_async():
+    """Quart counterpart of app.parse_ingest_request."""
+    if request.is_json:
+        data = await request.get_json()
+        if not data:
+            return None, ({"status": "error", "message": "Received JSON content type but empty request body"}, 400)
+        ctx, error = flask_app.build_ingest_context(data)
+    else:
+        files = await request.files
+        source_input = files.get("source")
+        if not source_input:
+            return None, ({"status": "error", "message": "Request must be JSON or multipart/form-data with a 'source' file"}, 415)
+        form = await request.form
+        ctx, error = flask_app.build_ingest_context(form, upload_filename=source_input.filename or "")
+        if ctx:
+            try:
+                await run_blocking(flask_app.open_job_workspace, ctx,
+                                   flask_app.upload_reserve_bytes(request.content_length))
+            except (flask_app.workspace.WorkspaceFull, flask_app.workspace.WorkspaceBusy) as e:
+                return None, flask_app.ingest_error_response(e)
+            ctx["source_hash"] = await run_blocking(flask_app.save_upload, source_input.stream, ctx["uploaded_file_path"])
+            if ctx["dedupe"]:
+                with metrics.backend_call("mongodb", "find_duplicate"):
+                    duplicate = await state["collection"].find_one({"source_hash": ctx["source_hash"]},
+                                                                   flask_app.DUPLICATE_PROJECTION)
+                if duplicate:
+                    metrics.UPLOAD_DEDUP_HITS.inc()
+                    await run_blocking(flask_app.cleanup_job_files, ctx)
+                    return None, (flask_app.duplicate_upload_response(ctx, duplicate), 200)
+            try:
+                await run_blocking(flask_app.accept_uploaded_media, ctx)
+            except flask_app.media_tools.MediaProbeError as e:
+                await run_blocking(flask_app.cleanup_job_files, ctx)
+                return None, ({"status": "error", "message": f"Invalid media file: {e}"}, 400)
+    if error:
+        return None, error
+    flask_app.log_ingest_request(ctx)
+    return ctx, None
+
+
+@app.route("/api/generate-transcription", methods=["POST"])
+async def generate_transcription_async():
+    """Same contract as the Flask endpoint, but the request awaits instead of holding a thread."""
+    ctx, error = await parse_ingest_request_async()
+    if error:
+        payload, status = error
+        return jsonify(payload), status
+    try:
+        response_data = await run_ingest_job(ctx)
+        return jsonify(response_data), 200
+    except Exception as e:
+        logger.exception("Async ingest failed: %s", e)
+        payload, status = flask_app.ingest_error_response(e)
+        return jsonify(payload), status
+
+
+@app.route("/api/jobs", methods=["POST"])
+async def submit_job_async():
+    """Starts the job as an asyncio task and returns 202 with an id to poll."""
+    ctx, error = await parse_ingest_request_async()
+    if error:
+        payload, status = error
+        return jsonify(payload), status
+
+    job_id = ctx["job_id"]
+    job = {"job_id": job_id, "status": "running", "submitted_at": time.time(), "result": None}
+    state["jobs"][job_id] = job
+
+    async def runner():
+        try:
+            job["result"] = await run_ingest_job(ctx)
+            job["status"] = "completed"
+        except Exception as e:
+            job["result"], _ = flask_app.ingest_error_response(e)
+            job["status"] = "failed"
+        job["finished_at"] = time.time()
+        _retire_finished_jobs()
+
+    asyncio.get_running_loop().create_task(runner())
+    return jsonify({"status": "queued", "pipeline_job_id": job_id,
+                    "cost_estimate": ctx.get("cost_estimate")}), 202
+
+
+@app.route("/api/jobs/<string:job_id>", methods=["GET"])
+async def get_job_async(job_id):
+    job = state["jobs"].get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/api/async/stats", methods=["GET"])
+async def async_stats():
+    statuses = {}
+    for job in state["jobs"].values():
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+    return jsonify({
+        "jobs": statuses,
+        "free_job_slots": state["job_slots"]._value,
+        "transcriber": state["transcriber"].stats if state["transcriber"] else None,
+    }), 200
+
+
+@app.route("/metrics", methods=["GET"])
+async def get_metrics_async():
+    """Prometheus scrape endpoint for this process."""
+    return Response(metrics.render(), status=200, content_type=metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5001)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end ingest benchmark with local stand-ins for every external service.
+
+Runs the real ingest code paths, i.e. the /api/generate-transcription endpoint
+(app.py, through the Flask test client) and trans.py process_audio(), against:
+
+    OpenAI      benchmarks/mock_openai_server.py (latency, rate limit, 5xx rate)
+    Translate   FakeTranslateClient below (per-call and per-character latency)
+    MongoDB     mongomock, or a real mongod with --mongo-uri
+    media       synthetic speech-like audio generated with ffmpeg
+
+Every (entry, size, concurrency) cell runs in a fresh subprocess so its peak
+RSS is its own. The report has throughput, p50/p99 end-to-end latency,
+p50/p99 per stage and step, and peak RSS of the process and its ffmpeg children.
+
+    python benchmarks/bench_pipeline.py --minutes 1,5 --concurrency 1,4 --jobs 8
+    python benchmarks/bench_pipeline.py --save-baseline            # record benchmarks/baselines/pipeline.json
+    python benchmarks/bench_pipeline.py --fail-on-regression       # compare with it (exit 1 on regression)
+
+Baselines are only comparable on the same machine with the same arguments;
+the arguments are stored with the baseline and a mismatch is reported.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FLASK_DIR = os.path.join(BENCH_DIR, "..")
+TRANSCRIPTION_DIR = os.path.join(FLASK_DIR, "..", "transcription")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+
+sys.path.insert(0, BENCH_DIR)
+
+# Options that change the numbers; a baseline is only compared when they match
+WORKLOAD_OPTIONS = ("jobs", "latency", "rps", "error_rate", "translate_latency", "translate_char_ms",
+                    "target_lang", "codec", "mongo")
+CODECS = {"aac": (".m4a", ["-c:a", "aac", "-b:a", "64k"]), "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "64k"])}
+
+
+class FakeTranslateClient:
+    """Same call shape as google.cloud.translate_v2.Client.translate, with simulated latency."""
+
+    def __init__(self, latency=0.1, char_ms=0.0):
+        self.latency = latency
+        self.char_ms = char_ms
+        self.calls = 0
+        self.characters = 0
+        self._lock = threading.Lock()
+
+    def translate(self, values, target_language="en", **kwargs):
+        items = values if isinstance(values, list) else [values]
+        characters = sum(len(str(item)) for item in items)
+        with self._lock:
+            self.calls += 1
+            self.characters += characters
+        time.sleep(self.latency + characters * self.char_ms / 1000.0)
+        results = [{"translatedText": f"[{target_language}] {item}", "input": item} for item in items]
+        return results if isinstance(values, list) else results[0]
+
+
+def use_mongomock():
+    """Points pymongo.MongoClient at mongomock; must run before app is imported."""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is not installed: pip install mongomock, or pass --mongo-uri")
+    import pymongo
+
+    class MockClient(mongomock.MongoClient):
+        def __init__(self, *args, **kwargs):
+            # The URI and pool/compression options are for a real server; mongomock answers
+            # the app's health check (admin.command("ping")) itself
+            super().__init__()
+
+    pymongo.MongoClient = MockClient
+
+
+def peak_rss_mb():
+    """(this process, largest child) peak resident set size in MB; ru_maxrss is KB on Linux."""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1))
+
+
+class StageRecorder:
+    """Collects per-job {name: seconds} dicts from the concurrently running jobs."""
+
+    def __init__(self):
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.current = {}
+
+    def add(self, name, seconds):
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            current[name] = current.get(name, 0.0) + seconds
+
+    def end(self):
+        with self._lock:
+            self.jobs.append(self._local.__dict__.pop("current", {}))
+
+    def timed(self, name, func):
+        def run(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return run
+
+    def summary(self):
+        names = sorted({name for job in self.jobs for name in job})
+        return {name: {"p50": _round(percentile([job[name] for job in self.jobs if name in job], 50)),
+                       "p99": _round(percentile([job[name] for job in self.jobs if name in job], 99))}
+                for name in names}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+# ---------------------
+# Entry points (run inside the worker subprocess)
+# ---------------------
+def setup_flask(recorder, translate_client):
+    import app as appmod
+
+    appmod.translator.set(translate_client)
+    run_inline = appmod.pipeline.run_inline
+
+    def recording_run_inline(stages, ctx):
+        # ctx["timings"] holds the stage and step times; the store stage is only in here, not in the document
+        try:
+            return run_inline(stages, ctx)
+        finally:
+            for group, prefix in (("stages", ""), ("steps", "step:")):
+                for name, seconds in ctx.get("timings", {}).get(group, {}).items():
+                    recorder.add(prefix + name, seconds)
+
+    appmod.pipeline.run_inline = recording_run_inline
+    client = appmod.app.test_client()
+
+    def run_job(index, media_path, options):
+        with open(media_path, "rb") as f:
+            # Every post is a new job: the same file is otherwise a duplicate, or one resumable job
+            response = client.post("/api/generate-transcription", content_type="multipart/form-data", data={
+                "source_type": "file", "skip_silence": "true", "dedupe": "false",
+                "job_key": f"bench-{os.getpid()}-{index}",
+                "source": (f, f"bench_{index}{os.path.splitext(media_path)[1]}"),
+            })
+        return response.status_code == 200
+
+    return run_job
+
+
+def setup_cli(recorder, translate_client):
+    sys.path.insert(0, TRANSCRIPTION_DIR)
+    import trans
+
+    trans.translator.set(translate_client)
+    outcome = threading.local()
+    transcribe_to_vtt = recorder.timed("transcribe", trans.transcribe_to_vtt)
+
+    def recording_transcribe_to_vtt(*args, **kwargs):
+        result = transcribe_to_vtt(*args, **kwargs)
+        outcome.segments = result[0]
+        return result
+
+    trans.transcribe_to_vtt = recording_transcribe_to_vtt
+    trans.translate_vtt = recorder.timed("translate", trans.translate_vtt)
+
+    def run_job(index, media_path, options):
+        # process_audio names its outputs after the input file, so give each job its own copy
+        job_path = os.path.join("audio_files", f"bench_{index}{os.path.splitext(media_path)[1]}")
+        shutil.copy(media_path, job_path)
+        outcome.segments = None
+        try:
+            trans.process_audio(2, input_path=job_path, transcription_method=1,
+                                target_lang_for_translation=options["target_lang"], skip_silence=True)
+        finally:
+            os.remove(job_path)
+        return outcome.segments is not None
+
+    return run_job
+
+
+def run_cell(options):
+    """One (entry, minutes, concurrency) measurement; returns the result dict."""
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(workdir)  # app.py and trans.py write their scratch files relative to the cwd
+    os.environ["LOG_LEVEL"] = options["log_level"]
+
+    from mock_openai_server import start_mock_server
+    server, base_url = start_mock_server(latency=options["latency"], rps=options["rps"],
+                                         error_rate=options["error_rate"],
+                                         audio_duration=options["minutes"] * 60.0)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    if options["mongo_uri"]:
+        os.environ["MONGODB_URI"] = options["mongo_uri"]
+    else:
+        os.environ["MONGODB_URI"] = "mongodb://mongomock.invalid:27017"
+        use_mongomock()
+    sys.path.insert(0, FLASK_DIR)
+    # Imported only now: transcription_client reads OPENAI_BASE_URL at import time
+    from bench_youtube_audio import synthesize
+
+    ext, codec_args = CODECS[options["codec"]]
+    media_path = os.path.join(workdir, f"source{ext}")
+    synthesize(options["ffmpeg"], media_path, options["minutes"], codec_args)
+
+    recorder = StageRecorder()
+    translate_client = FakeTranslateClient(options["translate_latency"], options["translate_char_ms"])
+    setup = setup_flask if options["entry"] == "flask" else setup_cli
+    run_job = setup(recorder, translate_client)
+
+    def one(index):
+        recorder.begin()
+        started = time.perf_counter()
+        try:
+            ok = run_job(index, media_path, options)
+        except Exception as e:
+            print(f"job {index} raised {e!r}", file=sys.stderr)
+            ok = False
+        elapsed = time.perf_counter() - started
+        recorder.end()
+        return ok, elapsed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+        outcomes = list(pool.map(one, range(options["jobs"])))
+    wall = time.perf_counter() - started
+    server.shutdown()
+
+    latencies = [elapsed for ok, elapsed in outcomes if ok]
+    self_rss, child_rss = peak_rss_mb()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "ok": len(latencies),
+        "failed": len(outcomes) - len(latencies),
+        "wall_sec": round(wall, 3),
+        "jobs_per_min": round(len(latencies) / wall * 60, 2),
+        "audio_hours_per_hour": round(len(latencies) * options["minutes"] / 60.0 / (wall / 3600), 1),
+        "p50_sec": _round(percentile(latencies, 50)),
+        "p99_sec": _round(percentile(latencies, 99)),
+        "stages": recorder.summary(),
+        "peak_rss_mb": self_rss,
+        "peak_child_rss_mb": child_rss,
+        "api": dict(server.stats),
+        "translate_calls": translate_client.calls,
+    }
+
+
+def worker_main(config_path, result_path):
+    with open(config_path) as f:
+        options = json.load(f)
+    # trans.py prints progress to stdout; keep the report readable
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = run_cell(options)
+        finally:
+            sys.stdout = stdout
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+# ---------------------
+# Driver
+# ---------------------
+def cell_key(entry, minutes, concurrency):
+    return f"{entry}/{minutes:g}min/c{concurrency}"
+
+
+def run_in_subprocess(options):
+    with tempfile.TemporaryDirectory(prefix="bench_cell_") as tmp:
+        config_path = os.path.join(tmp, "config.json")
+        result_path = os.path.join(tmp, "result.json")
+        with open(config_path, "w") as f:
+            json.dump(options, f)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", config_path, result_path],
+                       check=True)
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def print_result(key, result):
+    print(f"{key:<22} {result['ok']}/{result['ok'] + result['failed']} ok  wall {result['wall_sec']:7.2f}s  "
+          f"{result['jobs_per_min']:7.2f} jobs/min  {result['audio_hours_per_hour']:8.1f} audio-h/h  "
+          f"p50 {result['p50_sec'] or 0:6.2f}s  p99 {result['p99_sec'] or 0:6.2f}s  "
+          f"rss {result['peak_rss_mb']:.0f} MB (ffmpeg {result['peak_child_rss_mb']:.0f} MB)  "
+          f"api {result['api']}")
+    for name, values in result["stages"].items():
+        print(f"    {name:<20} p50 {values['p50'] or 0:7.3f}s  p99 {values['p99'] or 0:7.3f}s")
+
+
+def compare(results, baseline, tolerance):
+    """Lists the metrics that got worse than the baseline by more than tolerance (a fraction)."""
+    regressions = []
+    checks = (("jobs_per_min", -1), ("p50_sec", 1), ("p99_sec", 1), ("peak_rss_mb", 1))
+    for key, result in results.items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        for metric, direction in checks:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > tolerance:
+                regressions.append(f"{key} {metric}: {old} -> {new} ({change:+.0%} worse)")
+        for name, values in result["stages"].items():
+            old = before.get("stages", {}).get(name, {}).get("p99")
+            # Sub-10ms stages are noise
+            if old and old >= 0.01 and values["p99"] is not None and (values["p99"] - old) / old > tolerance:
+                regressions.append(f"{key} stage {name} p99: {old} -> {values['p99']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--entry", choices=["flask", "cli", "both"], default="both")
+    parser.add_argument("--minutes", default="1,5", help="Comma-separated synthetic audio lengths")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--jobs", type=int, default=8, help="Jobs per cell")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock OpenAI mean latency (s)")
+    parser.add_argument("--rps", type=float, default=0.0, help="Mock OpenAI rate limit (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock OpenAI 503 fraction")
+    parser.add_argument("--translate-latency", type=float, default=0.1, help="Fake Translate per-call latency (s)")
+    parser.add_argument("--translate-char-ms", type=float, default=0.0, help="Fake Translate latency per character")
+    parser.add_argument("--target-lang", default="en", help="Translation target for the CLI entry")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="aac")
+    parser.add_argument("--mongo-uri", default=None, help="Real mongod to use instead of mongomock")
+    parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--worker", nargs=2, metavar=("CONFIG", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker_main(*args.worker)
+        return
+
+    entries = ["flask", "cli"] if args.entry == "both" else [args.entry]
+    sizes = [float(m) for m in args.minutes.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    workload = {name: getattr(args, name) for name in WORKLOAD_OPTIONS if hasattr(args, name)}
+    workload["mongo"] = "mongod" if args.mongo_uri else "mongomock"
+
+    results = {}
+    for entry in entries:
+        for minutes in sizes:
+            for concurrency in levels:
+                options = dict(vars(args), entry=entry, minutes=minutes, concurrency=concurrency)
+                key = cell_key(entry, minutes, concurrency)
+                results[key] = run_in_subprocess(options)
+                print_result(key, results[key])
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("workload") != workload:
+            print(f"\nBaseline {args.baseline} was recorded with {baseline.get('workload')}; not comparing.")
+        else:
+            regressions = compare(results, baseline, args.tolerance)
+            print(f"\nCompared with baseline from {baseline.get('recorded_at')}: "
+                  f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            for line in regressions:
+                print(f"  REGRESSION {line}")
+            if regressions and args.fail_on_regression:
+                sys.exit(1)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        # Merge so a partial run (one entry, one size) does not drop the other cells
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get("workload") != workload:
+                baseline = {"results": {}}
+        baseline.update(workload=workload, recorded_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        python=sys.version.split()[0], cpu_count=os.cpu_count())
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
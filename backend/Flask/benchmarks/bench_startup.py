@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker startup cost: lazy service initialization vs. the old eager startup.
+
+Each run imports app.py in a fresh interpreter (what every gunicorn worker
+and CLI invocation pays), once with lazy services (the default) and once
+with SERVICES_EAGER=true, which builds the Mongo client, the Google
+Translate client and the ffmpeg toolkit at import as before. It reports the
+import time, which heavy modules were loaded, RSS after import and the
+latency of the first search request. The CLI entry is timed with
+`trans.py --help` (the full module import).
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --mongo-uri mongodb://localhost:27017
+
+Without --mongo-uri, mongomock stands in for MongoDB. It imports pymongo
+itself, so in that mode the pymongo import shows up in neither column.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FLASK_DIR = os.path.dirname(BENCH_DIR)
+TRANS_PY = os.path.join(FLASK_DIR, "..", "transcription", "trans.py")
+
+HEAVY_MODULES = ("pymongo", "yt_dlp", "google.cloud.translate_v2", "whisper")
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = r"""
+import json, os, resource, sys, time
+sys.path[:0] = [{bench_dir!r}, {flask_dir!r}]
+if {use_mongomock!r}:
+    from bench_pipeline import use_mongomock
+    use_mongomock()
+preloaded = set(sys.modules)
+started = time.perf_counter()
+import app
+import_sec = time.perf_counter() - started
+client = app.app.test_client()
+started = time.perf_counter()
+status = client.get("/api/search-content?field=title&query=startup").status_code
+first_search_sec = time.perf_counter() - started
+print(json.dumps({{
+    "import_sec": import_sec,
+    "first_search_sec": first_search_sec,
+    "search_status": status,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in {heavy!r} if m in sys.modules and m not in preloaded],
+}}))
+"""
+
+
+def run_probe(eager, use_mongomock, env):
+    code = PROBE.format(bench_dir=BENCH_DIR, flask_dir=FLASK_DIR, use_mongomock=use_mongomock,
+                        heavy=HEAVY_MODULES)
+    child_env = dict(env, SERVICES_EAGER="true" if eager else "false", LOG_LEVEL="ERROR")
+    result = subprocess.run([sys.executable, "-c", code], env=child_env, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def wall_time(command, env):
+    started = time.perf_counter()
+    subprocess.run(command, env=env, capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mongo-uri", default=None, help="Real mongod (default: mongomock)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGODB_URI=args.mongo_uri or "mongodb://mongomock.invalid:27017",
+               SERVICE_HEALTH_INTERVAL_SEC="0")
+    os.chdir(FLASK_DIR)
+
+    for label, eager in (("lazy", False), ("eager", True)):
+        runs = [run_probe(eager, not args.mongo_uri, env) for _ in range(args.runs)]
+        import_times = [r["import_sec"] for r in runs]
+        first_search = [r["first_search_sec"] for r in runs]
+        print(f"{label:>6}: import app median {statistics.median(import_times) * 1000:7.1f} ms "
+              f"(min {min(import_times) * 1000:.1f})  first search {statistics.median(first_search) * 1000:7.1f} ms "
+              f"(HTTP {runs[0]['search_status']})  rss {statistics.median(r['rss_mb'] for r in runs):.0f} MB  "
+              f"loaded at import: {', '.join(runs[0]['loaded']) or '-'}")
+
+    baseline = [wall_time([sys.executable, "-c", "pass"], env) for _ in range(args.runs)]
+    cli = [wall_time([sys.executable, TRANS_PY, "--help"], env) for _ in range(args.runs)]
+    print(f"   cli: trans.py --help median {statistics.median(cli) * 1000:7.1f} ms "
+          f"(interpreter alone {statistics.median(baseline) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput of the shared TranscriptionClient against a rate-limited mock API.
+
+Compares the pooled/retrying client with the old one-shot requests.post call:
+
+    python benchmarks/bench_transcription_client.py --jobs 40 --concurrency 8 --rps 4 --error-rate 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mock_openai_server import start_mock_server  # noqa: E402
+from transcription_client import TranscriptionClient, TranscriptionError  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(label, call, jobs, concurrency):
+    latencies = []
+    failures = 0
+
+    def one(_):
+        started = time.perf_counter()
+        ok = call()
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ok, elapsed in pool.map(one, range(jobs)):
+            if ok:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+    wall = time.perf_counter() - started
+    print(f"{label:>8}: {len(latencies)}/{jobs} ok, {failures} failed, wall {wall:.2f}s, "
+          f"throughput {len(latencies) / wall:.2f} req/s, "
+          f"p50 {percentile(latencies, 50) or 0:.2f}s, p99 {percentile(latencies, 99) or 0:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rps", type=float, default=4.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--audio-kb", type=int, default=512, help="Size of the dummy upload")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
+        f.write(os.urandom(args.audio_kb * 1024))
+        audio_path = f.name
+
+    try:
+        # --- Naive: bare requests.post, no session, no retry ---
+        server, base_url = start_mock_server(latency=args.latency, rps=args.rps, error_rate=args.error_rate)
+
+        def naive_call():
+            with open(audio_path, "rb") as audio_file:
+                response = requests.post(f"{base_url}/audio/transcriptions",
+                                         headers={"Authorization": "Bearer test"},
+                                         data={"model": "whisper-1", "response_format": "verbose_json"},
+                                         files={"file": ("audio.mp3", audio_file)}, timeout=60)
+            return response.status_code == 200
+
+        run("naive", naive_call, args.jobs, args.concurrency)
+        print(f"          server saw {server.stats}")
+        server.shutdown()
+
+        # --- Shared client: pooled session, backoff + Retry-After, per-key concurrency limit ---
+        server, base_url = start_mock_server(latency=args.latency, rps=args.rps, error_rate=args.error_rate)
+        client = TranscriptionClient("bench-key", base_url=base_url, read_timeout=60,
+                                     max_retries=8, max_concurrency=args.concurrency)
+
+        def client_call():
+            try:
+                client.transcribe(audio_path)
+                return True
+            except (TranscriptionError, requests.exceptions.RequestException):
+                return False
+
+        run("client", client_call, args.jobs, args.concurrency)
+        print(f"          server saw {server.stats}, client stats {client.stats}")
+        server.shutdown()
+    finally:
+        os.remove(audio_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of the YouTube audio post-processing step, per hour of audio.
+
+Synthesizes audio in the two containers YouTube serves (webm/Opus, format 251,
+and m4a/AAC, format 140), then times what happens to a finished download:
+
+    mp3     yt-dlp FFmpegExtractAudio -> 192 kbps MP3 (the old behaviour)
+    remux   stream copy into an API-accepted container (-c:a copy)
+    native  keep the file as downloaded (no subprocess at all)
+
+    python benchmarks/bench_youtube_audio.py --minutes 10
+    python benchmarks/bench_youtube_audio.py --url https://www.youtube.com/watch?v=...   # real downloads too
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import youtube_audio  # noqa: E402
+
+SOURCES = {
+    "webm/opus": (".webm", ["-c:a", "libopus", "-b:a", "128k"]),
+    "m4a/aac": (".m4a", ["-c:a", "aac", "-b:a", "128k"]),
+}
+
+
+def child_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(func):
+    """Returns (wall_seconds, child_cpu_seconds) spent in func()."""
+    cpu_before = child_cpu_seconds()
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started, child_cpu_seconds() - cpu_before
+
+
+def synthesize(ffmpeg_bin, path, minutes, codec_args):
+    # Speech-like test signal: a tone switched between loud and near-silent
+    command = [ffmpeg_bin, "-y", "-f", "lavfi", "-i",
+               f"sine=frequency=220:sample_rate=48000:duration={minutes * 60}",
+               "-af", "volume='if(lt(mod(t,4),3),1,0.05)':eval=frame",
+               "-ac", "2", *codec_args, "-loglevel", "error", path]
+    subprocess.run(command, check=True)
+
+
+def run_ffmpeg(ffmpeg_bin, args):
+    subprocess.run([ffmpeg_bin, "-y", *args, "-loglevel", "error"], check=True)
+
+
+def report(label, wall, cpu, size, hours):
+    print(f"  {label:<8} wall {wall / hours:8.1f} s/h   cpu {cpu / hours:8.1f} s/h   "
+          f"upload {size / hours / 1e6:7.1f} MB/h")
+
+
+def bench_local(ffmpeg_bin, minutes, workdir):
+    hours = minutes / 60.0
+    for name, (ext, codec_args) in SOURCES.items():
+        source = os.path.join(workdir, f"source{ext}")
+        synthesize(ffmpeg_bin, source, minutes, codec_args)
+        print(f"{name} ({minutes} min synthetic, {os.path.getsize(source) / 1e6:.1f} MB)")
+
+        mp3_out = os.path.join(workdir, "out.mp3")
+        wall, cpu = measure(lambda: run_ffmpeg(ffmpeg_bin, ["-i", source, "-vn", "-c:a", "libmp3lame",
+                                                            "-b:a", "192k", mp3_out]))
+        report("mp3", wall, cpu, os.path.getsize(mp3_out), hours)
+
+        copy = os.path.join(workdir, f"copy{ext}")
+        shutil.copy(source, copy)
+        acodec = "opus" if ext == ".webm" else "mp4a.40.2"
+        remuxed = {}
+        wall, cpu = measure(lambda: remuxed.setdefault("path", youtube_audio.remux_audio(copy, acodec, ffmpeg_bin)))
+        report("remux", wall, cpu, os.path.getsize(remuxed["path"]), hours)
+
+        wall, cpu = measure(lambda: None)
+        report("native", wall, cpu, os.path.getsize(source), hours)
+
+        for path in (source, mp3_out, remuxed["path"]):
+            os.remove(path)
+
+
+def bench_url(url, workdir):
+    for mode in ("mp3", "native"):
+        template = os.path.join(workdir, f"{mode}_%(id)s.%(ext)s")
+        result = {}
+
+        def download():
+            result["path"], result["info"] = youtube_audio.download_audio(url, template, mode=mode, quiet=True)
+
+        wall, cpu = measure(download)
+        hours = (result["info"].get("duration") or 0) / 3600.0 or 1.0
+        print(f"{mode:>6}: {os.path.basename(result['path'])}")
+        report(mode, wall, cpu, os.path.getsize(result["path"]), hours)
+        os.remove(result["path"])
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the synthetic audio")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--url", help="Also download this video in mp3 and native mode (needs network)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_youtube_audio_")
+    try:
+        print("Post-processing cost, normalised per hour of audio:")
+        bench_local(args.ffmpeg, args.minutes, workdir)
+        if args.url:
+            print(f"\nEnd-to-end download of {args.url}:")
+            bench_url(args.url, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test of the MongoDB access layer (database.py): pool size, wire
+compression, search read preference and ingest write concern.
+
+Seeds a scratch database with transcript-sized documents, then runs a mix of
+search threads (the search-content query: case-insensitive title regex,
+newest first, one page) and ingest threads (upserts of whole transcript
+documents) for a fixed time per configuration. It reports ops/s, p50/p99 per
+operation, errors (pool wait-queue timeouts included), and the bytes the
+server sent and received (serverStatus.network), which shows what
+compression saves.
+
+    python benchmarks/load_mongo.py --mongo-uri mongodb://localhost:27017 \\
+        --pool-sizes 5,50 --compressors none,zlib,zstd --threads 32 --duration 20
+    python benchmarks/load_mongo.py --mongo-uri "mongodb://a,b,c/?replicaSet=rs0" \\
+        --read-preferences primary,secondaryPreferred --write-concerns 1,majority
+
+Use a real mongod: mongomock (--mongomock) only checks that the script runs.
+The scratch database (loadtest_<pid>) is dropped at the end unless --keep.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import database  # noqa: E402
+
+WORDS = ["dharma", "practice", "mind", "compassion", "teacher", "meditation", "breath", "awareness",
+         "stupa", "kathmandu", "valley", "monastery", "retreat", "morning", "evening", "question"]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def synthetic_vtt(size_kb, rng):
+    """Speech-like VTT text of roughly size_kb kilobytes."""
+    lines = ["WEBVTT", ""]
+    t = 0.0
+    size = 0
+    while size < size_kb * 1024:
+        text = " ".join(rng.choice(WORDS) for _ in range(12))
+        cue = f"{time.strftime('%H:%M:%S', time.gmtime(t))}.000 --> {time.strftime('%H:%M:%S', time.gmtime(t + 4))}.000"
+        lines.extend([cue, text, ""])
+        size += len(cue) + len(text) + 2
+        t += 4
+    return "\n".join(lines)
+
+
+def make_document(index, size_kb, rng):
+    vtt = synthetic_vtt(size_kb, rng)
+    return {
+        "job_id": f"load_{index}",
+        "title": f"{rng.choice(WORDS).title()} talk {index}",
+        "speaker": rng.choice(["Lama A", "Lama B", "Geshe C"]),
+        "source_location": rng.choice(["Boudha", "Swayambhu", "Patan"]),
+        "transcript_content": {"en": vtt, "ne": vtt},
+        "date_added": datetime.now(),
+        "last_updated": datetime.now(),
+    }
+
+
+def network_bytes(client):
+    """(bytesIn, bytesOut) as counted by the server, or None (mongomock, missing privileges)."""
+    try:
+        network = client.admin.command("serverStatus")["network"]
+        return network["bytesIn"], network["bytesOut"]
+    except Exception:
+        return None
+
+
+def run_config(args, pool_size, compressor, read_preference, write_concern, documents):
+    overrides = {"maxPoolSize": pool_size, "compressors": "" if compressor == "none" else compressor}
+    client = connect(args, **overrides)
+    db = client[args.db]
+    coll = db["media_transcripts"]
+    search_coll = coll.with_options(read_preference=database.search_read_preference(read_preference,
+                                                                                    args.max_staleness))
+    ingest_coll = coll.with_options(write_concern=database.ingest_write_concern(write_concern))
+    search_coll.find_one({})  # Connect before timing
+
+    latencies = {"search": [], "ingest": []}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    before = network_bytes(client)
+
+    def worker(kind, seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                if kind == "search":
+                    query = rng.choice(WORDS)[:rng.randint(3, 6)]
+                    list(search_coll.find({"title": {"$regex": query, "$options": "i"}})
+                         .sort("date_added", -1).limit(args.page_size))
+                else:
+                    doc = dict(rng.choice(documents))
+                    doc["last_updated"] = datetime.now()
+                    doc.pop("_id", None)
+                    ingest_coll.update_one({"job_id": doc["job_id"]}, {"$set": doc}, upsert=True)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[kind].append(elapsed)
+
+    writers = max(0, min(args.threads, round(args.threads * args.write_fraction)))
+    kinds = ["ingest"] * writers + ["search"] * (args.threads - writers)
+    threads = [threading.Thread(target=worker, args=(kind, i)) for i, kind in enumerate(kinds)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    after = network_bytes(client)
+    client.close()
+
+    label = f"pool={pool_size:<4} compress={compressor:<6} read={read_preference:<18} w={write_concern:<8}"
+    parts = []
+    for kind, values in latencies.items():
+        if values:
+            parts.append(f"{kind} {len(values) / wall:7.1f}/s p50 {percentile(values, 50) * 1000:6.1f}ms "
+                         f"p99 {percentile(values, 99) * 1000:7.1f}ms")
+    if before and after:
+        parts.append(f"server in {(after[0] - before[0]) / wall / 1e6:6.2f} MB/s "
+                     f"out {(after[1] - before[1]) / wall / 1e6:6.2f} MB/s")
+    if errors:
+        parts.append(f"errors {errors}")
+    print(f"{label} " + "  ".join(parts))
+
+
+def connect(args, **overrides):
+    if args.mongomock:
+        import mongomock
+        return mongomock.MongoClient()
+    return database.connect(args.mongo_uri, **overrides)
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--mongomock", action="store_true", help="Dry run without a server")
+    parser.add_argument("--db", default=f"loadtest_{os.getpid()}")
+    parser.add_argument("--keep", action="store_true", help="Do not drop the scratch database")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--doc-kb", type=int, default=150, help="Approximate size of each transcript")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent requests (one worker's threads)")
+    parser.add_argument("--write-fraction", type=float, default=0.1, help="Share of threads doing ingest writes")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per configuration")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pool-sizes", default=str(database.MONGO_MAX_POOL_SIZE))
+    parser.add_argument("--compressors", default="none,zlib,zstd,snappy")
+    parser.add_argument("--read-preferences", default="primary")
+    parser.add_argument("--max-staleness", type=int, default=database.MONGO_SEARCH_MAX_STALENESS_SEC)
+    parser.add_argument("--write-concerns", default=database.MONGO_INGEST_W)
+    args = parser.parse_args()
+
+    compressors = []
+    for name in args.compressors.split(","):
+        if name == "none" or database.available_compressors(name):
+            compressors.append(name)
+        else:
+            print(f"skipping {name}: its Python package is not installed")
+
+    rng = random.Random(42)
+    print(f"Seeding {args.documents} documents of ~{args.doc_kb * 2} KB into {args.db} ...")
+    documents = [make_document(i, args.doc_kb, rng) for i in range(args.documents)]
+    seed_client = connect(args)
+    seed_coll = seed_client[args.db]["media_transcripts"]
+    seed_coll.insert_many([dict(d) for d in documents])
+    seed_coll.create_index("job_id")
+    seed_coll.create_index([("date_added", -1)])
+
+    try:
+        for pool_size, compressor, read_preference, write_concern in itertools.product(
+                [int(p) for p in args.pool_sizes.split(",")], compressors,
+                args.read_preferences.split(","), args.write_concerns.split(",")):
+            run_config(args, pool_size, compressor, read_preference, write_concern, documents)
+    finally:
+        if not args.keep:
+            seed_client.drop_database(args.db)
+        seed_client.close()
+
+
+if __name__ == "__main__":
+    main()
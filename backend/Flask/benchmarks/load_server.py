@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test of the gunicorn setups: does search latency stay flat while ingests run?
+
+Each scenario starts real gunicorn servers:
+
+    legacy  `gunicorn app:app` with gunicorn's defaults (the old Procfile)
+    all     gunicorn.conf.py, GUNICORN_ROLE=all, wsgi:app
+    split   two servers, GUNICORN_ROLE=read (wsgi:read_app) and
+            GUNICORN_ROLE=ingest (wsgi:ingest_app); searches go to the first,
+            ingests to the second, as the reverse proxy would route them
+
+Search clients query /api/search-content continuously. After --quiet-sec
+of searches alone, --ingest-clients start uploading synthetic audio to
+/api/generate-transcription in a loop for --loaded-sec. The report compares
+search throughput and p50/p99/max without and with ingests running, and
+counts ingest outcomes and gunicorn WORKER TIMEOUTs.
+
+    python benchmarks/load_server.py --scenarios legacy,all,split --search-clients 16 --ingest-clients 4
+    python benchmarks/load_server.py --openai-latency 40    # ingests longer than the old 30 s timeout
+
+Stand-ins: OpenAI is benchmarks/mock_openai_server.py, Google Translate is
+bench_pipeline.FakeTranslateClient, MongoDB is mongomock unless --mongo-uri
+is given. With mongomock every worker has its own in-memory copy of the
+seeded documents; use a real mongod for representative search latency.
+The response cache is disabled (RESPONSE_CACHE_TTL_SEC=0) so every search
+reaches the database. Needs ffmpeg on PATH.
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FLASK_DIR = os.path.dirname(BENCH_DIR)
+GUNICORN_CONF = os.path.join(FLASK_DIR, "gunicorn.conf.py")
+
+WORDS = ["dharma", "practice", "mind", "compassion", "teacher", "meditation", "breath", "awareness",
+         "stupa", "kathmandu", "valley", "monastery", "retreat", "morning", "evening", "question"]
+
+
+# ---------------------
+# Server side (imported by gunicorn)
+# ---------------------
+def seed_documents(collection, count, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now()
+    collection.insert_many([{
+        "job_id": f"load_{i}",
+        "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} talk {i}",
+        "speaker": rng.choice(["Lama A", "Lama B", "Geshe C"]),
+        "source_location": rng.choice(["Boudha", "Swayambhu", "Patan"]),
+        "keywords": rng.sample(WORDS, 5),
+        "date_added": now - timedelta(minutes=i),
+    } for i in range(count)])
+
+
+def make_app(role):
+    """gunicorn app factory, e.g. 'load_server:make_app("read")': the app with the stand-ins installed."""
+    sys.path.insert(0, BENCH_DIR)
+    from bench_pipeline import FakeTranslateClient, use_mongomock
+
+    mongomock = os.getenv("LOAD_MONGOMOCK") == "1"
+    if mongomock:
+        use_mongomock()
+    import app as appmod
+
+    translate_latency = float(os.getenv("LOAD_TRANSLATE_LATENCY", "0.5"))
+    # Factories rather than set(): the workers are forked after this runs and build their own clients
+    appmod.translator.factory = lambda: FakeTranslateClient(translate_latency)
+    if mongomock:
+        connect_mongo = appmod.mongo.factory
+
+        def connect_and_seed():
+            client = connect_mongo()
+            seed_documents(client[appmod.database.MONGO_DB_NAME]["media_transcripts"],
+                           int(os.getenv("LOAD_SEED_DOCUMENTS", "500")))
+            return client
+
+        appmod.mongo.factory = connect_and_seed
+
+    if role == "legacy":
+        return appmod.app
+    import wsgi
+    return {"all": wsgi.app, "read": wsgi.read_app, "ingest": wsgi.ingest_app}[role]
+
+
+# ---------------------
+# Client side
+# ---------------------
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(role, port, env, log_path, workers=None):
+    command = [sys.executable, "-m", "gunicorn", "--chdir", FLASK_DIR, "--pythonpath", BENCH_DIR,
+               "--bind", f"127.0.0.1:{port}"]
+    if role != "legacy":
+        command += ["-c", GUNICORN_CONF]
+    if workers:
+        command += ["--workers", str(workers)]
+    command.append(f'load_server:make_app("{role}")')
+    server_env = dict(env, GUNICORN_ROLE="all" if role == "legacy" else role)
+    log = open(log_path, "w")
+    # Started from BENCH_DIR so gunicorn does not pick up ./gunicorn.conf.py for the legacy run
+    return subprocess.Popen(command, cwd=BENCH_DIR, env=server_env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(session, url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            # /api/services is answered by every role; this also builds (and seeds) the Mongo client
+            if session.get(url + "/api/services", timeout=5).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_scenario(name, args, env, media_path, workdir):
+    import requests
+
+    roles = [("read", "search"), ("ingest", "ingest")] if name == "split" else [(name, "both")]
+    processes, logs, urls = [], [], {}
+    try:
+        for role, serves in roles:
+            port = free_port()
+            log_path = os.path.join(workdir, f"{name}-{role}.log")
+            processes.append(start_server(role, port, env, log_path, args.workers))
+            logs.append(log_path)
+            url = f"http://127.0.0.1:{port}"
+            wait_ready(requests.Session(), url, processes[-1])
+            if serves in ("search", "both"):
+                urls["search"] = url
+            if serves in ("ingest", "both"):
+                urls["ingest"] = url
+
+        phase = ["quiet"]
+        stop = threading.Event()
+        lock = threading.Lock()
+        searches = {"quiet": [], "loaded": []}
+        search_errors = {"quiet": 0, "loaded": 0}
+        ingests = []
+
+        def search_client(seed):
+            rng = random.Random(seed)
+            session = requests.Session()
+            while not stop.is_set():
+                current = phase[0]
+                field = rng.choice(["title", "keywords", "speaker"])
+                query = rng.choice(WORDS if field != "speaker" else ["Lama", "Geshe"])
+                started = time.perf_counter()
+                try:
+                    ok = session.get(f"{urls['search']}/api/search-content",
+                                     params={"field": field, "query": query},
+                                     timeout=args.search_timeout).status_code == 200
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if ok:
+                        searches[current].append(elapsed)
+                    else:
+                        search_errors[current] += 1
+
+        def ingest_client(index):
+            session = requests.Session()
+            count = 0
+            while not stop.is_set():
+                count += 1
+                started = time.perf_counter()
+                try:
+                    with open(media_path, "rb") as f:
+                        # Every post is a new job: the same file is otherwise a duplicate, or one resumable job
+                        status = session.post(f"{urls['ingest']}/api/generate-transcription",
+                                              data={"source_type": "file", "skip_silence": "true", "dedupe": "false",
+                                                    "job_key": f"load-{os.getpid()}-{index}-{count}"},
+                                              files={"source": (f"load_{index}_{count}.mp3", f)},
+                                              timeout=args.ingest_timeout).status_code
+                except Exception as e:
+                    status = type(e).__name__
+                with lock:
+                    ingests.append((status, time.perf_counter() - started))
+                if status == 503:
+                    time.sleep(1)
+
+        searchers = [threading.Thread(target=search_client, args=(i,), daemon=True)
+                     for i in range(args.search_clients)]
+        for thread in searchers:
+            thread.start()
+        time.sleep(args.quiet_sec)
+        phase[0] = "loaded"
+        ingesters = [threading.Thread(target=ingest_client, args=(i,), daemon=True)
+                     for i in range(args.ingest_clients)]
+        for thread in ingesters:
+            thread.start()
+        time.sleep(args.loaded_sec)
+        stop.set()
+        for thread in searchers:
+            thread.join()
+        for thread in ingesters:
+            thread.join(timeout=args.drain_sec)
+        unfinished = sum(thread.is_alive() for thread in ingesters)
+    finally:
+        for process in processes:
+            stop_server(process)
+
+    timeouts = 0
+    for log_path in logs:
+        with open(log_path, errors="replace") as f:
+            timeouts += f.read().count("WORKER TIMEOUT")
+
+    for label, seconds in (("quiet", args.quiet_sec), ("loaded", args.loaded_sec)):
+        values = searches[label]
+        stats = (f"{len(values) / seconds:7.1f}/s p50 {percentile(values, 50) * 1000:7.1f}ms "
+                 f"p99 {percentile(values, 99) * 1000:7.1f}ms max {max(values) * 1000:7.1f}ms"
+                 if values else "no successful searches")
+        print(f"{name:>7}  search {label:<6} {stats}  errors {search_errors[label]}")
+    outcomes = {}
+    for status, _ in ingests:
+        outcomes[status] = outcomes.get(status, 0) + 1
+    durations = [elapsed for status, elapsed in ingests if status == 200]
+    print(f"{name:>7}  ingest finished {len(ingests)} {outcomes}"
+          + (f" p50 {percentile(durations, 50):.1f}s" if durations else "")
+          + f", still running {unfinished}, worker timeouts {timeouts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--scenarios", default="legacy,all,split")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Workers per server (default: gunicorn's for legacy, gunicorn.conf.py's otherwise)")
+    parser.add_argument("--search-clients", type=int, default=16)
+    parser.add_argument("--ingest-clients", type=int, default=4)
+    parser.add_argument("--quiet-sec", type=float, default=10.0, help="Searches only")
+    parser.add_argument("--loaded-sec", type=float, default=30.0, help="Searches while ingests run")
+    parser.add_argument("--drain-sec", type=float, default=5.0, help="Wait for in-flight ingests at the end")
+    parser.add_argument("--search-timeout", type=float, default=30.0)
+    parser.add_argument("--ingest-timeout", type=float, default=600.0)
+    parser.add_argument("--minutes", type=float, default=1.0, help="Length of the uploaded audio")
+    parser.add_argument("--openai-latency", type=float, default=3.0, help="Mock transcription latency per request")
+    parser.add_argument("--translate-latency", type=float, default=0.5)
+    parser.add_argument("--mongo-uri", default=None, help="Real mongod (default: mongomock per worker)")
+    parser.add_argument("--seed-documents", type=int, default=500)
+    parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCH_DIR)
+    from bench_youtube_audio import synthesize
+    from mock_openai_server import start_mock_server
+
+    mock_server, base_url = start_mock_server(latency=args.openai_latency, audio_duration=args.minutes * 60)
+    db_name = f"loadserver_{os.getpid()}"
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="load", LOG_LEVEL="WARNING",
+               RESPONSE_CACHE_TTL_SEC="0", MONGO_DB_NAME=db_name, SERVICES_EAGER="false",
+               LOAD_TRANSLATE_LATENCY=str(args.translate_latency), LOAD_SEED_DOCUMENTS=str(args.seed_documents),
+               LOAD_MONGOMOCK="0" if args.mongo_uri else "1",
+               MONGODB_URI=args.mongo_uri or "mongodb://mongomock.invalid:27017")
+
+    seed_client = None
+    if args.mongo_uri:
+        sys.path.insert(0, FLASK_DIR)
+        import database
+        seed_client = database.connect(args.mongo_uri)
+        seed_documents(seed_client[db_name]["media_transcripts"], args.seed_documents)
+
+    workdir = tempfile.mkdtemp(prefix="load_server_")
+    # gunicorn runs in FLASK_DIR; keep the jobs' scratch files (and kept files of failed jobs) out of the tree
+    env["WORKSPACE_ROOT"] = os.path.join(workdir, "job_workspaces")
+    try:
+        media_path = os.path.join(workdir, "source.mp3")
+        synthesize(args.ffmpeg, media_path, args.minutes, ["-c:a", "libmp3lame", "-b:a", "64k"])
+        print(f"{args.search_clients} search clients, {args.ingest_clients} ingest clients, "
+              f"{args.minutes:g} min uploads, transcription {args.openai_latency:g}s, "
+              f"mongo {'mongod' if args.mongo_uri else 'mongomock'}; server logs in {workdir}")
+        for name in args.scenarios.split(","):
+            run_scenario(name.strip(), args, env, media_path, workdir)
+    finally:
+        mock_server.shutdown()
+        if seed_client is not None:
+            seed_client.drop_database(db_name)
+            seed_client.close()
+
+
+if __name__ == "__main__":
+    main()
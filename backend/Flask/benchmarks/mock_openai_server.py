@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the OpenAI /v1/audio/transcriptions endpoint.
+
+Simulates response latency, a requests-per-second rate limit (429 with a
+Retry-After header) and random 5xx errors so the transcription client can be
+exercised without spending API credits.
+
+    python benchmarks/mock_openai_server.py --port 8765 --latency 0.5 --rps 2 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Returns 0 if a token was taken, otherwise the seconds until one is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+def build_transcription(duration_sec=30.0, segment_sec=5.0, include_words=False, language="english"):
+    """Canned verbose_json body with evenly spaced segments (and words when requested)."""
+    segments = []
+    words = []
+    t = 0.0
+    index = 0
+    while t < duration_sec:
+        end = min(duration_sec, t + segment_sec)
+        text = f" Mock segment number {index} from the archive."
+        segment = {"id": index, "start": round(t, 3), "end": round(end, 3), "text": text}
+        if include_words:
+            tokens = text.split()
+            step = (end - t) / len(tokens)
+            segment_words = [
+                {"word": token, "start": round(t + i * step, 3), "end": round(t + (i + 1) * step, 3)}
+                for i, token in enumerate(tokens)
+            ]
+            words.extend(segment_words)
+        segments.append(segment)
+        t = end
+        index += 1
+    body = {"language": language, "duration": duration_sec,
+            "text": "".join(s["text"] for s in segments), "segments": segments}
+    if include_words:
+        body["words"] = words
+    return body
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request_body = self.rfile.read(length) if length else b""
+        server = self.server
+        with server.stats_lock:
+            server.stats["requests"] += 1
+
+        if not self.path.rstrip("/").endswith("/audio/transcriptions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        wait = server.bucket.take() if server.bucket else 0.0
+        if wait > 0:
+            with server.stats_lock:
+                server.stats["rate_limited"] += 1
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            headers={"Retry-After": f"{wait:.2f}", "x-ratelimit-remaining-requests": "0"})
+            return
+
+        time.sleep(max(0.0, random.gauss(server.latency, server.latency * 0.1)))
+
+        if random.random() < server.error_rate:
+            with server.stats_lock:
+                server.stats["errors"] += 1
+            self._send_json(503, {"error": {"message": "Mock upstream error"}})
+            return
+
+        include_words = b"word" in request_body and b"timestamp_granularities" in request_body
+        with server.stats_lock:
+            server.stats["ok"] += 1
+        self._send_json(200, build_transcription(server.audio_duration, include_words=include_words,
+                                                 language=server.language),
+                        headers={"x-ratelimit-remaining-requests": "100"})
+
+
+def start_mock_server(port=0, latency=0.2, rps=0.0, burst=None, error_rate=0.0,
+                      audio_duration=30.0, language="english", verbose=False):
+    """Starts the mock server on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.audio_duration = audio_duration
+    server.language = language
+    server.verbose = verbose
+    server.bucket = TokenBucket(rps, burst or max(1.0, rps)) if rps > 0 else None
+    server.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0}
+    server.stats_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI transcription server",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response latency in seconds")
+    parser.add_argument("--rps", type=float, default=0.0, help="Allowed requests per second (0 = unlimited)")
+    parser.add_argument("--burst", type=float, default=None, help="Token bucket size (defaults to rps)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--duration", type=float, default=30.0, help="Audio duration reported in responses")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args.port, args.latency, args.rps, args.burst,
+                                         args.error_rate, args.duration, verbose=True)
+    print(f"Mock OpenAI server listening at {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"Stats: {server.stats}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
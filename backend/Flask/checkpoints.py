@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Durable per-job checkpoints, so a retried ingest resumes where the last attempt stopped.
+
+Every ingest job has a record in the `ingest_jobs` collection, keyed by its
+job key: the client's `job_key` field or Idempotency-Key header, else a
+hash of the source and options: the URL for YouTube, the content hash
+(SHA-256) for uploads. After each stage the stage's
+outputs (audio paths, VAD regions, segments, per-language translations) are
+written to the record, together with the files the job created.
+
+    {"_id": job_key, "status": "running" | "failed" | "completed",
+     "stages_done": ["acquire", ...], "ctx": {saved ctx fields},
+     "attempts": n, "owner": {"host", "pid"}, "lease_until", "updated_at",
+     "error", "response"}
+
+The stage and step timings (metrics.py) are saved with the outputs and
+summed into the resuming attempt's, so processing_info.timings covers every
+attempt of the job.
+
+A failed job keeps its files, so a retry with the same key (or the same
+YouTube URL or file) skips the stages whose outputs still exist. Once transcription
+is done the segments are in the record itself, so the translation and store
+stages resume even if the audio files are gone. A job whose worker was
+killed stays "running"; it can be taken over once its lease expires or its
+owning process (on the same host) is gone.
+
+Records and the files of abandoned jobs are removed CHECKPOINT_RETAIN_HOURS
+after their last update. Checkpointing is best effort: if a record cannot be
+written, the job carries on without it.
+"""
+import hashlib
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_ENABLED = os.getenv("INGEST_CHECKPOINTS", "true").lower() in ("1", "true", "yes", "on")
+CHECKPOINT_COLLECTION = os.getenv("CHECKPOINT_COLLECTION", "ingest_jobs")
+CHECKPOINT_RETAIN_HOURS = float(os.getenv("CHECKPOINT_RETAIN_HOURS", "24"))
+# A "running" record older than this may be taken over by a retry (renewed at every checkpoint)
+CHECKPOINT_LEASE_SEC = float(os.getenv("CHECKPOINT_LEASE_SEC", "7200"))
+CHECKPOINT_SWEEP_INTERVAL_SEC = float(os.getenv("CHECKPOINT_SWEEP_INTERVAL_SEC", "600"))
+
+STAGES = ("acquire", "prepare", "transcribe", "translate", "store")
+# ctx fields each stage produces; all plain data (BSON-safe)
+STAGE_OUTPUTS = {
+    "acquire": ("vtt_base_filename", "processed_audio_path", "media_info", "cost_estimate", "source_id",
+                "audio_conversion", "source", "uploaded_file_path", "original_media_name",
+                "use_local_whisper", "transcription_routing"),
+    "prepare": ("audio_to_transcribe", "speech_regions", "vad_report", "language_id"),
+    "transcribe": ("segments", "standardized_lang", "transcription_routing"),  # With the spend settled
+    "translate": ("translated_texts",),
+}
+# Segment keys the later stages use (Whisper adds tokens, log-probs, ...)
+SEGMENT_KEYS = ("start", "end", "text", "words")
+
+HOST = socket.gethostname()
+_last_sweep = 0.0
+
+
+class JobLocked(RuntimeError):
+    """Another live attempt holds the job's record."""
+
+
+def derive_job_key(ctx):
+    """
+    A stable key for the same source with the same options: YouTube by URL, uploads by
+    content hash (known once the file is saved). None when there is neither.
+    """
+    if ctx.get("source_type") == "youtube" and ctx.get("source"):
+        prefix, source = "yt-", ctx["source"]
+    elif ctx.get("source_hash"):
+        prefix, source = "up-", ctx["source_hash"]
+    else:
+        return None
+    identity = "|".join(str(v) for v in (source, ctx.get("use_local_whisper"), ctx.get("skip_silence")))
+    return prefix + hashlib.sha1(identity.encode("utf-8")).hexdigest()[:20]
+
+
+def ensure_indexes(collection):
+    collection.create_index("updated_at")
+
+
+def _plain_segments(segments):
+    return [{key: segment[key] for key in SEGMENT_KEYS if key in segment} for segment in segments or []]
+
+
+def _saved_value(key, value):
+    return _plain_segments(value) if key == "segments" else value
+
+
+def _owner():
+    return {"host": HOST, "pid": os.getpid()}
+
+
+def _owner_alive(owner):
+    if not owner or owner.get("host") != HOST:
+        return True  # Cannot tell for another machine; the lease decides
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, KeyError, TypeError):
+        pass
+    return True
+
+
+def _resumable_stages(saved, done):
+    """Completed stages whose outputs can still be used, in order."""
+    def exists(path):
+        return bool(path) and os.path.exists(path)
+
+    if "transcribe" in done:
+        return ["acquire", "prepare", "transcribe"] + (["translate"] if "translate" in done else [])
+    if "prepare" in done and exists(saved.get("audio_to_transcribe")):
+        return ["acquire", "prepare"]
+    if "acquire" in done and exists(saved.get("processed_audio_path")):
+        return ["acquire"]
+    return []
+
+
+def claim(collection, ctx):
+    """
+    Registers this attempt of ctx["job_key"] and restores completed stages into ctx.
+    Sets ctx["resumed_stages"] (stages to skip) and ctx["checkpointed"], and returns the previous status:
+    "new", "failed", "running" (taken over) or "completed" (ctx["completed_response"]
+    holds the stored response). Raises JobLocked while another attempt is live.
+    """
+    key = ctx["job_key"]
+    now = datetime.now()
+    record = collection.find_one({"_id": key})
+    lease = {"status": "running", "owner": _owner(), "updated_at": now, "error": None,
+             "lease_until": now + timedelta(seconds=CHECKPOINT_LEASE_SEC)}
+
+    if record and record["status"] == "completed" and ctx.get("job_key_source") == "client":
+        # An explicit key is an idempotency key: replay the finished job's response
+        ctx["completed_response"] = record.get("response")
+        return "completed"
+    if record and record["status"] == "running" and record.get("lease_until", now) > now \
+            and _owner_alive(record.get("owner")):
+        raise JobLocked(f"Job {key} is already running (attempt {record.get('attempts', 1)}).")
+
+    if record is None:
+        from pymongo.errors import DuplicateKeyError
+        try:
+            collection.insert_one({"_id": key, **lease, "attempts": 1, "stages_done": [], "created_at": now,
+                                   "ctx": {"timestamp": ctx["timestamp"], "files_to_clean": ctx["files_to_clean"]}})
+        except DuplicateKeyError:
+            raise JobLocked(f"Job {key} was just started by another request.")
+        ctx["resumed_stages"] = []
+        ctx["checkpointed"] = True
+        return "new"
+
+    previous = record["status"]
+    # Only the attempt that read this exact version wins the takeover
+    taken = collection.find_one_and_update({"_id": key, "updated_at": record["updated_at"]},
+                                           {"$set": lease, "$inc": {"attempts": 1}})
+    if taken is None:
+        raise JobLocked(f"Job {key} was just resumed by another request.")
+
+    saved = record.get("ctx") or {}
+    done = [] if previous == "completed" else record.get("stages_done", [])
+    resumed = _resumable_stages(saved, done)
+    if not resumed:
+        collection.update_one({"_id": key}, {"$set": {"stages_done": [], "ctx.timestamp": ctx["timestamp"]}})
+    else:
+        ctx["timestamp"] = saved.get("timestamp", ctx["timestamp"])
+        # Translations finished before the failure are restored even when the stage did not complete
+        for stage in resumed + (["translate"] if resumed[-1] == "transcribe" else []):
+            for field in STAGE_OUTPUTS[stage]:
+                if field in saved:
+                    ctx[field] = saved[field]
+        _merge_timings(ctx, saved.get("timings"))
+    # Files of the earlier attempts are this job's to clean up now
+    ctx["files_to_clean"] = list(dict.fromkeys(saved.get("files_to_clean", []) + ctx["files_to_clean"]))
+    ctx["resumed_stages"] = resumed
+    ctx["checkpointed"] = True
+    logger.info("job %s: attempt %d after %s; resuming after %s", key, record.get("attempts", 1) + 1,
+                previous, resumed[-1] if resumed else "nothing (starting over)")
+    return previous
+
+
+def _merge_timings(ctx, saved_timings):
+    """Adds an earlier attempt's stage and step seconds to this attempt's ctx["timings"]."""
+    timings = ctx.setdefault("timings", {})
+    for group, values in (saved_timings or {}).items():
+        current = timings.setdefault(group, {})
+        for name, sec in values.items():
+            current[name] = current.get(name, 0.0) + sec
+
+
+def save(collection, ctx, stage):
+    """Records stage as done with its outputs; returns False if the write failed."""
+    fields = {f"ctx.{key}": _saved_value(key, ctx.get(key)) for key in STAGE_OUTPUTS.get(stage, ())}
+    fields["ctx.files_to_clean"] = ctx.get("files_to_clean", [])
+    fields["ctx.timings"] = ctx.get("timings", {})
+    return _update(collection, ctx, {"$set": fields, "$addToSet": {"stages_done": stage}})
+
+
+def save_translation(collection, ctx, lang):
+    """Records one finished translation, so a retry only translates the remaining languages."""
+    return _update(collection, ctx, {"$set": {
+        f"ctx.translated_texts.{lang}": ctx["translated_texts"][lang],
+        "ctx.files_to_clean": ctx.get("files_to_clean", []),
+    }})
+
+
+def complete(collection, ctx, response):
+    """Marks the job completed, keeping only its response (the saved outputs are dropped)."""
+    return _update(collection, ctx, {"$set": {"status": "completed", "response": response},
+                                     "$unset": {"ctx": "", "lease_until": ""}})
+
+
+def fail(collection, ctx, exc):
+    """Marks the job failed; True when a retry can resume it (the caller then keeps the job's files)."""
+    if not ctx.get("checkpointed"):
+        return False
+    return _update(collection, ctx, {"$set": {"status": "failed", "error": str(exc),
+                                              "ctx.files_to_clean": ctx.get("files_to_clean", []),
+                                              "ctx.timings": ctx.get("timings", {})},
+                                     "$unset": {"lease_until": ""}})
+
+
+def _update(collection, ctx, update):
+    if not ctx.get("checkpointed"):
+        return False
+    now = datetime.now()
+    update.setdefault("$set", {})["updated_at"] = now
+    if update["$set"].get("status") is None and "lease_until" not in update.get("$unset", {}):
+        update["$set"]["lease_until"] = now + timedelta(seconds=CHECKPOINT_LEASE_SEC)
+    try:
+        collection.update_one({"_id": ctx["job_key"]}, update)
+        return True
+    except Exception as e:
+        logger.warning("could not write checkpoint of job %s: %s", ctx["job_key"], e)
+        return False
+
+
+def sweep(collection, delete_file, force=False):
+    """Removes records (and the kept files of unfinished jobs) not updated for CHECKPOINT_RETAIN_HOURS."""
+    global _last_sweep
+    if not force and time.monotonic() - _last_sweep < CHECKPOINT_SWEEP_INTERVAL_SEC:
+        return 0
+    _last_sweep = time.monotonic()
+    cutoff = datetime.now() - timedelta(hours=CHECKPOINT_RETAIN_HOURS)
+    removed = 0
+    for record in collection.find({"updated_at": {"$lt": cutoff}}, {"ctx.files_to_clean": 1}):
+        for path in (record.get("ctx") or {}).get("files_to_clean", []):
+            delete_file(path)
+        collection.delete_one({"_id": record["_id"]})
+        removed += 1
+    if removed:
+        logger.info("removed %d expired job checkpoints", removed)
+    return removed
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+MongoDB client configuration and per-workload collection handles.
+
+connect() builds a MongoClient with the pool, timeout and wire-compression
+settings below; app.py calls it through the lazy `mongodb` service, so every
+gunicorn worker creates its own client after the fork. async_ingest.py uses
+client_options() for its motor client.
+
+Reads and writes are routed per workload:
+
+    for_search(coll)   search queries; MONGO_SEARCH_READ_PREFERENCE=secondaryPreferred
+                       moves them off the primary of a replica set
+    for_ingest(coll)   ingest writes; MONGO_INGEST_W (default "majority"), journaled,
+                       so a finished job survives a primary failover
+
+Everything else (edits, reads right after a write) uses the client defaults:
+primary reads, and the write concern from the URI.
+
+With secondary reads, a search that lands on a lagging secondary just after
+a write can return (and the response cache then keep, for up to
+RESPONSE_CACHE_TTL_SEC) the previous results. MONGO_SEARCH_MAX_STALENESS_SEC
+bounds how far behind a secondary may be.
+
+Transcript documents are large, repetitive text and compress well on the
+wire. zstd and snappy need the optional `zstandard` / `python-snappy`
+packages; names whose package is missing are dropped from
+MONGO_COMPRESSORS with a log line. zlib is always available.
+"""
+import importlib.util
+import logging
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "transcript_db")
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "swayambhu-archive")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))  # Per worker process
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))  # Waiting for a pooled connection
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+# pymongo's default is 30s: a request would hang that long before failing when Mongo is down
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "60000"))  # 0 = no limit
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")  # Preference order; empty = none
+MONGO_ZLIB_LEVEL = int(os.getenv("MONGO_ZLIB_LEVEL", "6"))
+
+MONGO_SEARCH_READ_PREFERENCE = os.getenv("MONGO_SEARCH_READ_PREFERENCE", "primary")
+MONGO_SEARCH_MAX_STALENESS_SEC = int(os.getenv("MONGO_SEARCH_MAX_STALENESS_SEC", "-1"))  # -1 = no limit, else >= 90
+MONGO_INGEST_W = os.getenv("MONGO_INGEST_W", "majority")
+MONGO_INGEST_JOURNAL = os.getenv("MONGO_INGEST_JOURNAL", "true").lower() in ("1", "true", "yes", "on")
+MONGO_INGEST_WTIMEOUT_MS = int(os.getenv("MONGO_INGEST_WTIMEOUT_MS", "10000"))
+
+# Python package each wire compressor needs
+_COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+def available_compressors(names=MONGO_COMPRESSORS):
+    """The configured compressors that can actually be used in this environment, in order."""
+    usable = []
+    for name in (n.strip().lower() for n in names.split(",")):
+        if not name:
+            continue
+        if name not in _COMPRESSOR_PACKAGES:
+            logger.warning("unknown MongoDB compressor '%s' ignored", name)
+            continue
+        package = _COMPRESSOR_PACKAGES[name]
+        if package and importlib.util.find_spec(package) is None:
+            logger.info("MongoDB %s compression unavailable (pip install %s)", name,
+                        "zstandard" if name == "zstd" else "python-snappy")
+            continue
+        usable.append(name)
+    return usable
+
+
+def client_options(**overrides):
+    """Keyword arguments for MongoClient / AsyncIOMotorClient (the URI's own options take precedence)."""
+    options = {
+        "appname": MONGO_APP_NAME,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "retryWrites": True,
+        "retryReads": True,
+    }
+    compressors = available_compressors(overrides.pop("compressors", MONGO_COMPRESSORS))
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = MONGO_ZLIB_LEVEL
+    options.update(overrides)
+    return options
+
+
+def connect(uri, **overrides):
+    """A new MongoClient; call once per process (after any fork)."""
+    from pymongo import MongoClient
+    options = client_options(**overrides)
+    logger.info("MongoDB client: pool %s-%s, compressors %s, search reads %s, ingest w=%s",
+                options["minPoolSize"], options["maxPoolSize"], options.get("compressors", "none"),
+                MONGO_SEARCH_READ_PREFERENCE, MONGO_INGEST_W)
+    return MongoClient(uri, **options)
+
+
+@lru_cache(maxsize=None)
+def search_read_preference(mode=MONGO_SEARCH_READ_PREFERENCE, max_staleness=MONGO_SEARCH_MAX_STALENESS_SEC):
+    from pymongo import read_preferences
+    modes = {
+        "primary": read_preferences.Primary,
+        "primarypreferred": read_preferences.PrimaryPreferred,
+        "secondary": read_preferences.Secondary,
+        "secondarypreferred": read_preferences.SecondaryPreferred,
+        "nearest": read_preferences.Nearest,
+    }
+    cls = modes.get(mode.lower())
+    if cls is None:
+        raise ValueError(f"Unknown MONGO_SEARCH_READ_PREFERENCE '{mode}'; use one of {sorted(modes)}")
+    if cls is read_preferences.Primary:
+        return cls()
+    return cls(max_staleness=max_staleness)
+
+
+@lru_cache(maxsize=None)
+def ingest_write_concern(w=MONGO_INGEST_W, journal=MONGO_INGEST_JOURNAL, wtimeout=MONGO_INGEST_WTIMEOUT_MS):
+    from pymongo import WriteConcern
+    return WriteConcern(w=int(w) if str(w).isdigit() else w, j=journal, wtimeout=wtimeout)
+
+
+def for_search(collection):
+    """The collection with the search read preference (pymongo or motor)."""
+    return collection.with_options(read_preference=search_read_preference())
+
+
+def for_ingest(collection):
+    """The collection with the ingest write concern (pymongo or motor)."""
+    return collection.with_options(write_concern=ingest_write_concern())
+
+
+def describe():
+    """Effective settings, for /api/services."""
+    options = client_options()
+    return {
+        "db": MONGO_DB_NAME,
+        "pool": {"min": options["minPoolSize"], "max": options["maxPoolSize"],
+                 "wait_queue_timeout_ms": options["waitQueueTimeoutMS"]},
+        "timeouts_ms": {"connect": options["connectTimeoutMS"],
+                        "server_selection": options["serverSelectionTimeoutMS"],
+                        "socket": options["socketTimeoutMS"]},
+        "compressors": options.get("compressors", ""),
+        "search_read_preference": MONGO_SEARCH_READ_PREFERENCE,
+        "search_max_staleness_sec": MONGO_SEARCH_MAX_STALENESS_SEC,
+        "ingest_write_concern": {"w": MONGO_INGEST_W, "j": MONGO_INGEST_JOURNAL,
+                                 "wtimeout_ms": MONGO_INGEST_WTIMEOUT_MS},
+    }
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn configuration (loaded automatically from the working directory).
+
+The ingest endpoint runs for minutes; search answers in milliseconds. With
+gunicorn's defaults (one sync worker, 30 s timeout) an ingest is killed
+mid-job and every search waits behind it. GUNICORN_ROLE picks a setup:
+
+    all     (default) one pool serving wsgi:app: a single worker with many
+            threads, running at most INGEST_SLOTS ingests so the other
+            threads stay free for reads
+    read    wsgi:read_app: many workers, short timeout, recycled regularly
+    ingest  wsgi:ingest_app: a single threaded worker, long graceful timeout
+            so a restart lets running jobs finish
+
+    gunicorn wsgi:app
+    GUNICORN_ROLE=read   gunicorn wsgi:read_app   --bind 0.0.0.0:8000
+    GUNICORN_ROLE=ingest gunicorn wsgi:ingest_app --bind 0.0.0.0:8001
+
+The split setup needs a reverse proxy in front, e.g. for nginx:
+
+    location ~ ^/api/(generate-transcription|jobs|playlists|pipeline)(/|$) {
+        proxy_pass http://127.0.0.1:8001; proxy_read_timeout 3600s; client_max_body_size 0;
+    }
+    location / { proxy_pass http://127.0.0.1:8000; }
+
+The roles that run jobs (all, ingest) keep one worker and scale with
+threads: pipeline jobs and playlist runs live in the memory of the worker
+that runs them, so with several workers a status poll answered by another
+worker gets 404, and /metrics and /api/cache/stats would show one worker's
+share. when_ready warns if GUNICORN_WORKERS raises it anyway. The read pool
+holds no job state; its /metrics and /api/cache/stats report the worker that
+answers (RESPONSE_CACHE_URL=redis://... shares the cache itself).
+
+Workers are gthread: the worker's heartbeat comes from its main loop, not
+from the request, so `timeout` only kills a worker that is truly stuck, not
+one whose thread is waiting on a long transcription. Every value can be
+overridden with GUNICORN_* variables (or gunicorn's own command-line flags).
+
+preload_app imports app.py once in the master and forks the workers from
+it. This is safe because nothing connects at import: Mongo, Translate and
+Whisper are created per worker on first use (services.py), the pipeline
+threads start on the first job (pipeline.py) and the log listener restarts
+after the fork (logging_setup.py). when_ready warns if a client was built in
+the master anyway (SERVICES_EAGER=true), and reclaims the job workspaces a
+crashed or killed server left behind.
+"""
+import multiprocessing
+import os
+import sys
+import traceback
+
+ROLE = os.getenv("GUNICORN_ROLE", "all").lower()
+CPUS = multiprocessing.cpu_count()
+
+# Per-role defaults: workers, threads, timeout, graceful_timeout, max_requests
+_ROLE_DEFAULTS = {
+    "all": (1, max(16, 4 * CPUS), 120, 600, 0),
+    "read": (2 * CPUS + 1, 4, 30, 30, 5000),
+    "ingest": (1, max(8, 2 * CPUS), 120, 900, 0),
+}
+JOB_ROLES = ("all", "ingest")  # Roles whose worker keeps job and playlist state in memory
+if ROLE not in _ROLE_DEFAULTS:
+    sys.exit(f"GUNICORN_ROLE must be one of {sorted(_ROLE_DEFAULTS)}, not '{ROLE}'")
+_workers, _threads, _timeout, _graceful, _max_requests = _ROLE_DEFAULTS[ROLE]
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", str(_workers)))
+threads = int(os.getenv("GUNICORN_THREADS", str(_threads)))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", str(_timeout)))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", str(_graceful)))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycling bounds slow leaks; the jitter keeps the workers from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", str(_max_requests)))
+max_requests_jitter = max_requests // 10
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes", "on")
+# Heartbeat files on tmpfs: a slow or full disk must not look like a hung worker
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+proc_name = f"swayambhu-{ROLE}"
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None  # "-" = stdout
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Ingests per worker in wsgi:app; half the threads by default, the rest serve reads
+os.environ.setdefault("INGEST_SLOTS", str(max(1, threads // 2)))
+
+
+def when_ready(server):
+    cfg = server.cfg
+    server.log.info("role %s: %d %s workers x %d threads, timeout %ss, graceful %ss, ingest slots %s",
+                    ROLE, cfg.workers, cfg.worker_class_str, cfg.threads, cfg.timeout, cfg.graceful_timeout,
+                    os.environ["INGEST_SLOTS"] if ROLE == "all" else "-")
+    if ROLE in JOB_ROLES and cfg.workers > 1:
+        server.log.warning("role %s with %d workers: job and playlist status polls reaching another worker "
+                           "get 404; run one worker and raise GUNICORN_THREADS instead", ROLE, cfg.workers)
+    services = sys.modules.get("services")
+    if cfg.preload_app and services is not None:
+        built = [name for name, state in services.status().items() if state["initialized"]]
+        if built:
+            server.log.warning("preload: %s built in the master; each worker rebuilds them after the fork",
+                               ", ".join(built))
+    # Scratch directories of jobs the previous server run left behind (see workspace.py)
+    import workspace
+    removed = workspace.janitor(force=True)
+    server.log.info("workspace janitor: %d orphaned job directories removed from %s", removed,
+                    os.path.abspath(workspace.WORKSPACE_ROOT))
+
+
+def post_fork(server, worker):
+    server.log.info("worker %s forked (role %s)", worker.pid, ROLE)
+
+
+def worker_abort(worker):
+    # SIGABRT on timeout: log where every thread was, so a killed request can be explained
+    for thread_id, frame in sys._current_frames().items():
+        worker.log.critical("worker %s timed out; thread %s:\n%s", worker.pid, thread_id,
+                            "".join(traceback.format_stack(frame)))
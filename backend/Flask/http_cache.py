@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional-request and compression helpers for read endpoints.
+
+ETags are strong: they are derived from everything that determines the
+response bytes (document version, format, range, content coding), so a
+matching If-None-Match can be answered with 304 without loading the body.
+Brotli is used only when the optional `brotli` package is installed;
+gzip is always available.
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (the framing costs more than it saves)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def strong_etag(*parts):
+    digest = hashlib.sha256("\x1f".join("" if p is None else str(p) for p in parts).encode("utf-8"))
+    return '"' + digest.hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """True when the If-None-Match header value lists etag (or is '*')."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def choose_encoding(accept_encoding):
+    """Picks 'br', 'gzip' or 'identity' from an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    for coding in (("br",) if brotli else ()) + ("gzip",):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def encode_body(body, encoding):
+    """Returns (bytes, encoding actually applied)."""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if encoding == "identity" or len(body) < MIN_COMPRESS_BYTES:
+        return body, "identity"
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    # mtime=0 keeps the gzip bytes identical across requests, as a strong ETag requires
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
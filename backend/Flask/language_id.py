@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Language identification on a few short windows of audio, before the transcription pass.
+
+Whisper guesses the language from the first 30 s of a file. On the archive's
+Nepali/English recordings that guess is often wrong (an English introduction to
+a Nepali talk, music first), and a wrong guess wastes a full transcription.
+plan() samples LANGID_WINDOWS windows of LANGID_WINDOW_SEC spread over the
+audio, runs Whisper's language detector (the small LANGID_MODEL) on each and
+decides before the expensive pass:
+
+    language  forced on the transcription when the windows agree with at least
+              LANGID_MIN_CONFIDENCE; None (the backend detects it) for
+              code-switched or unclear audio
+    model     the local Whisper model for that language (LANGID_LOCAL_MODELS,
+              e.g. "en=base.en,ne=small,mixed=medium"), else the default
+
+A language hint (the request's "language" field, trans.py --lang) skips the
+pre-pass, as does a transcription routed to the API, which detects the language
+itself (the report's source says which). The pre-pass needs openai-whisper
+installed; without it, or if it fails, the transcription detects the language
+itself as before. It runs a local Whisper model, so callers hold the
+"whisper_local" scheduler slot around plan() when will_detect() says it runs.
+"""
+import importlib.util
+import logging
+import os
+import subprocess
+import time
+
+import services
+
+logger = logging.getLogger(__name__)
+
+LANGID_ENABLED = os.getenv("LANGID_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+LANGID_MODEL = os.getenv("LANGID_MODEL", "tiny")
+LANGID_WINDOWS = int(os.getenv("LANGID_WINDOWS", "3"))
+LANGID_WINDOW_SEC = float(os.getenv("LANGID_WINDOW_SEC", "30"))  # Whisper's input length
+LANGID_MIN_CONFIDENCE = float(os.getenv("LANGID_MIN_CONFIDENCE", "0.6"))
+LANGID_LOCAL_MODELS = os.getenv("LANGID_LOCAL_MODELS", "")
+
+SAMPLE_RATE = 16000  # What Whisper models take
+
+
+def window_starts(duration_sec, count=LANGID_WINDOWS, window_sec=LANGID_WINDOW_SEC):
+    """Start times of `count` windows spread evenly over the audio (one window for short audio)."""
+    span = (duration_sec or 0.0) - window_sec
+    if span <= 0 or count <= 1:
+        return [max(0.0, span / 2)] if span > 0 else [0.0]
+    return [round(span * (i + 0.5) / count, 2) for i in range(count)]
+
+
+def _read_window(path, start_sec, window_sec, ffmpeg_bin):
+    import numpy as np
+    command = [ffmpeg_bin, "-nostdin", "-v", "error", "-ss", f"{start_sec:.2f}", "-t", f"{window_sec:.2f}",
+               "-i", path, "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"]
+    pcm = subprocess.run(command, capture_output=True, check=True).stdout
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def identify(path, duration_sec, ffmpeg_bin="ffmpeg"):
+    """
+    Runs language detection on sampled windows of path. Returns the report: the language
+    (None unless every window agrees with enough confidence), the top language and its
+    mean probability, and the per-window results.
+    """
+    started = time.perf_counter()
+    model = services.whisper_model(LANGID_MODEL)
+    import whisper
+
+    totals = {}
+    windows = []
+    for start in window_starts(duration_sec):
+        audio = _read_window(path, start, LANGID_WINDOW_SEC, ffmpeg_bin)
+        if not audio.size:
+            continue
+        clip = whisper.pad_or_trim(audio)
+        n_mels = getattr(model.dims, "n_mels", 80)
+        # Releases before large-v3 take no n_mels argument (and only have 80 mel bins)
+        mel = whisper.log_mel_spectrogram(clip, n_mels) if n_mels != 80 else whisper.log_mel_spectrogram(clip)
+        mel = mel.to(model.device)
+        _, probs = model.detect_language(mel)
+        top = max(probs, key=probs.get)
+        windows.append({"start_sec": start, "language": top, "probability": round(float(probs[top]), 3)})
+        for lang, prob in probs.items():
+            totals[lang] = totals.get(lang, 0.0) + float(prob)
+    if not windows:
+        return {"applied": False, "source": "no_audio", "language": None}
+
+    top = max(totals, key=totals.get)
+    confidence = totals[top] / len(windows)
+    mixed = any(window["language"] != top for window in windows)
+    return {
+        "applied": True,
+        "source": "prepass",
+        "language": top if not mixed and confidence >= LANGID_MIN_CONFIDENCE else None,
+        "top_language": top,
+        "confidence": round(confidence, 3),
+        "mixed": mixed,
+        "windows": windows,
+        "detector": LANGID_MODEL,
+        "sec": round(time.perf_counter() - started, 3),
+    }
+
+
+def _local_models():
+    models = {}
+    for part in LANGID_LOCAL_MODELS.split(","):
+        lang, _, model = part.partition("=")
+        if lang.strip() and model.strip():
+            models[lang.strip().lower()] = model.strip()
+    return models
+
+
+def local_model_for(report, default_model):
+    """Local Whisper model for the identified language ("mixed" for code-switched or unclear audio)."""
+    if report.get("language"):
+        key = report["language"]
+    elif report.get("applied"):
+        key = "mixed"
+    else:
+        return default_model
+    return _local_models().get(key, default_model)
+
+
+def will_detect(hint=None, api=False):
+    """Whether plan() runs the detector (a local Whisper model) for these arguments."""
+    return not hint and not api and LANGID_ENABLED and importlib.util.find_spec("whisper") is not None
+
+
+def plan(path, duration_sec, default_model, hint=None, api=False, ffmpeg_bin="ffmpeg"):
+    """
+    Decides the transcription language and local model of one file; never raises.
+    api: the transcription goes to the API, which detects the language; no pre-pass.
+    Returns the report (see identify) with "language" and "model" set.
+    """
+    if hint:
+        report = {"applied": False, "source": "hint", "language": hint}
+    elif api:
+        report = {"applied": False, "source": "api", "language": None}
+    elif not LANGID_ENABLED:
+        report = {"applied": False, "source": "disabled", "language": None}
+    elif importlib.util.find_spec("whisper") is None:
+        report = {"applied": False, "source": "unavailable", "language": None}
+    else:
+        try:
+            report = identify(path, duration_sec, ffmpeg_bin=ffmpeg_bin)
+        except Exception as e:
+            # The full pass detects the language itself
+            logger.warning("language ID pre-pass failed for %s: %s", os.path.basename(path), e)
+            report = {"applied": False, "source": "error", "error": str(e), "language": None}
+    report["model"] = local_model_for(report, default_model)
+    return report
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Leveled, structured logging for the backend processes.
+
+configure() routes every logger through a QueueHandler: the calling thread
+only renders the message and hands the record to an in-memory queue, and a
+single listener thread per process does the formatting and the write to
+stderr. Request threads and pipeline workers therefore never block on
+stdout, and lines from concurrent jobs are never interleaved mid-line.
+
+Records carry the job id bound with job_context(), so all lines of one ingest
+job can be filtered together (LOG_FORMAT=json emits one JSON object per line).
+
+    LOG_LEVEL=INFO      DEBUG, INFO, WARNING, ERROR
+    LOG_FORMAT=text     text or json
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(process)d] %(name)s [%(job_id)s] %(message)s"
+
+_job_id = contextvars.ContextVar("job_id", default=None)
+_listener = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def job_context(job_id):
+    """Tags every record logged inside the block (in this thread or task) with job_id."""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+def current_job_id():
+    return _job_id.get()
+
+
+class JobContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, "job_id"):
+            record.job_id = _job_id.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; values passed with extra={...} become top-level keys."""
+
+    _STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "job_id"}
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "job_id": None if record.job_id == "-" else record.job_id,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._STANDARD and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    """Renders message and traceback in the caller (their arguments may change later); the rest is deferred."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure(level=None, fmt=None):
+    """Installs the queue handler on the root logger once per process; later calls only adjust the level."""
+    global _listener
+    level = (level or LOG_LEVEL).upper()
+    with _configure_lock:
+        root = logging.getLogger()
+        root.setLevel(level)
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        if (fmt or LOG_FORMAT) == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _PreparedQueueHandler(log_queue)
+        queue_handler.addFilter(JobContextFilter())  # Runs in the logging thread, where the context is bound
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)  # Flushes whatever is still queued
+        os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener():
+    """The listener thread does not survive fork() (gunicorn --preload); start a fresh one in the child."""
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+Media toolkit: ffmpeg/ffprobe discovery, media probing and cost estimates.
+
+The binaries are resolved once per process (FFMPEG_BIN / FFPROBE_BIN, then
+PATH, then the usual Homebrew location) and their versions and codec support
+are checked up front. probe(path) returns duration, streams and codecs and is
+cached per (path, size, mtime), so the pipeline can look at a file as often as
+it likes for the price of one subprocess. When ffprobe is missing, probing
+falls back to parsing `ffmpeg -i` output.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_SIZE = int(os.getenv("MEDIA_PROBE_CACHE_SIZE", "256"))
+PROBE_TIMEOUT_SEC = float(os.getenv("MEDIA_PROBE_TIMEOUT_SEC", "30"))
+
+# --- Cost model (USD); override when prices change ---
+OPENAI_COST_PER_MINUTE = float(os.getenv("OPENAI_COST_PER_MINUTE", "0.006"))
+TRANSLATE_COST_PER_MILLION_CHARS = float(os.getenv("TRANSLATE_COST_PER_MILLION_CHARS", "20"))
+SPOKEN_CHARS_PER_MINUTE = float(os.getenv("SPOKEN_CHARS_PER_MINUTE", "900"))  # ~150 words/min
+
+REQUIRED_ENCODERS = ("libmp3lame",)                # Audio extraction and the VAD cut
+EXPECTED_DECODERS = ("aac", "mp3", "opus", "vorbis")  # What uploads and YouTube serve
+
+# Codec family -> container its stream can be copied into without re-encoding
+COPY_CONTAINERS = {
+    "mp4a": ".m4a",
+    "aac": ".m4a",
+    "alac": ".m4a",
+    "opus": ".ogg",
+    "vorbis": ".ogg",
+    "mp3": ".mp3",
+    "flac": ".flac",
+}
+
+_HOMEBREW_DIRS = ("/opt/homebrew/bin", "/usr/local/bin")
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_STREAM_RE = re.compile(r"Stream #\d+:(\d+)(?:\[\w+\])?(?:\(\w+\))?: (Audio|Video|Subtitle|Data): (\w+)([^\n]*)")
+_SAMPLE_RATE_RE = re.compile(r"(\d+) Hz")
+_SIZE_RE = re.compile(r", (\d{2,5})x(\d{2,5})")
+
+
+class MediaProbeError(ValueError):
+    """Raised when a file cannot be read as media (missing, corrupt, or without the streams we need)."""
+
+
+class MediaToolkit:
+    """Resolved ffmpeg/ffprobe binaries plus what they can decode and encode."""
+
+    def __init__(self, ffmpeg=None, ffprobe=None):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.ffmpeg_version = None
+        self.ffprobe_version = None
+        self.encoders = set()
+        self.decoders = set()
+        self.warnings = []
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def to_dict(self):
+        return {
+            "ffmpeg": self.ffmpeg,
+            "ffmpeg_version": self.ffmpeg_version,
+            "ffprobe": self.ffprobe,
+            "ffprobe_version": self.ffprobe_version,
+            "warnings": list(self.warnings),
+        }
+
+
+def _find_binary(name, env_var):
+    configured = os.getenv(env_var)
+    if configured:
+        return configured if os.path.exists(configured) else shutil.which(configured)
+    found = shutil.which(name)
+    if found:
+        return found
+    for directory in _HOMEBREW_DIRS:
+        candidate = os.path.join(directory, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _version(binary):
+    try:
+        result = subprocess.run([binary, "-hide_banner", "-version"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    first_line = (result.stdout or "").splitlines()[:1]
+    match = re.search(r"version (\S+)", first_line[0]) if first_line else None
+    return match.group(1) if match else None
+
+
+def _codec_names(ffmpeg, flag):
+    """Names listed by `ffmpeg -encoders` / `-decoders`."""
+    try:
+        result = subprocess.run([ffmpeg, "-hide_banner", flag], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return set()
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # Codec lines look like " A....D libmp3lame  libmp3lame MP3 ..."
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS" and parts[1] != "=":
+            names.add(parts[1])
+    return names
+
+
+def discover():
+    """Resolves the binaries and checks versions and codec support. Never raises."""
+    toolkit = MediaToolkit(_find_binary("ffmpeg", "FFMPEG_BIN"), _find_binary("ffprobe", "FFPROBE_BIN"))
+    if not toolkit.ffmpeg:
+        toolkit.warnings.append("ffmpeg not found; set FFMPEG_BIN or install ffmpeg.")
+        return toolkit
+
+    toolkit.ffmpeg_version = _version(toolkit.ffmpeg)
+    toolkit.encoders = _codec_names(toolkit.ffmpeg, "-encoders")
+    toolkit.decoders = _codec_names(toolkit.ffmpeg, "-decoders")
+    for encoder in REQUIRED_ENCODERS:
+        if encoder not in toolkit.encoders:
+            toolkit.warnings.append(f"ffmpeg has no '{encoder}' encoder; audio extraction will fail.")
+    for decoder in EXPECTED_DECODERS:
+        if decoder not in toolkit.decoders:
+            toolkit.warnings.append(f"ffmpeg cannot decode '{decoder}'.")
+
+    if toolkit.ffprobe:
+        toolkit.ffprobe_version = _version(toolkit.ffprobe)
+    else:
+        toolkit.warnings.append("ffprobe not found; probing falls back to parsing ffmpeg output.")
+    return toolkit
+
+
+# --- Process-wide toolkit, resolved once ---
+_toolkit = None
+_toolkit_lock = threading.Lock()
+
+
+def init(force=False):
+    """Discovers the toolkit (once) and prints a summary. Call at startup."""
+    global _toolkit
+    with _toolkit_lock:
+        if _toolkit is None or force:
+            _toolkit = discover()
+            logger.info("Media toolkit: ffmpeg=%s (%s), ffprobe=%s (%s)", _toolkit.ffmpeg, _toolkit.ffmpeg_version,
+                        _toolkit.ffprobe, _toolkit.ffprobe_version)
+            for warning in _toolkit.warnings:
+                logger.warning("%s", warning)
+        return _toolkit
+
+
+def get_toolkit():
+    return _toolkit or init()
+
+
+def ffmpeg_bin():
+    """Path of the ffmpeg binary (plain 'ffmpeg' if discovery failed, so errors stay explicit)."""
+    return get_toolkit().ffmpeg or "ffmpeg"
+
+
+# --- Probing ---
+_probe_cache = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+
+def _probe_with_ffprobe(ffprobe, path):
+    command = [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=PROBE_TIMEOUT_SEC)
+    if result.returncode != 0:
+        raise MediaProbeError(f"ffprobe could not read {os.path.basename(path)}: {result.stderr.strip()}")
+    data = json.loads(result.stdout or "{}")
+    fmt = data.get("format", {})
+    streams = []
+    for stream in data.get("streams", []):
+        streams.append({
+            "index": stream.get("index"),
+            "type": stream.get("codec_type"),
+            "codec": stream.get("codec_name"),
+            "channels": stream.get("channels"),
+            "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+            "width": stream.get("width"),
+            "height": stream.get("height"),
+        })
+    duration = fmt.get("duration")
+    return {
+        "format_name": fmt.get("format_name"),
+        "duration_sec": float(duration) if duration not in (None, "N/A") else None,
+        "bit_rate": int(fmt["bit_rate"]) if fmt.get("bit_rate", "N/A") != "N/A" else None,
+        "streams": streams,
+    }
+
+
+def _probe_with_ffmpeg(ffmpeg, path):
+    # Without an output ffmpeg exits non-zero after printing the input description
+    result = subprocess.run([ffmpeg, "-hide_banner", "-i", path], capture_output=True, text=True,
+                            timeout=PROBE_TIMEOUT_SEC)
+    output = result.stderr
+    format_match = re.search(r"Input #0, ([^,]+(?:,[^,\s]+)*), from", output)
+    duration_match = _DURATION_RE.search(output)
+    duration = None
+    if duration_match:
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    streams = []
+    for index, kind, codec, rest in _STREAM_RE.findall(output):
+        sample_rate = _SAMPLE_RATE_RE.search(rest)
+        size = _SIZE_RE.search(rest)
+        streams.append({
+            "index": int(index),
+            "type": kind.lower(),
+            "codec": codec,
+            "channels": 1 if " mono" in rest else 2 if "stereo" in rest else None,
+            "sample_rate": int(sample_rate.group(1)) if sample_rate and kind == "Audio" else None,
+            "width": int(size.group(1)) if size and kind == "Video" else None,
+            "height": int(size.group(2)) if size and kind == "Video" else None,
+        })
+    if not format_match and not streams:
+        last_line = output.strip().splitlines()[-1] if output.strip() else "unknown error"
+        raise MediaProbeError(f"ffmpeg could not read {os.path.basename(path)}: {last_line}")
+    return {
+        "format_name": format_match.group(1) if format_match else None,
+        "duration_sec": duration,
+        "bit_rate": None,
+        "streams": streams,
+    }
+
+
+def probe(path):
+    """
+    Returns {"format_name", "duration_sec", "bit_rate", "size_bytes", "streams",
+    "has_audio", "has_video", "audio_codec"} for a media file.
+    Raises MediaProbeError if the file is missing or unreadable.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise MediaProbeError(f"Media file not found: {path}") from e
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _probe_cache_lock:
+        cached = _probe_cache.get(key)
+        if cached is not None:
+            _probe_cache.move_to_end(key)
+            return cached
+
+    toolkit = get_toolkit()
+    if not toolkit.available:
+        raise MediaProbeError("Cannot probe media: ffmpeg is not installed.")
+    try:
+        if toolkit.ffprobe:
+            info = _probe_with_ffprobe(toolkit.ffprobe, path)
+        else:
+            info = _probe_with_ffmpeg(toolkit.ffmpeg, path)
+    except subprocess.TimeoutExpired as e:
+        raise MediaProbeError(f"Probing {os.path.basename(path)} timed out.") from e
+
+    audio_streams = [s for s in info["streams"] if s["type"] == "audio"]
+    # Cover art in audio files shows up as a single-frame video stream
+    video_streams = [s for s in info["streams"] if s["type"] == "video" and s["codec"] not in ("mjpeg", "png")]
+    info["size_bytes"] = stat.st_size
+    info["has_audio"] = bool(audio_streams)
+    info["has_video"] = bool(video_streams)
+    info["audio_codec"] = audio_streams[0]["codec"] if audio_streams else None
+
+    with _probe_cache_lock:
+        _probe_cache[key] = info
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return info
+
+
+def require_audio(path):
+    """Probes path and raises MediaProbeError unless it has an audio stream with a known duration."""
+    info = probe(path)
+    if not info["has_audio"]:
+        raise MediaProbeError(f"{os.path.basename(path)} has no audio stream.")
+    if not info["duration_sec"]:
+        raise MediaProbeError(f"{os.path.basename(path)} has no readable duration.")
+    return info
+
+
+def media_summary(info):
+    """The subset of a probe result stored with each job."""
+    if not info:
+        return None
+    return {
+        "duration_sec": round(info["duration_sec"], 3) if info.get("duration_sec") else None,
+        "format_name": info.get("format_name"),
+        "audio_codec": info.get("audio_codec"),
+        "has_video": info.get("has_video"),
+        "size_bytes": info.get("size_bytes"),
+    }
+
+
+def estimate_job_cost(duration_sec, transcription_method="openai_api", translation_targets=2, speech_fraction=1.0):
+    """
+    Up-front cost estimate for one job. Local Whisper transcription is free in API terms;
+    translation cost assumes SPOKEN_CHARS_PER_MINUTE characters per target language.
+    """
+    minutes = max(0.0, (duration_sec or 0.0) / 60.0)
+    speech_minutes = minutes * speech_fraction
+    transcription_usd = speech_minutes * OPENAI_COST_PER_MINUTE if transcription_method == "openai_api" else 0.0
+    translated_chars = speech_minutes * SPOKEN_CHARS_PER_MINUTE * translation_targets
+    translation_usd = translated_chars / 1e6 * TRANSLATE_COST_PER_MILLION_CHARS
+    return {
+        "audio_minutes": round(minutes, 2),
+        "transcription_usd": round(transcription_usd, 4),
+        "estimated_translation_chars": int(translated_chars),
+        "translation_usd": round(translation_usd, 4),
+        "total_usd": round(transcription_usd + translation_usd, 4),
+    }
+
+
+# Container family (as named by ffmpeg) -> extensions that correctly describe it
+_FAMILY_EXTENSIONS = {
+    "wav": (".wav",),
+    "mp3": (".mp3",),
+    "flac": (".flac",),
+    "ogg": (".ogg", ".oga", ".opus"),
+    "mp4": (".mp4", ".m4a", ".mov", ".3gp"),
+    "mov": (".mov", ".mp4", ".m4a"),
+    "matroska": (".mkv", ".webm", ".mka"),
+    "webm": (".webm", ".mkv"),
+}
+
+
+def natural_extension(info, current_extension=None):
+    """
+    File extension matching what probe() found inside the container, so a file
+    can be named for its real format regardless of the name it arrived with.
+    Keeps current_extension when it already fits; returns None for unknown formats.
+    """
+    formats = set((info.get("format_name") or "").split(","))
+    current_extension = (current_extension or "").lower()
+    for family, extensions in _FAMILY_EXTENSIONS.items():
+        if family in formats and current_extension in extensions:
+            return current_extension
+
+    has_video = info.get("has_video")
+    if "wav" in formats:
+        return ".wav"
+    if "mp3" in formats:
+        return ".mp3"
+    if "flac" in formats:
+        return ".flac"
+    if "ogg" in formats:
+        return ".ogg"
+    if "mp4" in formats or "mov" in formats:
+        return ".mp4" if has_video else ".m4a"
+    if "matroska" in formats or "webm" in formats:
+        audio_codecs = {s["codec"] for s in info.get("streams", []) if s["type"] == "audio"}
+        return ".webm" if not has_video and audio_codecs <= {"opus", "vorbis"} else ".mkv"
+    return None
+
+
+def extract_audio(input_path, output_base, codec=None, ffmpeg_bin=None):
+    """
+    Writes the audio of input_path to output_base + extension. The stream is copied
+    when its codec has a suitable container, otherwise it is encoded to 192 kbps MP3.
+    Returns the output path; the input is left untouched.
+    """
+    container = COPY_CONTAINERS.get((codec or "").split(".")[0].lower())
+    if container:
+        output_path = output_base + container
+        codec_args = ["-c:a", "copy"]
+    else:
+        output_path = output_base + ".mp3"
+        codec_args = ["-c:a", "libmp3lame", "-b:a", "192k"]
+    command = [ffmpeg_bin or get_toolkit().ffmpeg or "ffmpeg", "-y", "-i", input_path, "-vn", "-map", "0:a:0",
+               *codec_args, "-loglevel", "error", output_path]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise RuntimeError(f"ffmpeg failed to extract audio from {os.path.basename(input_path)}: {e.stderr}") from e
+    return output_path
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Process-local metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms with labels, plus the ingest metrics shared by
+app.py and async_ingest.py. Times are recorded in two places: the histograms
+below (scraped from /metrics) and ctx["timings"], which the store stage writes
+into the document's processing_info so a slow job can be explained after the fact.
+
+Each gunicorn worker keeps its own registry; scrape every worker (or run a
+single worker per port) for complete numbers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "swayambhu_"
+
+# Ingest steps range from milliseconds (probe) to tens of minutes (local Whisper)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+    def _sample_lines(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def _sample_lines(self, key, entry):
+        lines = [f"{self.name}_bucket{self._label_text(key, [('le', _number(bound))])} {count}"
+                 for bound, count in zip(self.buckets, entry["counts"])]
+        lines.append(f"{self.name}_bucket{self._label_text(key, [('le', '+Inf')])} {entry['count']}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_number(entry['sum'])}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {entry['count']}")
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All registered metrics as a /metrics response body."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------
+# Ingest metrics
+# ---------------------
+STAGE_SECONDS = Histogram("ingest_stage_seconds", "Time spent in each ingest pipeline stage.", ["stage", "status"])
+STEP_SECONDS = Histogram("ingest_step_seconds",
+                         "Time spent in ingest steps (download, probe, ffmpeg, vad, language_id, transcription, "
+                         "translation, mongo).",
+                         ["step"])
+BACKEND_SECONDS = Histogram("backend_request_seconds", "Latency of calls to external backends.",
+                            ["backend", "operation"])
+BACKEND_ERRORS = Counter("backend_errors_total", "Failed calls to external backends.", ["backend", "operation"])
+INGEST_JOBS = Counter("ingest_jobs_total", "Finished ingest jobs.", ["status"])
+INGEST_RESUMED = Counter("ingest_resumed_total", "Ingest jobs resumed from a checkpoint, by last restored stage.",
+                         ["stage"])
+UPLOAD_DEDUP_HITS = Counter("upload_dedup_hits_total", "Uploads answered with an already archived item (same content hash).")
+TRANSCRIPTION_ROUTES = Counter("transcription_routing_total",
+                               "Automatic transcription routing decisions, by chosen backend and reason.",
+                               ["backend", "reason"])
+AUDIO_BYTES = Counter("audio_processed_bytes_total", "Bytes of audio sent for transcription.", ["method"])
+AUDIO_SECONDS = Counter("audio_processed_seconds_total", "Seconds of source media transcribed.", ["method"])
+TRANSLATED_CHARS = Counter("translated_characters_total", "Characters sent for translation.", ["target_lang"])
+QUEUE_DEPTH = Gauge("ingest_queue_depth", "Jobs waiting in front of each pipeline stage.", ["stage"])
+BUSY_WORKERS = Gauge("ingest_busy_workers", "Pipeline workers currently running a stage.", ["stage"])
+SCHEDULER_WAIT_SECONDS = Histogram("scheduler_wait_seconds",
+                                   "Time jobs waited for a pipeline stage or a backend slot, by priority class.",
+                                   ["resource", "priority"])
+SEARCH_SECONDS = Histogram("search_seconds", "search-content latency, by field and cache outcome.",
+                           ["field", "cache"], buckets=REQUEST_BUCKETS)
+WORKSPACE_BYTES = Gauge("workspace_bytes", "Disk used or reserved by job workspaces on this host.")
+WORKSPACE_ADMISSIONS = Counter("workspace_admissions_total",
+                               "Job workspaces opened, by quota outcome (admitted, waited, rejected).", ["outcome"])
+
+
+def _record(ctx, group, name, elapsed):
+    if ctx is None:
+        return
+    timings = ctx.setdefault("timings", {}).setdefault(group, {})
+    timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def stage(ctx, name):
+    """Times one pipeline stage into STAGE_SECONDS and ctx["timings"]["stages"]."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name, status=status)
+        _record(ctx, "stages", name, elapsed)
+
+
+def instrument_stage(name, func):
+    """Wraps a stage function (func(ctx)) so every run is timed."""
+    def run(ctx):
+        with stage(ctx, name):
+            return func(ctx)
+    run.__name__ = getattr(func, "__name__", name)
+    return run
+
+
+@contextmanager
+def step(ctx, name):
+    """Times a step inside a stage into STEP_SECONDS and ctx["timings"]["steps"] (summed over repeats)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STEP_SECONDS.observe(elapsed, step=name)
+        _record(ctx, "steps", name, elapsed)
+
+
+@contextmanager
+def backend_call(backend, operation):
+    """Times one call to an external backend; an exception counts as an error and is re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        BACKEND_ERRORS.inc(backend=backend, operation=operation)
+        raise
+    finally:
+        BACKEND_SECONDS.observe(time.perf_counter() - started, backend=backend, operation=operation)
+
+
+def timings_summary(ctx):
+    """ctx["timings"] rounded to milliseconds, for processing_info."""
+    return {group: {name: round(sec, 3) for name, sec in values.items()}
+            for group, values in (ctx.get("timings") or {}).items()}
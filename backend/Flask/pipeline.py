@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Stage-graph executor for the ingest pipeline.
+
+Each stage owns a bounded queue and its own pool of worker threads. A job
+moves to the next stage as soon as the current one finishes, so while one
+job waits on the transcription API another can be running ffmpeg and a third
+can be downloading. Bounded queues give backpressure: a slow stage blocks the
+stage in front of it instead of letting work pile up in memory. The queues
+order jobs by priority class and share each class fairly between submitters
+(see scheduler.py); a worker waiting to hand a bulk job to a full stage keeps
+running the interactive jobs queued in front of it.
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import scheduler
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Sentinel that tells a stage worker to exit
+FORWARD_POLL_SEC = 0.1  # How often a worker holding a bulk job looks for interactive work
+
+
+class PipelineFull(Exception):
+    """Raised when a job cannot be admitted because the first stage queue is full."""
+
+
+class PipelineJob:
+    """One unit of work flowing through the pipeline; stages read and write job.ctx."""
+
+    def __init__(self, job_id, ctx):
+        self.job_id = job_id
+        self.ctx = ctx
+        self.status = "queued"          # queued -> running -> completed | failed
+        self.stage = None               # Stage currently holding the job
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.stage_timings = {}         # stage name -> seconds spent in the stage function
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "stage_timings": {name: round(sec, 3) for name, sec in self.stage_timings.items()},
+        }
+
+
+class Stage:
+    """A named step of the pipeline with its own worker pool and bounded input queue (per priority class)."""
+
+    def __init__(self, name, func, workers=1, queue_size=8):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue = scheduler.FairQueue(maxsize=max(1, int(queue_size)), name=name)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.blocked_seconds = 0.0      # Time spent waiting to hand jobs to the next (full) stage
+        self.started_at = None
+
+    def stats(self):
+        with self._lock:
+            uptime = time.time() - self.started_at if self.started_at else 0.0
+            processed = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "busy_workers": self.busy,
+                "queue_depth": self.queue.qsize(),
+                "queue_depth_by_priority": self.queue.depths(),
+                "queue_capacity": self.queue.maxsize,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_seconds": round(self.total_seconds / processed, 3) if processed else None,
+                "throughput_per_min": round(self.completed / uptime * 60, 3) if uptime > 0 else 0.0,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+            }
+
+
+class StagePipeline:
+    """
+    Runs jobs through an ordered list of stages.
+    on_error(job, exc) is called (from the failing worker) when a stage raises,
+    so the owner can release files or other resources held by the job.
+    """
+
+    def __init__(self, stages, on_error=None, on_complete=None, max_finished_jobs=500):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.stages = stages
+        self.on_error = on_error
+        self.on_complete = on_complete
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._counter = itertools.count(1)
+
+    # --- Lifecycle ---
+    def start(self):
+        """Starts the worker threads. Called lazily so nothing runs before a gunicorn fork."""
+        with self._start_lock:
+            if self._started:
+                return
+            for index, stage in enumerate(self.stages):
+                next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+                stage.started_at = time.time()
+                for worker_num in range(stage.workers):
+                    thread = threading.Thread(
+                        target=self._worker_loop, args=(stage, next_stage),
+                        name=f"pipeline-{stage.name}-{worker_num}", daemon=True
+                    )
+                    thread.start()
+                    stage._threads.append(thread)
+            self._started = True
+
+    def shutdown(self, wait=True):
+        """Stops every worker once the queues in front of it drain."""
+        if not self._started:
+            return
+        for stage in self.stages:
+            for _ in stage._threads:
+                stage.queue.put(_STOP)
+            if wait:
+                for thread in stage._threads:
+                    thread.join()
+            stage._threads = []
+        self._started = False
+
+    # --- Submission ---
+    def submit(self, ctx, job_id=None, block=True, timeout=None):
+        """
+        Admits a job into the first stage. Raises PipelineFull if the first queue
+        stays full for longer than timeout (or immediately when block is False).
+        """
+        self.start()
+        job = PipelineJob(job_id or f"job-{next(self._counter)}", ctx)
+        with self._jobs_lock:
+            self._jobs[job.job_id] = job
+        try:
+            self.stages[0].queue.put(job, block=block, timeout=timeout)
+        except queue.Full:
+            with self._jobs_lock:
+                self._jobs.pop(job.job_id, None)
+            raise PipelineFull(f"Pipeline stage '{self.stages[0].name}' is full; try again later.")
+        return job
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._jobs_lock:
+            status_counts = {}
+            for job in self._jobs.values():
+                status_counts[job.status] = status_counts.get(job.status, 0) + 1
+        return {
+            "running": self._started,
+            "jobs": status_counts,
+            "stages": OrderedDict((stage.name, stage.stats()) for stage in self.stages),
+        }
+
+    # --- Internals ---
+    def _worker_loop(self, stage, next_stage):
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                break
+            self._run(stage, next_stage, job)
+
+    def _run(self, stage, next_stage, job):
+        job.stage = stage.name
+        job.status = "running"
+        with stage._lock:
+            stage.busy += 1
+        started = time.time()
+        try:
+            stage.func(job.ctx)
+        except Exception as e:
+            elapsed = time.time() - started
+            job.stage_timings[stage.name] = elapsed
+            with stage._lock:
+                stage.busy -= 1
+                stage.failed += 1
+                stage.total_seconds += elapsed
+            self._fail(job, e)
+            return
+        elapsed = time.time() - started
+        job.stage_timings[stage.name] = elapsed
+        with stage._lock:
+            stage.busy -= 1
+            stage.completed += 1
+            stage.total_seconds += elapsed
+
+        if next_stage is None:
+            self._finish(job)
+        else:
+            self._forward(stage, next_stage, job)
+
+    def _forward(self, stage, next_stage, job):
+        # Blocking put: if the next stage is saturated this worker waits,
+        # which in turn stops it from pulling more work (backpressure).
+        job.status = "queued"
+        job.stage = next_stage.name
+        wait_started = time.time()
+        if scheduler.job_class(job.ctx)[0] == "interactive":
+            next_stage.queue.put(job)
+        else:
+            # A bulk job waiting for room must not hold up the interactive jobs queued
+            # behind it: run those meanwhile (their class has its own room downstream)
+            while True:
+                try:
+                    next_stage.queue.put(job, timeout=FORWARD_POLL_SEC)
+                    break
+                except queue.Full:
+                    pass
+                urgent = stage.queue.get_nowait("interactive")
+                if urgent is not None:
+                    running = time.time()
+                    self._run(stage, next_stage, urgent)
+                    wait_started += time.time() - running
+        with stage._lock:
+            stage.blocked_seconds += time.time() - wait_started
+
+    def _fail(self, job, exc):
+        job.status = "failed"
+        job.error = str(exc)
+        job.ctx["exception"] = exc
+        job.finished_at = time.time()
+        logger.error("Pipeline job %s failed in stage '%s': %s", job.job_id, job.stage, exc, exc_info=exc)
+        if self.on_error:
+            try:
+                self.on_error(job, exc)
+            except Exception as hook_error:
+                logger.error("Error in pipeline on_error hook for %s: %s", job.job_id, hook_error)
+        self._retire(job)
+
+    def _finish(self, job):
+        job.status = "completed"
+        job.stage = None
+        job.finished_at = time.time()
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception as hook_error:
+                logger.error("Error in pipeline on_complete hook for %s: %s", job.job_id, hook_error)
+        self._retire(job)
+
+    def _retire(self, job):
+        job.done.set()
+        # Keep a bounded history of finished jobs for status lookups
+        with self._jobs_lock:
+            finished = [jid for jid, j in self._jobs.items() if j.done.is_set()]
+            for jid in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self._jobs[jid]
+
+
+def run_inline(stages, ctx):
+    """Runs the stage functions one after another in the calling thread (no queues)."""
+    timings = {}
+    for stage in stages:
+        started = time.time()
+        try:
+            stage.func(ctx)
+        finally:
+            timings[stage.name] = time.time() - started
+    return timings
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+On-demand CPU and memory profiles of single ingest jobs.
+
+profile_job(job_id, enabled) wraps a job: while it runs, a sampler thread
+records the job thread's Python stack every PROFILE_INTERVAL_MS and
+tracemalloc traces allocations. When the job ends (also when it fails)
+PROFILE_DIR/<job_id>.* is written:
+
+    .svg              flamegraph of the sampled stacks (open in a browser)
+    .collapsed.txt    the same stacks in collapsed format (flamegraph.pl, speedscope)
+    .allocations.txt  top allocation sites still alive at the end, and the traced peak
+    .json             summary: wall/CPU time, sample count, traced peak, file paths
+
+ffmpeg runs in child processes and shows up only as time spent waiting in
+subprocess. tracemalloc is process-wide, so with concurrent jobs the
+allocation report also includes other requests' allocations.
+
+When enabled is false, profile_job returns a nullcontext: no thread, no
+tracemalloc, nothing on the job's path. Requests can only ask for a profile
+when the server runs with PROFILING_ALLOWED=true.
+"""
+import html
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "30"))
+# Operators opt in; until then the per-request profile flag is ignored
+PROFILING_ALLOWED = os.getenv("PROFILING_ALLOWED", "false").lower() in ("1", "true", "yes", "on")
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+# ---------------------
+# Sampling profiler
+# ---------------------
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of one thread (or every thread) from a background thread."""
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL_MS / 1000.0):
+        self.thread_id = thread_id  # None = all threads except the sampler
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self.stacks[_collapse(frame)] += 1
+            else:
+                if len(names) != len(frames):
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident != own_id:
+                        self.stacks[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+            self.samples += 1
+
+
+def render_flamegraph(stacks, title, width=1200, row_height=16):
+    """SVG flamegraph (root at the bottom) of collapsed stacks {"a;b;c": count}."""
+    root = {"value": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["value"] += count
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"value": 0, "children": {}})
+            node["value"] += count
+    total = root["value"] or 1
+
+    def depth_of(node):
+        return 1 + max((depth_of(child) for child in node["children"].values()), default=0)
+
+    depth = depth_of(root)
+    top = 24
+    height = top + depth * row_height + 4
+    scale = width / total
+    rects = []
+
+    def place(name, node, x, level):
+        w = node["value"] * scale
+        if w < 0.5:
+            return
+        y = top + (depth - level - 1) * row_height
+        hue = zlib.crc32(name.encode("utf-8")) % 55
+        label = html.escape(name)
+        tooltip = f"{label} ({node['value']} samples, {node['value'] / total:.1%})"
+        chars = int(w / 7)
+        text = html.escape(name if len(name) <= chars else name[:max(0, chars - 2)] + "..") if chars > 3 else ""
+        rects.append(f'<g><title>{tooltip}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" '
+                     f'height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+                     + (f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{text}</text>' if text else "")
+                     + "</g>")
+        for child_name, child in sorted(node["children"].items()):
+            place(child_name, child, x, level + 1)
+            x += child["value"] * scale
+
+    place("all", root, 0.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="4" y="16" font-size="13">{html.escape(title)}</text>'
+            + "".join(rects) + "</svg>\n")
+
+
+# ---------------------
+# tracemalloc
+# ---------------------
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    """Takes the snapshot; stops tracing when no other profiled job still needs it."""
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return snapshot, peak
+
+
+def format_allocations(snapshot, peak, limit=PROFILE_TOP_ALLOCATIONS):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    stats = snapshot.statistics("traceback")
+    lines = [f"Traced peak: {peak / 1024 / 1024:.1f} MB",
+             f"Still allocated at job end: {sum(s.size for s in stats) / 1024 / 1024:.1f} MB in {len(stats)} sites",
+             ""]
+    for index, stat in enumerate(stats[:limit], 1):
+        lines.append(f"#{index}: {stat.size / 1024:.1f} KB in {stat.count} blocks")
+        lines.extend("    " + line for line in stat.traceback.format(most_recent_first=True))
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------
+# Per-job profile
+# ---------------------
+def profile_job(job_id, enabled=True, all_threads=False):
+    """Context manager profiling the block; a no-op nullcontext unless enabled."""
+    if not enabled:
+        return nullcontext()
+    return _profiled(job_id, all_threads)
+
+
+@contextmanager
+def _profiled(job_id, all_threads):
+    result = {"job_id": job_id}
+    sampler = StackSampler(None if all_threads else threading.get_ident())
+    _start_tracemalloc()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    thread_cpu_before = time.thread_time()
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield result
+    finally:
+        sampler.stop()
+        wall = time.perf_counter() - started
+        thread_cpu = time.thread_time() - thread_cpu_before
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        snapshot, peak = _stop_tracemalloc()
+        result.update({
+            "wall_sec": round(wall, 3),
+            "thread_cpu_sec": round(thread_cpu, 3),
+            "process_cpu_sec": round((usage_after.ru_utime + usage_after.ru_stime)
+                                     - (usage_before.ru_utime + usage_before.ru_stime), 3),
+            "samples": sampler.samples,
+            "sample_interval_ms": PROFILE_INTERVAL_MS,
+            "traced_peak_mb": round(peak / 1024 / 1024, 1),
+        })
+        try:
+            result["files"] = _write_profile(job_id, sampler.stacks, snapshot, peak, result)
+            logger.info("Profile written: %s (%.1fs wall, %d samples)", result["files"]["flamegraph"],
+                        wall, sampler.samples)
+        except Exception as e:
+            # A profile is diagnostics only; never fail the job over it
+            logger.warning("Could not write profile for job %s: %s", job_id, e)
+
+
+def client_summary(result):
+    """The profile summary for an API response: the numbers without the server's file paths."""
+    return {key: value for key, value in result.items() if key != "files"}
+
+
+def _write_profile(job_id, stacks, snapshot, peak, summary):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, str(job_id))
+    files = {"flamegraph": base + ".svg", "collapsed": base + ".collapsed.txt",
+             "allocations": base + ".allocations.txt", "summary": base + ".json"}
+    with open(files["collapsed"], "w", encoding="utf-8") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    with open(files["flamegraph"], "w", encoding="utf-8") as f:
+        f.write(render_flamegraph(stacks, f"job {job_id}: {summary['wall_sec']}s wall, "
+                                          f"{summary['samples']} samples"))
+    with open(files["allocations"], "w", encoding="utf-8") as f:
+        f.write(format_allocations(snapshot, peak))
+    with open(files["summary"], "w", encoding="utf-8") as f:
+        json.dump({**summary, "files": files}, f, indent=2)
+    return files
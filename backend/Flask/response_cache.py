@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+TTL/LRU cache for serialized read responses.
+
+Keys are namespaced by a collection name and that collection's version
+counter: `bump(namespace)` after any write makes every cached response of the
+namespace unreachable at once (stale entries then age out of the LRU), so
+invalidation is exact without tracking which results a write affected.
+
+The default backend is in-process. With RESPONSE_CACHE_URL=redis://...
+(and the optional `redis` package installed) entries and version counters
+live in Redis, so a write in one gunicorn worker invalidates all of them;
+with the in-process backend each worker has its own cache and writes made
+by other processes are only picked up when entries expire (RESPONSE_CACHE_TTL_SEC).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")  # empty = in-process; redis://host:6379/0 = shared
+
+
+class LocalBackend:
+    """In-process LRU of bytes values with per-entry expiry, bounded by entry count and total size."""
+
+    name = "local"
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            return self._versions[namespace]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self._evictions,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class RedisBackend:
+    """Shared backend: same interface, values and version counters stored in Redis."""
+
+    name = "redis"
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = "response_cache:"
+
+    def get(self, key):
+        return self._redis.get(self._prefix + key)
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, value, px=int(ttl * 1000))
+
+    def version(self, namespace):
+        return int(self._redis.get(self._prefix + "version:" + namespace) or 0)
+
+    def bump(self, namespace):
+        return self._redis.incr(self._prefix + "version:" + namespace)
+
+    def clear(self):
+        for key in self._redis.scan_iter(self._prefix + "*"):
+            self._redis.delete(key)
+
+    def usage(self):
+        info = self._redis.info("memory")
+        return {"bytes": info.get("used_memory"), "entries": self._redis.dbsize()}
+
+
+def make_backend(url=RESPONSE_CACHE_URL):
+    if not url:
+        return LocalBackend()
+    try:
+        backend = RedisBackend(url)
+        backend.version("ping")
+        return backend
+    except Exception as e:
+        logger.warning("shared response cache at %s unavailable (%s); using the in-process cache.", url, e)
+        return LocalBackend()
+
+
+class ResponseCache:
+    """Versioned get/set of JSON-serializable values, with hit/miss accounting."""
+
+    def __init__(self, backend=None, ttl=RESPONSE_CACHE_TTL_SEC):
+        self.backend = backend or make_backend()
+        self.ttl = ttl
+        self.enabled = ttl > 0
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, namespace, key_parts):
+        """
+        The versioned key of a lookup. Take it once, before reading the data: set() with the
+        same key then cannot store results read before an invalidation under the new version.
+        None when disabled or the version cannot be read (get() misses, set() skips).
+        """
+        if not self.enabled:
+            return None
+        digest = hashlib.sha256(json.dumps(key_parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        try:
+            return f"{namespace}:v{self.backend.version(namespace)}:{digest[:32]}"
+        except Exception as e:
+            logger.warning("response cache version read failed: %s", e)
+            return None
+
+    def get(self, key):
+        """Returns the cached value of key (from key()), or None on a miss."""
+        if key is None:
+            return None
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            logger.warning("response cache read failed: %s", e)
+            raw = None
+        with self._lock:
+            if raw is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        if key is None:
+            return
+        try:
+            self.backend.set(key, json.dumps(value).encode("utf-8"), self.ttl)
+        except Exception as e:
+            logger.warning("response cache write failed: %s", e)
+
+    def invalidate(self, namespace):
+        """Call after every write to the namespace's collection."""
+        try:
+            self.backend.bump(namespace)
+        except Exception as e:
+            logger.warning("response cache invalidation failed: %s", e)
+        with self._lock:
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            counts = {"hits": self._hits, "misses": self._misses, "invalidations": self._invalidations,
+                      "hit_ratio": round(self._hits / lookups, 4) if lookups else None}
+        try:
+            usage = self.backend.usage()
+        except Exception as e:
+            usage = {"error": str(e)}
+        return {"backend": self.backend.name, "enabled": self.enabled, "ttl_sec": self.ttl, **counts, **usage}
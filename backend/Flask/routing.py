@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Automatic choice between the OpenAI API and local Whisper for a job's transcription.
+
+A request picks its backend with local_transcription: true (local Whisper),
+false (API) or "auto" (case-insensitive); any other value counts as false.
+TRANSCRIPTION_ROUTING=auto makes "auto" the default for requests that do
+not say. An auto job is routed in the acquire stage,
+once its media is probed, from:
+
+    duration      probed media duration
+    load          calls running on this host or waiting here, per backend (scheduler.py)
+    API headroom  share of the API request rate limit left (x-ratelimit-* headers)
+    budget        ROUTING_DAILY_BUDGET_USD minus today's API transcription spend
+
+The API is used when it is available, has headroom and fits the budget, and
+finishes enough sooner than local Whisper to be worth its price at
+ROUTING_USD_PER_HOUR_SAVED. Its estimated cost is reserved on the day's spend
+record as part of the decision (reserve_spend), so concurrent jobs cannot all
+spend the same remaining budget, and settled to the billed audio when the
+transcription ends (settle_spend); otherwise the job runs locally. Speeds (seconds of
+compute per second of audio) start at ROUTING_LOCAL_RTF / ROUTING_API_RTF and
+follow the transcriptions this process has finished (moving average).
+
+Every job, routed or not, gets processing_info.transcription_routing: the
+decision with its inputs and estimates, and the realized wait and latency, so
+the policy can be tuned from stored data. The app transcribes each job in one
+call, so a job is the unit of routing.
+"""
+import importlib.util
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import media_tools
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"        # Same names as processing_info.transcription_method
+API = "openai_api"
+
+TRANSCRIPTION_ROUTING = os.getenv("TRANSCRIPTION_ROUTING", "manual").lower()  # "auto" routes unspecified requests
+ROUTING_DAILY_BUDGET_USD = float(os.getenv("ROUTING_DAILY_BUDGET_USD", "0"))  # 0 = no budget
+ROUTING_USD_PER_HOUR_SAVED = float(os.getenv("ROUTING_USD_PER_HOUR_SAVED", "1.0"))
+ROUTING_MIN_API_HEADROOM = float(os.getenv("ROUTING_MIN_API_HEADROOM", "0.1"))
+ROUTING_API_OVERHEAD_SEC = float(os.getenv("ROUTING_API_OVERHEAD_SEC", "5"))  # Upload and queueing per call
+ROUTING_SPEND_COLLECTION = os.getenv("ROUTING_SPEND_COLLECTION", "transcription_spend")
+SMOOTHING = 0.2  # Weight of the newest realized transcription in the speed estimates
+
+_speeds = {LOCAL: float(os.getenv("ROUTING_LOCAL_RTF", "1.0")), API: float(os.getenv("ROUTING_API_RTF", "0.1"))}
+_job_seconds = {}  # backend -> moving average of one call's duration
+_estimates_lock = threading.Lock()
+_local_available = None
+
+
+def requested_local(value):
+    """
+    local_transcription field -> True (local Whisper), False (API) or None (route automatically).
+    Strings other than "true" and "auto" (any case) mean the API.
+    """
+    if value is None or value == "":
+        return None if TRANSCRIPTION_ROUTING == "auto" else False
+    if isinstance(value, str):
+        value = value.strip().lower()
+        return None if value == "auto" else value == "true"
+    return bool(value)
+
+
+def local_whisper_available():
+    """Whether openai-whisper is installed (the model itself is loaded on first use)."""
+    global _local_available
+    if _local_available is None:
+        _local_available = importlib.util.find_spec("whisper") is not None
+    return _local_available
+
+
+def api_cost(audio_sec):
+    return max(0.0, audio_sec) / 60.0 * media_tools.OPENAI_COST_PER_MINUTE
+
+
+def _eta(backend, duration, load):
+    with _estimates_lock:
+        own = duration * _speeds[backend]
+        job_sec = _job_seconds.get(backend, own)
+    if not load:
+        return own
+    busy, slots = load
+    # Each full round of calls ahead of this one costs about one average call
+    return busy // max(1, slots) * job_sec + own
+
+
+def decide(duration_sec, local_available=True, api_available=True, local_load=None, api_load=None,
+           api_headroom=None, budget_left_usd=None):
+    """
+    Picks LOCAL or API for one job and returns the decision record. *_load are
+    (calls running or waiting, slots) or None; api_headroom and budget_left_usd
+    are None when unknown or unlimited.
+    """
+    duration = max(0.0, duration_sec or 0.0)
+    local_sec = _eta(LOCAL, duration, local_load)
+    api_sec = _eta(API, duration, api_load) + ROUTING_API_OVERHEAD_SEC
+    usd = api_cost(duration)
+    time_value = (local_sec - api_sec) / 3600.0 * ROUTING_USD_PER_HOUR_SAVED
+
+    if not api_available:
+        backend, reason = LOCAL, "api_unavailable"
+    elif not local_available:
+        backend, reason = API, "local_unavailable"
+    elif api_headroom is not None and api_headroom < ROUTING_MIN_API_HEADROOM:
+        backend, reason = LOCAL, "api_rate_limited"
+    elif budget_left_usd is not None and usd > budget_left_usd:
+        backend, reason = LOCAL, "over_budget"
+    elif time_value >= usd:
+        backend, reason = API, "faster"
+    else:
+        backend, reason = LOCAL, "cheaper"
+    return {
+        "mode": "auto",
+        "backend": backend,
+        "reason": reason,
+        "inputs": {
+            "duration_sec": round(duration, 1),
+            "local_available": local_available,
+            "api_available": api_available,
+            "local_load": list(local_load) if local_load else None,
+            "api_load": list(api_load) if api_load else None,
+            "api_headroom": round(api_headroom, 3) if api_headroom is not None else None,
+            "budget_left_usd": round(budget_left_usd, 4) if budget_left_usd is not None else None,
+        },
+        "estimates": {
+            "local_sec": round(local_sec, 1),
+            "api_sec": round(api_sec, 1),
+            "api_usd": round(usd, 4),
+            "time_value_usd": round(time_value, 4),
+        },
+    }
+
+
+def observe(backend, audio_sec, elapsed_sec):
+    """Feeds one finished transcription into the speed estimates."""
+    if audio_sec <= 0 or elapsed_sec <= 0 or backend not in _speeds:
+        return
+    overhead = ROUTING_API_OVERHEAD_SEC if backend == API else 0.0
+    speed = max(0.0, elapsed_sec - overhead) / audio_sec
+    with _estimates_lock:
+        _speeds[backend] += SMOOTHING * (speed - _speeds[backend])
+        previous = _job_seconds.get(backend, elapsed_sec)
+        _job_seconds[backend] = previous + SMOOTHING * (elapsed_sec - previous)
+
+
+def realized(backend, ok, audio_sec, wait_sec, elapsed_sec):
+    """The realized part of processing_info.transcription_routing."""
+    return {
+        "backend": backend,
+        "ok": ok,
+        "audio_sec": round(audio_sec, 1),
+        "wait_sec": round(wait_sec, 3),
+        "transcribe_sec": round(elapsed_sec, 3),
+        "rtf": round(elapsed_sec / audio_sec, 4) if audio_sec > 0 else None,
+    }
+
+
+def estimates():
+    with _estimates_lock:
+        return {"rtf": {name: round(value, 4) for name, value in _speeds.items()},
+                "job_seconds": {name: round(value, 1) for name, value in _job_seconds.items()}}
+
+
+# ---------------------
+# Daily API spend (shared by all workers through MongoDB)
+# ---------------------
+def _today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def budget_left(get_collection):
+    """USD of today's budget not yet spent; None without a budget or when the spend cannot be read."""
+    if not ROUTING_DAILY_BUDGET_USD:
+        return None
+    try:
+        record = get_collection().find_one({"_id": _today()}) or {}
+    except Exception as e:
+        logger.warning("could not read today's transcription spend: %s", e)
+        return None
+    return max(0.0, ROUTING_DAILY_BUDGET_USD - record.get("usd", 0.0))
+
+
+def reserve_spend(get_collection, usd):
+    """
+    Reserves usd of today's budget for one API transcription, atomically: the day's record is
+    only incremented while it stays within ROUTING_DAILY_BUDGET_USD. Returns the reservation
+    ({"day", "usd"}; nothing reserved without a budget or when the record cannot be written),
+    or None when the cost does not fit.
+    """
+    if not ROUTING_DAILY_BUDGET_USD:
+        return {"day": None, "usd": 0.0}
+    from pymongo.errors import DuplicateKeyError
+    day = _today()
+    update = {"$inc": {"usd": usd, "reserved_usd": usd}, "$set": {"updated_at": datetime.now()}}
+    try:
+        collection = get_collection()
+        for _ in range(2):
+            result = collection.update_one({"_id": day, "usd": {"$lte": ROUTING_DAILY_BUDGET_USD - usd}}, update)
+            if result.matched_count:
+                return {"day": day, "usd": usd}
+            if usd > ROUTING_DAILY_BUDGET_USD or collection.find_one({"_id": day}, {"_id": 1}):
+                return None
+            try:
+                collection.insert_one({"_id": day, "usd": 0.0, "reserved_usd": 0.0, "audio_sec": 0.0, "jobs": 0})
+            except DuplicateKeyError:
+                pass  # Another job created it first; the conditional update decides
+    except Exception as e:
+        logger.warning("could not reserve transcription spend: %s", e)
+    return {"day": None, "usd": 0.0}
+
+
+def settle_spend(get_collection, reservation, audio_sec):
+    """
+    Replaces a job's reservation (None or 0 USD for jobs that reserved nothing) by the cost of
+    the audio the API billed, on the day it was reserved; audio_sec 0 refunds it. Best effort.
+    """
+    reserved = (reservation or {}).get("usd") or 0.0
+    day = (reservation or {}).get("day") or _today()
+    billed = audio_sec > 0
+    update = {"$inc": {"usd": (api_cost(audio_sec) if billed else 0.0) - reserved, "reserved_usd": -reserved,
+                       "audio_sec": audio_sec, "jobs": 1 if billed else 0},
+              "$set": {"updated_at": datetime.now()}}
+    try:
+        get_collection().update_one({"_id": day}, update, upsert=True)
+    except Exception as e:
+        logger.warning("could not record transcription spend: %s", e)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Priority classes and per-submitter fair sharing for ingest jobs.
+
+Every job carries a priority class and a submitter in its ctx:
+
+    ctx["priority"]   "interactive" (default: a person waiting on one upload)
+                      or "bulk" (playlist imports, backfills, priority=bulk requests)
+    ctx["submitter"]  who asked for it (X-Submitter header / "submitter" field,
+                      else the client address)
+
+Two places decide which job goes next:
+
+    FairQueue      the input queue of each pipeline stage (pipeline.py). Interactive
+                   jobs are taken before bulk ones; within a class, submitters take
+                   turns (round robin), so one long playlist cannot starve another
+                   submitter's jobs. Each class has its own capacity, so a full bulk
+                   backlog never blocks an interactive submit.
+    backend_slot   caps concurrent calls per backend (SCHEDULER_BACKEND_LIMITS) on
+                   this host and hands a free slot to the waiting interactive job
+                   first, then to the submitter with the fewest calls running. The
+                   synchronous endpoint runs outside the pipeline queues, so this is
+                   where it gets ahead of bulk work.
+
+The slots are shared by every process on the host (gunicorn workers, the
+async service, trans.py backfills): slot i of a backend is an flock on
+SCHEDULER_LOCK_DIR/<backend>.<i>, released by the kernel if the holder dies.
+Within a process the waiters queue as above; across processes a bulk waiter
+leaves free slots alone while an interactive job anywhere on the host is
+waiting for that backend (it holds a shared lock on <backend>.interactive).
+
+A bulk job that has waited SCHEDULER_AGING_SEC is treated as interactive, so
+a steady stream of interactive work cannot starve bulk work forever.
+"""
+import fcntl
+import itertools
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "bulk")  # Highest first
+DEFAULT_PRIORITY = "interactive"
+DEFAULT_SUBMITTER = "anonymous"
+SCHEDULER_AGING_SEC = float(os.getenv("SCHEDULER_AGING_SEC", "600"))
+# Concurrent calls per backend on this host; a backend not listed is not limited
+SCHEDULER_BACKEND_LIMITS = os.getenv("SCHEDULER_BACKEND_LIMITS",
+                                     "openai=4,whisper_local=1,google_translate=8,youtube=4")
+SCHEDULER_LOCK_DIR = os.getenv("SCHEDULER_LOCK_DIR", os.path.join(tempfile.gettempdir(), "swayambhu-scheduler"))
+HOST_POLL_SEC = 0.1  # How often the next waiter retries when other processes hold every slot
+
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+
+def parse_priority(value):
+    """A valid priority class name, DEFAULT_PRIORITY for empty values; raises ValueError otherwise."""
+    priority = str(value or DEFAULT_PRIORITY).strip().lower()
+    if priority not in _RANK:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}, not '{value}'")
+    return priority
+
+
+def job_class(ctx):
+    """(priority name, submitter) of a job ctx; defaults for ctxs without them (e.g. trans.py)."""
+    ctx = ctx or {}
+    priority = ctx.get("priority") if ctx.get("priority") in _RANK else DEFAULT_PRIORITY
+    return priority, ctx.get("submitter") or DEFAULT_SUBMITTER
+
+
+def _effective_rank(priority, waited):
+    rank = _RANK[priority]
+    return max(0, rank - 1) if waited >= SCHEDULER_AGING_SEC else rank
+
+
+class FairQueue:
+    """
+    queue.Queue replacement for pipeline stages (put/get/qsize/maxsize, raises queue.Full).
+    maxsize bounds each priority class separately. Items without a ctx (the pipeline's stop
+    sentinel) are handed out only once no job is waiting.
+    """
+
+    def __init__(self, maxsize=0, name="queue"):
+        self.maxsize = maxsize
+        self.name = name
+        self._cond = threading.Condition()
+        # priority -> submitter -> deque of (enqueued_at, item); dict order is the round robin
+        self._lanes = {priority: OrderedDict() for priority in PRIORITIES}
+        self._counts = {priority: 0 for priority in PRIORITIES}
+        self._control = deque()
+
+    def put(self, item, block=True, timeout=None):
+        ctx = getattr(item, "ctx", None)
+        with self._cond:
+            if ctx is None:
+                self._control.append(item)
+                self._cond.notify_all()
+                return
+            priority, submitter = job_class(ctx)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.maxsize > 0 and self._counts[priority] >= self.maxsize:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    raise queue.Full
+                self._cond.wait(remaining)
+            self._lanes[priority].setdefault(submitter, deque()).append((time.monotonic(), item))
+            self._counts[priority] += 1
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while not self.qsize() and not self._control:
+                self._cond.wait()
+            if not self.qsize():
+                return self._control.popleft()
+            return self._pop(*self._next_lane())
+
+    def get_nowait(self, priority):
+        """The next job of one priority class (in submitter turn), or None when none is queued."""
+        with self._cond:
+            if not self._lanes[priority]:
+                return None
+            return self._pop(priority, next(iter(self._lanes[priority])))
+
+    def _pop(self, priority, submitter):
+        lane = self._lanes[priority][submitter]
+        enqueued_at, item = lane.popleft()
+        if lane:
+            self._lanes[priority].move_to_end(submitter)  # The next submitter's turn
+        else:
+            del self._lanes[priority][submitter]
+        self._counts[priority] -= 1
+        self._cond.notify_all()
+        metrics.SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - enqueued_at, resource=self.name, priority=priority)
+        return item
+
+    def _next_lane(self):
+        now = time.monotonic()
+        best = None
+        for priority in PRIORITIES:
+            lanes = self._lanes[priority]
+            if not lanes:
+                continue
+            # The first lane is the submitter whose turn it is; the oldest head decides aging
+            oldest = min(lane[0][0] for lane in lanes.values())
+            rank = _effective_rank(priority, now - oldest)
+            if best is None or rank < best[0]:
+                best = (rank, priority, next(iter(lanes)))
+        return best[1], best[2]
+
+    def qsize(self):
+        return sum(self._counts.values())
+
+    def depths(self):
+        with self._cond:
+            return dict(self._counts)
+
+
+class HostSlots:
+    """The `limit` slots of one backend shared by all processes on this host (see the module docstring)."""
+
+    def __init__(self, name, limit, lock_dir=None):
+        self.name = name
+        self.limit = limit
+        self.lock_dir = lock_dir or SCHEDULER_LOCK_DIR
+
+    def _open(self, suffix):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        return os.open(os.path.join(self.lock_dir, f"{self.name}.{suffix}"), os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _try_lock(self, suffix, mode=fcntl.LOCK_EX):
+        """An open fd holding the lock, or None if another holder has it."""
+        fd = self._open(suffix)
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def announce(self):
+        """Marks an interactive job waiting for this backend until release()d."""
+        fd = self._open("interactive")
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        return fd
+
+    def interactive_waiting(self):
+        fd = self._try_lock("interactive")
+        if fd is None:
+            return True
+        os.close(fd)
+        return False
+
+    def acquire(self, yield_to_interactive=False):
+        """A held slot (fd) or None when all are taken, or when yielding and an interactive job waits."""
+        if yield_to_interactive and self.interactive_waiting():
+            return None
+        for index in range(self.limit):
+            fd = self._try_lock(index)
+            if fd is not None:
+                return fd
+        return None
+
+    @staticmethod
+    def release(fd):
+        os.close(fd)  # Drops the flock
+
+    def in_use(self):
+        """Slots held by any process on this host."""
+        held = 0
+        for index in range(self.limit):
+            fd = self._try_lock(index)
+            if fd is None:
+                held += 1
+            else:
+                os.close(fd)
+        return held
+
+
+class BackendSlots:
+    """
+    At most `limit` concurrent calls to one backend on this host; waiters in this process are
+    served by priority, then fair share, and only the next one in line competes for a host slot.
+    """
+
+    def __init__(self, name, limit, lock_dir=None):
+        self.name = name
+        self.limit = limit
+        self.host = HostSlots(name, limit, lock_dir)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._running = {}   # submitter -> calls in progress
+        self._waiting = []   # [priority, submitter, enqueued_at, seq]
+        self._seq = itertools.count()
+
+    def _next(self, now):
+        return min(self._waiting, key=lambda w: (_effective_rank(w[0], now - w[2]),
+                                                 self._running.get(w[1], 0), w[3]))
+
+    @contextmanager
+    def slot(self, ctx):
+        priority, submitter = job_class(ctx)
+        enqueued_at = time.monotonic()
+        ticket = [priority, submitter, enqueued_at, next(self._seq)]
+        announced = self.host.announce() if priority == "interactive" else None
+        try:
+            with self._cond:
+                self._waiting.append(ticket)
+                try:
+                    while True:
+                        now = time.monotonic()
+                        if self._next(now) is not ticket:
+                            # Timed wait: aging can change the order without anyone releasing a slot
+                            self._cond.wait(timeout=5.0)
+                            continue
+                        held = self.host.acquire(yield_to_interactive=_effective_rank(priority, now - enqueued_at) > 0)
+                        if held is not None:
+                            break
+                        self._cond.wait(timeout=HOST_POLL_SEC)
+                finally:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                self._in_use += 1
+                self._running[submitter] = self._running.get(submitter, 0) + 1
+        finally:
+            if announced is not None:
+                self.host.release(announced)
+        waited = time.monotonic() - enqueued_at
+        metrics.SCHEDULER_WAIT_SECONDS.observe(waited, resource=self.name, priority=priority)
+        if waited > 1.0:
+            logger.info("%s job of %s waited %.1fs for a %s slot", priority, submitter, waited, self.name)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.host.release(held)
+                self._in_use -= 1
+                self._running[submitter] -= 1
+                if not self._running[submitter]:
+                    del self._running[submitter]
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waiting = {priority: sum(1 for w in self._waiting if w[0] == priority) for priority in PRIORITIES}
+            in_use = self._in_use
+        return {"limit": self.limit, "in_use": in_use, "host_in_use": self.host.in_use(), "waiting": waiting}
+
+
+def _parse_limits(spec):
+    limits = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+_backends = {name: BackendSlots(name, limit) for name, limit in _parse_limits(SCHEDULER_BACKEND_LIMITS).items()
+             if limit > 0}
+
+
+@contextmanager
+def backend_slot(backend, ctx):
+    """Holds one of the backend's call slots for the duration of the block (no-op for unlimited backends)."""
+    slots = _backends.get(backend)
+    if slots is None:
+        yield
+        return
+    with slots.slot(ctx):
+        yield
+
+
+def stats():
+    return {name: slots.stats() for name, slots in _backends.items()}
+
+
+def load(backend):
+    """
+    (calls running on this host + waiting in this process, slot limit) of a backend;
+    None for unlimited backends.
+    """
+    slots = _backends.get(backend)
+    if slots is None:
+        return None
+    current = slots.stats()
+    return current["host_in_use"] + sum(current["waiting"].values()), slots.limit
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Lazily created, fork-safe clients for the heavy external services.
+
+Nothing here connects or imports a heavy SDK at import time: each service
+is built by its factory on first get(), so a gunicorn worker (or a CLI run)
+only pays for what it uses, and read-only search never loads yt-dlp, the
+Google SDK or Whisper.
+
+Fork safety: instances remember the pid that created them. A forked child
+(gunicorn --preload, multiprocessing) never reuses its parent's client;
+pymongo in particular must not be used across fork(). The child builds its
+own client on first use.
+
+Once a process has used any service, a daemon thread re-checks the
+initialized services every SERVICE_HEALTH_INTERVAL_SEC and pre-builds the
+ones listed in SERVICES_WARMUP, so the first request that needs them does
+not wait. A factory that fails is retried after SERVICE_RETRY_SEC, not on
+every call.
+
+    SERVICES_EAGER=false          true = build everything at startup (fail fast, the old behaviour)
+    SERVICES_WARMUP=mongodb       comma-separated services to pre-build in the background
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SERVICE_HEALTH_INTERVAL_SEC = float(os.getenv("SERVICE_HEALTH_INTERVAL_SEC", "30"))
+SERVICE_RETRY_SEC = float(os.getenv("SERVICE_RETRY_SEC", "30"))
+SERVICES_EAGER = os.getenv("SERVICES_EAGER", "false").lower() in ("1", "true", "yes", "on")
+SERVICES_WARMUP = [name.strip() for name in os.getenv("SERVICES_WARMUP", "mongodb").split(",") if name.strip()]
+
+_registry = {}
+_registry_lock = threading.Lock()
+_health_thread = None
+_health_pid = None
+
+
+class ServiceUnavailable(RuntimeError):
+    """get() on a service whose factory failed (the message carries the original error)."""
+
+
+class LazyService:
+    """One client, built by factory() on first use; health_check(instance) raises when unhealthy."""
+
+    def __init__(self, name, factory, health_check=None, required=True):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.required = required  # False: get() returns None instead of raising when unavailable
+        self._instance = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._error = None
+        self._failed_at = None
+        self._init_sec = None
+        self._healthy = None
+        self._checked_at = None
+
+    def get(self):
+        instance = self._instance
+        if instance is not None and self._pid == os.getpid():
+            return instance
+        with self._lock:
+            if self._pid != os.getpid():
+                self._forget()
+            if self._instance is None:
+                self._create()
+        _ensure_health_thread()
+        if self._instance is None and self.required:
+            raise ServiceUnavailable(f"{self.name} unavailable: {self._error}")
+        return self._instance
+
+    def peek(self):
+        """The instance if this process already built it, without building it."""
+        return self._instance if self._pid == os.getpid() else None
+
+    def set(self, instance):
+        """Replaces the instance (benchmarks, tests, a client configured elsewhere)."""
+        with self._lock:
+            self._instance = instance
+            self._pid = os.getpid()
+            self._error = None
+            self._failed_at = None
+
+    def reset(self):
+        with self._lock:
+            self._forget()
+
+    def check(self):
+        """Runs the health check now; returns True when healthy."""
+        instance = self.peek()
+        if instance is None:
+            return False
+        try:
+            if self.health_check:
+                self.health_check(instance)
+            healthy, error = True, None
+        except Exception as e:
+            healthy, error = False, str(e)
+        if healthy != self._healthy:
+            log = logger.info if healthy else logger.warning
+            log("service %s is %s%s", self.name, "healthy" if healthy else "unhealthy",
+                f": {error}" if error else "")
+        self._healthy = healthy
+        self._checked_at = time.time()
+        if error:
+            self._error = error
+        return healthy
+
+    def status(self):
+        initialized = self.peek() is not None
+        return {"initialized": initialized, "healthy": self._healthy if initialized else None,
+                "init_sec": self._init_sec, "error": self._error,
+                "checked_at": self._checked_at}
+
+    def _create(self):
+        if self._failed_at is not None and time.monotonic() - self._failed_at < SERVICE_RETRY_SEC:
+            return
+        started = time.perf_counter()
+        try:
+            instance = self.factory()
+        except Exception as e:
+            self._error = str(e)
+            self._failed_at = time.monotonic()
+            logger.warning("could not initialize %s: %s", self.name, e)
+            return
+        self._init_sec = round(time.perf_counter() - started, 3)
+        self._instance = instance
+        self._pid = os.getpid()
+        self._error = None
+        self._failed_at = None
+        self._healthy = None
+        logger.info("%s initialized in %.2fs", self.name, self._init_sec)
+
+    def _forget(self):
+        # A parent's client is dropped, not closed: closing it could disturb the parent's connections
+        self._instance = None
+        self._pid = None
+        self._error = None
+        self._failed_at = None
+        self._healthy = None
+        self._checked_at = None
+
+
+def register(name, factory, health_check=None, required=True):
+    """Creates (or returns the already registered) service called name."""
+    with _registry_lock:
+        service = _registry.get(name)
+        if service is None:
+            service = _registry[name] = LazyService(name, factory, health_check, required)
+        return service
+
+
+def get(name):
+    return _registry[name].get()
+
+
+def status():
+    with _registry_lock:
+        services = dict(_registry)
+    return {name: service.status() for name, service in sorted(services.items())}
+
+
+def init_all():
+    """Builds every registered service now (SERVICES_EAGER); returns the names that failed."""
+    with _registry_lock:
+        services = list(_registry.values())
+    failed = []
+    for service in services:
+        try:
+            if service.get() is None:
+                failed.append(service.name)
+        except ServiceUnavailable:
+            failed.append(service.name)
+    return failed
+
+
+# ---------------------
+# Background health checks
+# ---------------------
+def _ensure_health_thread():
+    """Starts the checker on first use in this process (never at import, so never before a fork)."""
+    global _health_thread, _health_pid
+    if _health_pid == os.getpid() or SERVICE_HEALTH_INTERVAL_SEC <= 0:
+        return
+    with _registry_lock:
+        if _health_pid == os.getpid():
+            return
+        _health_pid = os.getpid()
+        _health_thread = threading.Thread(target=_health_loop, name="service-health", daemon=True)
+        _health_thread.start()
+
+
+def _health_loop():
+    pid = os.getpid()
+    for name in SERVICES_WARMUP:
+        service = _registry.get(name)
+        if service is not None and service.peek() is None:
+            try:
+                service.get()
+            except ServiceUnavailable:
+                pass
+    while _health_pid == pid:
+        with _registry_lock:
+            services = list(_registry.values())
+        for service in services:
+            if service.peek() is not None:
+                service.check()
+        time.sleep(SERVICE_HEALTH_INTERVAL_SEC)
+
+
+def is_download_error(exc):
+    """isinstance(exc, yt_dlp DownloadError) without importing yt_dlp (unimported = cannot be one)."""
+    yt_dlp = sys.modules.get("yt_dlp")
+    return yt_dlp is not None and isinstance(exc, yt_dlp.utils.DownloadError)
+
+
+# ---------------------
+# Shared factories
+# ---------------------
+def export_google_credentials(credentials_path):
+    """
+    Points the application default credentials (GOOGLE_APPLICATION_CREDENTIALS) at credentials_path,
+    for every Google client in the process (the async service's included). Cheap: no SDK import.
+    Returns the path, or None when the file does not exist.
+    """
+    if not credentials_path:
+        return None
+    credentials_path = os.path.expanduser(credentials_path)
+    if not os.path.exists(credentials_path):
+        return None
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
+    return credentials_path
+
+
+def google_translate_client(credentials_path=None):
+    """google.cloud.translate_v2 Client; the SDK is imported only here."""
+    from google.cloud import translate_v2 as translate
+    if credentials_path and not export_google_credentials(credentials_path):
+        raise FileNotFoundError(f"Google Cloud credentials not found at: {credentials_path}")
+    return translate.Client()
+
+
+def whisper_model(model_name):
+    """The local Whisper model, loaded once per process and name (loading takes seconds to minutes)."""
+    def load():
+        import whisper
+        return whisper.load_model(model_name)
+    return register(f"whisper:{model_name}", load).get()
+
+
+def _forget_after_fork():
+    global _health_pid
+    _health_pid = None
+
+
+os.register_at_fork(after_in_child=_forget_after_fork)
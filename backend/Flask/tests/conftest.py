@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures: the backend modules are imported from backend/Flask, MongoDB is mongomock."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture(scope="session")
+def appmod(tmp_path_factory):
+    """app.py imported against mongomock, with its scratch directories in a temporary directory."""
+    mongomock = pytest.importorskip("mongomock")
+    import pymongo
+
+    class MockClient(mongomock.MongoClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    os.environ["WORKSPACE_ROOT"] = str(tmp_path_factory.mktemp("job_workspaces"))
+    pymongo.MongoClient = MockClient
+    import app
+    return app
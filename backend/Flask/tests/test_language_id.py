@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import language_id
+
+
+def test_api_jobs_skip_the_prepass(monkeypatch):
+    monkeypatch.setattr(language_id, "identify", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
+    report = language_id.plan("audio.wav", 600, "base", api=True)
+    assert report == {"applied": False, "source": "api", "language": None, "model": "base"}
+    assert not language_id.will_detect(api=True)
+
+
+def test_hint_wins_over_api():
+    report = language_id.plan("audio.wav", 600, "base", hint="ne", api=True)
+    assert report["source"] == "hint" and report["language"] == "ne"
+    assert not language_id.will_detect(hint="ne")
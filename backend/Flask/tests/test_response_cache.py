@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import response_cache
+
+
+def test_write_during_query_is_not_cached_under_new_version():
+    cache = response_cache.ResponseCache(response_cache.LocalBackend(), ttl=60)
+    key = cache.key("content", ["search", "title", "talk", 1])
+    stale = [{"title": "talk"}]  # Read before the write below
+    cache.invalidate("content")
+    cache.set(key, stale)
+    assert cache.get(cache.key("content", ["search", "title", "talk", 1])) is None
+
+
+def test_hit_within_version():
+    cache = response_cache.ResponseCache(response_cache.LocalBackend(), ttl=60)
+    cache.set(cache.key("content", ["a"]), [1])
+    assert cache.get(cache.key("content", ["a"])) == [1]
+    assert cache.stats()["hits"] == 1
+
+
+def test_search_does_not_cache_results_read_before_a_concurrent_write(appmod, monkeypatch):
+    collection = appmod.media_collection()
+    collection.delete_many({})
+    collection.insert_one({"job_id": "talk_1", "title": "Dharma Talk"})
+    for_search = appmod.database.for_search
+
+    class WriteDuringQuery:
+        """The query reads its results, then an ingest stores a new item before the response is cached."""
+
+        def __init__(self, wrapped):
+            self.wrapped = wrapped
+
+        def find(self, *args, **kwargs):
+            results = list(self.wrapped.find(*args, **kwargs))
+            collection.insert_one({"job_id": "talk_2", "title": "Dharma Talk 2"})
+            appmod.search_cache.invalidate(appmod.CONTENT_CACHE_NAMESPACE)
+            return _Cursor(results)
+
+    monkeypatch.setattr(appmod.database, "for_search", lambda c: WriteDuringQuery(for_search(c)))
+    client = appmod.app.test_client()
+    first = client.get("/api/search-content?field=title&query=dharma")
+    assert [item["job_id"] for item in first.get_json()] == ["talk_1"]
+
+    monkeypatch.setattr(appmod.database, "for_search", for_search)
+    second = client.get("/api/search-content?field=title&query=dharma")
+    assert sorted(item["job_id"] for item in second.get_json()) == ["talk_1", "talk_2"]
+
+
+class _Cursor(list):
+    def sort(self, *args):
+        return self
+
+    def skip(self, n):
+        return _Cursor(self[n:])
+
+    def limit(self, n):
+        return _Cursor(self[:n])
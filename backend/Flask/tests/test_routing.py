@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+import routing
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def spend(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTING_DAILY_BUDGET_USD", 1.0)
+    collection = mongomock.MongoClient().db.transcription_spend
+    return lambda: collection
+
+
+def test_concurrent_reservations_stay_within_the_budget(spend):
+    granted = []
+    start = threading.Barrier(8)
+
+    def job():
+        start.wait()
+        granted.append(routing.reserve_spend(spend, 0.3))
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(1 for reservation in granted if reservation) == 3
+    assert spend().find_one()["usd"] == pytest.approx(0.9)
+    assert routing.budget_left(spend) == pytest.approx(0.1)
+
+
+def test_settle_replaces_the_reservation_and_failure_refunds_it(spend):
+    billed = routing.reserve_spend(spend, 0.5)
+    failed = routing.reserve_spend(spend, 0.4)
+    routing.settle_spend(spend, billed, 60.0)
+    routing.settle_spend(spend, failed, 0.0)
+    record = spend().find_one()
+    assert record["usd"] == pytest.approx(routing.api_cost(60.0))
+    assert record["reserved_usd"] == pytest.approx(0.0)
+    assert record["jobs"] == 1
+
+
+def test_no_budget_reserves_nothing(spend, monkeypatch):
+    monkeypatch.setattr(routing, "ROUTING_DAILY_BUDGET_USD", 0.0)
+    assert routing.reserve_spend(spend, 5.0) == {"day": None, "usd": 0.0}
+
+
+def test_requested_local_values():
+    assert routing.requested_local("TRUE") is True
+    assert routing.requested_local("Auto") is None
+    assert routing.requested_local("yes") is False
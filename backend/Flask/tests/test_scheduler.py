@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pipeline
+import scheduler
+
+BULK = {"priority": "bulk", "submitter": "backfill"}
+INTERACTIVE = {"priority": "interactive", "submitter": "person"}
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_queue_serves_interactive_before_earlier_bulk():
+    fair = scheduler.FairQueue(maxsize=4)
+    for n in range(3):
+        fair.put(pipeline.PipelineJob(f"bulk-{n}", dict(BULK)))
+    fair.put(pipeline.PipelineJob("interactive", dict(INTERACTIVE)))
+    assert [fair.get().job_id for _ in range(4)] == ["interactive", "bulk-0", "bulk-1", "bulk-2"]
+
+
+def _waiter(slots, ctx, name, served):
+    def run():
+        with slots.slot(ctx):
+            served.append(name)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_slot_goes_to_interactive_waiter_before_queued_bulk(tmp_path):
+    slots = scheduler.BackendSlots("openai", 1, lock_dir=str(tmp_path))
+    served = []
+    holding = slots.slot(BULK)
+    holding.__enter__()
+    bulk = _waiter(slots, BULK, "bulk", served)
+    wait_until(lambda: slots.stats()["waiting"]["bulk"] == 1)
+    interactive = _waiter(slots, INTERACTIVE, "interactive", served)
+    wait_until(lambda: slots.stats()["waiting"]["interactive"] == 1)
+    holding.__exit__(None, None, None)
+    bulk.join(5)
+    interactive.join(5)
+    assert served == ["interactive", "bulk"]
+
+
+def test_host_slot_goes_to_interactive_waiter_in_another_process(tmp_path):
+    # Three BackendSlots on one lock directory stand in for three processes on one host
+    web, backfill, other = (scheduler.BackendSlots("openai", 1, lock_dir=str(tmp_path)) for _ in range(3))
+    served = []
+    holding = other.slot(BULK)
+    holding.__enter__()
+    assert other.stats()["host_in_use"] == 1 and web.stats()["host_in_use"] == 1
+    bulk = _waiter(backfill, BULK, "bulk", served)
+    wait_until(lambda: backfill.stats()["waiting"]["bulk"] == 1)
+    interactive = _waiter(web, INTERACTIVE, "interactive", served)
+    wait_until(lambda: web.stats()["waiting"]["interactive"] == 1)
+    holding.__exit__(None, None, None)
+    bulk.join(5)
+    interactive.join(5)
+    assert served == ["interactive", "bulk"]
+
+
+def test_worker_runs_interactive_jobs_while_a_bulk_job_waits_for_room(monkeypatch):
+    monkeypatch.setattr(pipeline, "FORWARD_POLL_SEC", 0.01)
+    release = threading.Event()
+    order = []
+
+    def downstream(ctx):
+        order.append(ctx["name"])
+        if ctx["name"] == "bulk-0":
+            release.wait(5)
+
+    prepare = pipeline.Stage("prepare", lambda ctx: None, workers=1, queue_size=4)
+    runner = pipeline.StagePipeline([prepare, pipeline.Stage("transcribe", downstream, workers=1, queue_size=1)])
+    try:
+        # bulk-0 runs downstream, bulk-1 fills its bulk queue, bulk-2 waits in the prepare worker
+        jobs = [runner.submit(dict(BULK, name=f"bulk-{n}")) for n in range(3)]
+        wait_until(lambda: prepare.stats()["completed"] == 3)
+        jobs.append(runner.submit(dict(INTERACTIVE, name="interactive")))
+        wait_until(lambda: prepare.stats()["completed"] == 4)
+        release.set()
+        for job in jobs:
+            assert job.done.wait(5)
+    finally:
+        release.set()
+        runner.shutdown()
+    assert order == ["bulk-0", "interactive", "bulk-1", "bulk-2"]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import pytest
+import requests
+
+import transcription_client
+from transcription_client import TranscriptionClient, TranscriptionError
+
+
+def _response(status, body=b'{"text": "ok"}', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """A client whose POSTs are answered, in order, by stub.outcomes (responses or exceptions)."""
+    sleeps = []
+    monkeypatch.setattr(transcription_client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(transcription_client, "backoff_delay", lambda attempt: 0.5 * 2 ** attempt)
+    audio = tmp_path / "talk.mp3"
+    audio.write_bytes(b"\0" * 16)
+    stub = TranscriptionClient("sk-test", base_url="http://stub", max_retries=3)
+    stub.outcomes, stub.posts, stub.sleeps, stub.audio = [], [], sleeps, str(audio)
+
+    def post(url, data=None, files=None, timeout=None):
+        stub.posts.append(url)
+        outcome = stub.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(stub.session, "post", post)
+    return stub
+
+
+def test_429_is_retried_after_retry_after(client):
+    client.outcomes = [_response(429, b"slow down", {"Retry-After": "7"}), _response(200)]
+    assert client.transcribe(client.audio) == {"text": "ok"}
+    assert len(client.posts) == 2
+    assert client.sleeps == [7.0]
+    assert client.stats["rate_limited"] == 1 and client.stats["retries"] == 1
+
+
+def test_5xx_backs_off_exponentially_until_retries_run_out(client):
+    client.outcomes = [_response(503, b"busy")] * 4
+    with pytest.raises(TranscriptionError) as error:
+        client.transcribe(client.audio)
+    assert error.value.status_code == 503
+    assert len(client.posts) == 4
+    assert client.sleeps == [0.5, 1.0, 2.0]
+
+
+def test_connect_error_is_retried(client):
+    client.outcomes = [requests.exceptions.ConnectTimeout("connect timed out"), _response(200)]
+    assert client.transcribe(client.audio) == {"text": "ok"}
+    assert len(client.posts) == 2
+
+
+def test_read_timeout_is_not_retried(client):
+    client.outcomes = [requests.exceptions.ReadTimeout("read timed out"), _response(200)]
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.transcribe(client.audio)
+    assert len(client.posts) == 1
+    assert client.sleeps == []
+    assert client.stats["failures"] == 1
+
+
+def test_client_error_is_not_retried(client):
+    client.outcomes = [_response(400, b"bad audio")]
+    with pytest.raises(TranscriptionError):
+        client.transcribe(client.audio)
+    assert len(client.posts) == 1
+
+
+def test_async_client_retries_429_but_not_read_timeout(monkeypatch, tmp_path):
+    httpx = pytest.importorskip("httpx")
+    import asyncio
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(transcription_client.asyncio, "sleep", no_sleep)
+    audio = tmp_path / "talk.mp3"
+    audio.write_bytes(b"\0" * 16)
+    outcomes = [httpx.Response(429, headers={"Retry-After": "1"}), httpx.Response(200, json={"text": "ok"}),
+                "timeout", httpx.Response(200, json={"text": "late"})]
+    posts = []
+
+    def handler(request):
+        posts.append(request.url)
+        outcome = outcomes.pop(0)
+        if outcome == "timeout":
+            raise httpx.ReadTimeout("read timed out", request=request)
+        return outcome
+
+    async def run():
+        client = transcription_client.AsyncTranscriptionClient("sk-test", base_url="http://stub", max_retries=3)
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await client.transcribe(str(audio)) == {"text": "ok"}
+        with pytest.raises(httpx.ReadTimeout):
+            await client.transcribe(str(audio))
+        await client.aclose()
+
+    asyncio.run(run())
+    assert len(posts) == 3
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, range-addressable storage for transcript timings.
+
+Segments (and, for the original language, their words) are split into
+fixed-length time chunks stored in the `transcript_chunks` collection, one
+document per (job_id, lang, chunk). Times are integer milliseconds,
+delta-encoded within a chunk, with durations stored instead of end times:
+
+    {"job_id", "lang", "chunk", "t0_ms", "t1_ms", "seg0", "seg1",
+     "seg_start": [deltas], "seg_dur": [...], "seg_text": [...], "seg_words": [word counts],
+     "word_start": [deltas], "word_dur": [...], "word_text": [...]}
+
+A time-range lookup only reads the chunks overlapping the window, never the
+whole transcript; seg0/seg1 (the chunk's first and past-the-end segment
+index) do the same for segment-number ranges.
+"""
+import os
+import re
+
+CHUNK_MS = int(float(os.getenv("TRANSCRIPT_CHUNK_SEC", "300")) * 1000)
+ENCODING_VERSION = 1
+
+_VTT_CUE_RE = re.compile(r"^((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})")
+
+
+def to_ms(seconds):
+    return int(round(float(seconds) * 1000))
+
+
+def delta_encode(values, origin=0):
+    """[1000, 1500, 1600] -> [1000, 500, 100] (relative to origin)."""
+    deltas = []
+    previous = origin
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def delta_decode(deltas, origin=0):
+    values = []
+    current = origin
+    for delta in deltas:
+        current += delta
+        values.append(current)
+    return values
+
+
+def attach_words(segments, words):
+    """
+    Distributes a flat word list (the API's top-level `words`) onto the segments
+    that contain each word's start, as segment["words"] (the local Whisper layout).
+    """
+    if not segments or not words:
+        return segments
+    for segment in segments:
+        segment["words"] = []
+    index = 0
+    for word in sorted(words, key=lambda w: w.get("start", 0.0)):
+        start = word.get("start", 0.0)
+        # Advance to the last segment starting at or before this word
+        while index + 1 < len(segments) and segments[index + 1].get("start", 0.0) <= start:
+            index += 1
+        segments[index]["words"].append(word)
+    return segments
+
+
+def pair_translations(segments, translated_texts):
+    """
+    Pairs each non-empty source segment with the next translated text, keeping the
+    source timings. Returns a list of {"start", "end", "text"}; text is None where a
+    translation is missing.
+    """
+    paired = []
+    translation_idx = 0
+    for segment in segments:
+        if segment.get("start") is None or segment.get("end") is None:
+            continue
+        text = ""
+        if segment.get("text", "").strip():
+            text = translated_texts[translation_idx] if translation_idx < len(translated_texts) else None
+            translation_idx += 1
+        paired.append({"start": segment["start"], "end": segment["end"], "text": text})
+    return paired
+
+
+def build_chunk_documents(job_id, lang, segments, chunk_ms=CHUNK_MS):
+    """Encodes segments (with optional words) into chunk documents for transcript_chunks."""
+    chunks = {}
+    for segment in segments:
+        if segment.get("start") is None or segment.get("end") is None:
+            continue
+        start_ms = to_ms(segment["start"])
+        chunks.setdefault(start_ms // chunk_ms, []).append((start_ms, segment))
+
+    documents = []
+    segment_count = 0
+    for chunk_index in sorted(chunks):
+        entries = sorted(chunks[chunk_index], key=lambda entry: entry[0])
+        t0_ms = chunk_index * chunk_ms
+        seg_starts, seg_durs, seg_texts, seg_words = [], [], [], []
+        word_starts, word_durs, word_texts = [], [], []
+        for start_ms, segment in entries:
+            end_ms = max(start_ms, to_ms(segment["end"]))
+            seg_starts.append(start_ms)
+            seg_durs.append(end_ms - start_ms)
+            seg_texts.append((segment.get("text") or "").strip())
+            words = [w for w in segment.get("words") or [] if w.get("start") is not None and w.get("end") is not None]
+            seg_words.append(len(words))
+            for word in words:
+                word_start = to_ms(word["start"])
+                word_starts.append(word_start)
+                word_durs.append(max(0, to_ms(word["end"]) - word_start))
+                word_texts.append((word.get("word") or "").strip())
+        documents.append({
+            "job_id": job_id,
+            "lang": lang,
+            "chunk": chunk_index,
+            "v": ENCODING_VERSION,
+            "t0_ms": t0_ms,
+            "t1_ms": max(start + dur for start, dur in zip(seg_starts, seg_durs)),
+            "seg0": segment_count,
+            "seg1": segment_count + len(seg_starts),
+            "seg_start": delta_encode(seg_starts, t0_ms),
+            "seg_dur": seg_durs,
+            "seg_text": seg_texts,
+            "seg_words": seg_words,
+            "word_start": delta_encode(word_starts, t0_ms),
+            "word_dur": word_durs,
+            "word_text": word_texts,
+        })
+        segment_count += len(seg_starts)
+    return documents
+
+
+def decode_chunk(document):
+    """Chunk document -> list of {"index", "start_ms", "end_ms", "text", "words": [{"start_ms", "end_ms", "word"}]}."""
+    t0_ms = document["t0_ms"]
+    first_index = document.get("seg0", 0)
+    word_starts = delta_decode(document.get("word_start", []), t0_ms)
+    word_durs = document.get("word_dur", [])
+    word_texts = document.get("word_text", [])
+    segments = []
+    word_index = 0
+    seg_starts = delta_decode(document["seg_start"], t0_ms)
+    for i, start_ms in enumerate(seg_starts):
+        count = document["seg_words"][i] if i < len(document.get("seg_words", [])) else 0
+        words = [
+            {"start_ms": word_starts[j], "end_ms": word_starts[j] + word_durs[j], "word": word_texts[j]}
+            for j in range(word_index, word_index + count)
+        ]
+        word_index += count
+        segments.append({
+            "index": first_index + i,
+            "start_ms": start_ms,
+            "end_ms": start_ms + document["seg_dur"][i],
+            "text": document["seg_text"][i],
+            "words": words,
+        })
+    return segments
+
+
+def range_filter(job_id, lang, t0_ms=None, t1_ms=None, first_segment=None, last_segment=None):
+    """
+    Mongo filter selecting the chunks of one transcript that overlap the time window
+    [t0_ms, t1_ms) and/or the segment-number range [first_segment, last_segment).
+    """
+    query = {"job_id": job_id, "lang": lang}
+    if t1_ms is not None:
+        query["t0_ms"] = {"$lt": t1_ms}
+    if t0_ms is not None:
+        query["t1_ms"] = {"$gt": t0_ms}
+    if last_segment is not None:
+        query["seg0"] = {"$lt": last_segment}
+    if first_segment is not None:
+        query["seg1"] = {"$gt": first_segment}
+    return query
+
+
+def filter_segments(segments, t0_ms=None, t1_ms=None, first_segment=None, last_segment=None):
+    """Keeps the decoded segments (and words) overlapping the window and inside the index range."""
+    selected = []
+    for segment in segments:
+        if first_segment is not None and segment["index"] < first_segment:
+            continue
+        if last_segment is not None and segment["index"] >= last_segment:
+            continue
+        if t1_ms is not None and segment["start_ms"] >= t1_ms:
+            continue
+        if t0_ms is not None and segment["end_ms"] <= t0_ms:
+            continue
+        if t0_ms is not None or t1_ms is not None:
+            segment["words"] = [
+                w for w in segment.get("words", [])
+                if (t1_ms is None or w["start_ms"] < t1_ms) and (t0_ms is None or w["end_ms"] > t0_ms)
+            ]
+        selected.append(segment)
+    return selected
+
+
+def slice_segments(chunk_documents, t0_ms=None, t1_ms=None, first_segment=None, last_segment=None):
+    """Decodes chunks (in any order) and keeps what overlaps the window / index range."""
+    segments = []
+    for document in sorted(chunk_documents, key=lambda d: d["chunk"]):
+        segments.extend(decode_chunk(document))
+    return filter_segments(segments, t0_ms, t1_ms, first_segment, last_segment)
+
+
+def parse_vtt(vtt_content):
+    """
+    Parses a VTT string (as stored in transcript_content) into decoded-segment form, for
+    transcripts archived before the chunk index existed. Words are not available.
+    """
+    segments = []
+    lines = (vtt_content or "").splitlines()
+    i = 0
+    while i < len(lines):
+        match = _VTT_CUE_RE.match(lines[i].strip())
+        i += 1
+        if not match:
+            continue
+        text_lines = []
+        while i < len(lines) and lines[i].strip():
+            text_lines.append(lines[i].strip())
+            i += 1
+        segments.append({
+            "index": len(segments),
+            "start_ms": _timestamp_to_ms(match.group(1)),
+            "end_ms": _timestamp_to_ms(match.group(2)),
+            "text": " ".join(text_lines),
+            "words": [],
+        })
+    return segments
+
+
+def _timestamp_to_ms(timestamp):
+    parts = timestamp.replace(",", ".").split(":")
+    seconds = float(parts[-1])
+    minutes = int(parts[-2]) if len(parts) >= 2 else 0
+    hours = int(parts[-3]) if len(parts) >= 3 else 0
+    return int(round((hours * 3600 + minutes * 60 + seconds) * 1000))
+
+
+def _format_ms(ms, decimal_marker):
+    hours, rest = divmod(int(ms), 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{millis:03d}"
+
+
+def render_vtt(segments):
+    """Decoded segments -> WebVTT."""
+    lines = ["WEBVTT", ""]
+    for segment in segments:
+        lines.extend([f"{_format_ms(segment['start_ms'], '.')} --> {_format_ms(segment['end_ms'], '.')}",
+                      segment["text"], ""])
+    return "\n".join(lines)
+
+
+def render_srt(segments):
+    """Decoded segments -> SubRip (cues numbered from 1 within the response)."""
+    lines = []
+    for number, segment in enumerate(segments, 1):
+        lines.extend([str(number),
+                      f"{_format_ms(segment['start_ms'], ',')} --> {_format_ms(segment['end_ms'], ',')}",
+                      segment["text"], ""])
+    return "\n".join(lines)
+
+
+# --- pymongo helpers (the async service uses build_chunk_documents with motor) ---
+def ensure_indexes(chunks_collection):
+    chunks_collection.create_index([("job_id", 1), ("lang", 1), ("chunk", 1)], unique=True)
+
+
+def save_transcript(chunks_collection, job_id, segments_by_lang):
+    """Replaces every stored chunk of job_id. Returns {"chunks": n, "words": n}."""
+    documents = []
+    for lang, segments in segments_by_lang.items():
+        documents.extend(build_chunk_documents(job_id, lang, segments or []))
+    chunks_collection.delete_many({"job_id": job_id})
+    if documents:
+        chunks_collection.insert_many(documents)
+    return {"chunks": len(documents), "words": sum(len(d["word_text"]) for d in documents)}
+
+
+def load_range(chunks_collection, job_id, lang, t0_ms=None, t1_ms=None, first_segment=None, last_segment=None):
+    """Segments (with words) of one transcript overlapping the window; [] if nothing is stored."""
+    query = range_filter(job_id, lang, t0_ms, t1_ms, first_segment, last_segment)
+    documents = chunks_collection.find(query, {"_id": 0})
+    return slice_segments(list(documents), t0_ms, t1_ms, first_segment, last_segment)
+
+
+def replace_languages(chunks_collection, job_id, segments_by_lang):
+    """Re-indexes only the given languages of job_id (e.g. after a manual transcript edit)."""
+    for lang, segments in segments_by_lang.items():
+        chunks_collection.delete_many({"job_id": job_id, "lang": lang})
+        documents = build_chunk_documents(job_id, lang, segments)
+        if documents:
+            chunks_collection.insert_many(documents)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Shared HTTP client for the OpenAI audio transcription endpoint.
+
+One pooled requests.Session per process (keep-alive, connection reuse),
+bounded concurrency per API key, configurable connect/read timeouts and
+retries with exponential backoff + jitter that honour Retry-After on
+429 and 5xx responses.
+
+Only failures where the API cannot have transcribed (billed) the upload are
+retried: connection errors, 429 and 5xx. A read timeout means the upload
+was most likely received and is being transcribed, so it fails the call
+rather than paying for the same audio again.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# --- Defaults (overridable through environment variables) ---
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "600"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1.0"))   # Seconds for the first retry
+BACKOFF_CAP = float(os.getenv("OPENAI_BACKOFF_CAP", "60"))      # Never sleep longer than this
+MAX_CONCURRENCY_PER_KEY = int(os.getenv("OPENAI_MAX_CONCURRENCY_PER_KEY", "4"))
+POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "8"))
+RATE_LIMIT_STALE_SEC = 60  # x-ratelimit-* headers older than this say nothing about now
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# File types /audio/transcriptions accepts without conversion
+API_AUDIO_EXTENSIONS = {".flac", ".m4a", ".mp3", ".mp4", ".mpeg", ".mpga", ".oga", ".ogg", ".wav", ".webm"}
+API_MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # Hard limit of the transcription endpoint
+
+
+class TranscriptionError(Exception):
+    """Raised when a transcription request fails for good (non-retryable or retries exhausted)."""
+
+    def __init__(self, message, status_code=None, body=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header as seconds (it may be a number or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def rate_limit_headroom(headers, seen_at, limited_until, now=None):
+    """
+    Fraction of the request rate limit left (0.0-1.0) according to the last response's
+    x-ratelimit-* headers; 0.0 while backing off after a 429, None when nothing recent is known.
+    """
+    now = time.time() if now is None else now
+    if limited_until > now:
+        return 0.0
+    if not headers or now - seen_at > RATE_LIMIT_STALE_SEC:
+        return None
+    try:
+        return max(0.0, min(1.0, float(headers["x-ratelimit-remaining-requests"])
+                            / float(headers["x-ratelimit-limit-requests"])))
+    except (KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class TranscriptionClient:
+    """Thread-safe transcription client; share one instance per process."""
+
+    # Concurrency limits are per API key and shared by every client in the process
+    _key_semaphores = {}
+    _key_semaphores_lock = threading.Lock()
+
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 max_concurrency=MAX_CONCURRENCY_PER_KEY, pool_size=POOL_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "server_errors": 0, "failures": 0}
+        self.last_rate_limit = {}  # Most recent x-ratelimit-* headers seen from the API
+        self.last_rate_limit_at = 0.0
+        self.rate_limited_until = 0.0  # End of the current backoff after a 429
+
+    def _semaphore(self):
+        with self._key_semaphores_lock:
+            semaphore = self._key_semaphores.get(self.api_key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrency)
+                self._key_semaphores[self.api_key] = semaphore
+            return semaphore
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def headroom(self):
+        """See rate_limit_headroom(); used by routing.py to steer jobs away from a saturated API."""
+        return rate_limit_headroom(self.last_rate_limit, self.last_rate_limit_at, self.rate_limited_until)
+
+    def transcribe(self, audio_path, model="whisper-1", language=None,
+                   response_format="verbose_json", timestamp_granularities=("segment",)):
+        """
+        Uploads audio_path to /audio/transcriptions and returns the parsed JSON response.
+        Raises TranscriptionError on a non-retryable status or once retries are exhausted,
+        requests.exceptions.ConnectionError if the API stays unreachable, and
+        requests.exceptions.ReadTimeout at once (the audio may already be billed).
+        """
+        data = {"model": model, "response_format": response_format}
+        if timestamp_granularities:
+            data["timestamp_granularities[]"] = list(timestamp_granularities)
+        if language:
+            data["language"] = language
+        url = f"{self.base_url}/audio/transcriptions"
+
+        attempt = 0
+        while True:
+            retry_after = None
+            with self._semaphore():
+                self._count("requests")
+                try:
+                    # Re-open the file each attempt so a retry uploads from the start
+                    with open(audio_path, "rb") as audio_file:
+                        files = {"file": (os.path.basename(audio_path), audio_file)}
+                        response = self.session.post(url, data=data, files=files, timeout=self.timeout)
+                except requests.exceptions.ReadTimeout:
+                    self._count("failures")
+                    raise
+                except requests.exceptions.ConnectionError as e:  # ConnectTimeout included
+                    if attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+                    logger.info("Transcription request network error (%s); retrying.", e)
+                    response = None
+
+            if response is not None:
+                self.last_rate_limit = {k.lower(): v for k, v in response.headers.items()
+                                        if k.lower().startswith("x-ratelimit-")}
+                self.last_rate_limit_at = time.time()
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise TranscriptionError(
+                        f"OpenAI API Error: {response.status_code} - {response.text}",
+                        status_code=response.status_code, body=response.text
+                    )
+                self._count("rate_limited" if response.status_code == 429 else "server_errors")
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            delay = backoff_delay(attempt)
+            if retry_after is not None:
+                delay = min(BACKOFF_CAP, max(delay, retry_after))
+            if response is not None and response.status_code == 429:
+                self.rate_limited_until = time.time() + delay
+            attempt += 1
+            self._count("retries")
+            logger.info("Transcription request retry %d/%d in %.1fs%s", attempt, self.max_retries, delay,
+                        f" (HTTP {response.status_code})" if response is not None else "")
+            time.sleep(delay)
+
+
+# --- Process-wide shared clients (re-created after fork, one per API key) ---
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_transcription_client(api_key):
+    """Returns the shared client for api_key, creating it on first use in this process."""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Pooled sockets must not be shared across a fork
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(api_key)
+        if client is None:
+            client = TranscriptionClient(api_key)
+            _clients[api_key] = client
+        return client
+
+
+class AsyncTranscriptionClient:
+    """
+    asyncio counterpart of TranscriptionClient (same retry policy) built on httpx.
+    Create one per event loop; concurrency is bounded with an asyncio.Semaphore.
+    """
+
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 max_concurrency=MAX_CONCURRENCY_PER_KEY, pool_size=POOL_SIZE):
+        import httpx  # Only the async ingest service needs httpx
+
+        self._httpx = httpx
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "server_errors": 0, "failures": 0}
+        self.last_rate_limit = {}
+        self.last_rate_limit_at = 0.0
+        self.rate_limited_until = 0.0
+
+    def headroom(self):
+        return rate_limit_headroom(self.last_rate_limit, self.last_rate_limit_at, self.rate_limited_until)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def transcribe(self, audio_path, model="whisper-1", language=None,
+                         response_format="verbose_json", timestamp_granularities=("segment",)):
+        """Async version of TranscriptionClient.transcribe."""
+        data = {"model": model, "response_format": response_format}
+        if timestamp_granularities:
+            data["timestamp_granularities[]"] = list(timestamp_granularities)
+        if language:
+            data["language"] = language
+        url = f"{self.base_url}/audio/transcriptions"
+
+        # Read the upload once; it is at most 25 MB and is reused across retries
+        loop = asyncio.get_running_loop()
+        audio_bytes = await loop.run_in_executor(None, _read_file, audio_path)
+
+        attempt = 0
+        while True:
+            retry_after = None
+            response = None
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                try:
+                    files = {"file": (os.path.basename(audio_path), audio_bytes)}
+                    response = await self.client.post(url, data=data, files=files)
+                except (self._httpx.ConnectError, self._httpx.ConnectTimeout, self._httpx.PoolTimeout) as e:
+                    # Nothing was sent; read timeouts and other transport errors fail the call
+                    if attempt >= self.max_retries:
+                        self.stats["failures"] += 1
+                        raise
+                    logger.info("Transcription request network error (%s); retrying.", e)
+
+            if response is not None:
+                self.last_rate_limit = {k.lower(): v for k, v in response.headers.items()
+                                        if k.lower().startswith("x-ratelimit-")}
+                self.last_rate_limit_at = time.time()
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise TranscriptionError(
+                        f"OpenAI API Error: {response.status_code} - {response.text}",
+                        status_code=response.status_code, body=response.text
+                    )
+                self.stats["rate_limited" if response.status_code == 429 else "server_errors"] += 1
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            delay = backoff_delay(attempt)
+            if retry_after is not None:
+                delay = min(BACKOFF_CAP, max(delay, retry_after))
+            if response is not None and response.status_code == 429:
+                self.rate_limited_until = time.time() + delay
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
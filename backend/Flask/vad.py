@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Energy-based voice activity detection (VAD) pre-pass.
+
+Runs ffmpeg's `silencedetect` filter over an audio file, turns the detected
+silences into a list of speech regions, cuts the audio down to just those
+regions and maps transcript timestamps from the cut audio back onto the
+original timeline.
+"""
+import os
+import re
+import subprocess
+from bisect import bisect_left, bisect_right
+
+# --- Defaults (overridable through environment variables) ---
+VAD_NOISE_DB = float(os.getenv("VAD_NOISE_DB", "-35"))            # Anything quieter counts as silence
+VAD_MIN_SILENCE_SEC = float(os.getenv("VAD_MIN_SILENCE_SEC", "1.0"))  # Shortest silence worth cutting
+VAD_PAD_SEC = float(os.getenv("VAD_PAD_SEC", "0.25"))             # Padding kept around each speech region
+VAD_MIN_SKIP_FRACTION = float(os.getenv("VAD_MIN_SKIP_FRACTION", "0.05"))  # Below this, keep the original audio
+VAD_AUDIO_BITRATE = os.getenv("VAD_AUDIO_BITRATE", "32k")  # Speech-only MP3, mono 16 kHz (what Whisper resamples to)
+
+_SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def detect_speech_regions(audio_path, noise_db=VAD_NOISE_DB, min_silence=VAD_MIN_SILENCE_SEC,
+                          pad=VAD_PAD_SEC, ffmpeg_bin="ffmpeg"):
+    """
+    Returns (speech_regions, total_duration) for an audio file.
+    speech_regions is a sorted list of non-overlapping (start_sec, end_sec) tuples.
+    """
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found for VAD: {audio_path}")
+
+    command = [
+        ffmpeg_bin, "-hide_banner", "-nostats", "-i", audio_path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-"
+    ]
+    try:
+        process = subprocess.run(command, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg silencedetect failed: {e.stderr}") from e
+
+    stderr = process.stderr
+    duration_match = _DURATION_RE.search(stderr)
+    if not duration_match:
+        raise RuntimeError(f"Could not determine duration of {audio_path} from ffmpeg output.")
+    hours, minutes, seconds = duration_match.groups()
+    total_duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    # Pair up silence_start / silence_end markers (a trailing silence may have no end marker)
+    silences = []
+    current_start = None
+    for line in stderr.splitlines():
+        start_match = _SILENCE_START_RE.search(line)
+        if start_match:
+            current_start = max(0.0, float(start_match.group(1)))
+            continue
+        end_match = _SILENCE_END_RE.search(line)
+        if end_match and current_start is not None:
+            silences.append((current_start, min(total_duration, float(end_match.group(1)))))
+            current_start = None
+    if current_start is not None:
+        silences.append((current_start, total_duration))
+
+    # Speech is the complement of silence, padded on both sides
+    regions = []
+    cursor = 0.0
+    for silence_start, silence_end in silences:
+        if silence_start > cursor:
+            regions.append((cursor, silence_start))
+        cursor = max(cursor, silence_end)
+    if cursor < total_duration:
+        regions.append((cursor, total_duration))
+
+    padded = []
+    for start, end in regions:
+        start = max(0.0, start - pad)
+        end = min(total_duration, end + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], max(padded[-1][1], end))
+        else:
+            padded.append((start, end))
+
+    return padded, total_duration
+
+
+def speech_duration(regions):
+    """Total number of seconds covered by the speech regions."""
+    return sum(end - start for start, end in regions)
+
+
+def cut_to_speech(audio_path, regions, output_path, ffmpeg_bin="ffmpeg"):
+    """
+    Writes a new audio file containing only the speech regions, back to back, as a
+    compact mono 16 kHz MP3: the selection has to be decoded anyway, and Whisper
+    downmixes and resamples to that itself.
+    """
+    if not regions:
+        raise ValueError("No speech regions to cut.")
+
+    select_expr = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in regions)
+    command = [
+        ffmpeg_bin, "-y", "-i", audio_path, "-vn",
+        "-af", f"aselect='{select_expr}',asetpts=N/SR/TB",
+        "-acodec", "mp3", "-ar", "16000", "-ac", "1", "-b:a", VAD_AUDIO_BITRATE,
+        "-loglevel", "error", output_path
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise RuntimeError(f"ffmpeg failed while cutting speech regions: {e.stderr}") from e
+    return output_path
+
+
+def _compact_offsets(regions):
+    """Start time of each region on the compacted (cut) timeline."""
+    offsets = []
+    position = 0.0
+    for start, end in regions:
+        offsets.append(position)
+        position += end - start
+    return offsets
+
+
+def map_to_original(t, regions, offsets=None, is_end=False):
+    """
+    Maps a timestamp on the compacted timeline back onto the original one.
+    End timestamps that fall exactly on a region boundary stay in the earlier region.
+    """
+    if not regions:
+        return t
+    if offsets is None:
+        offsets = _compact_offsets(regions)
+    if is_end:
+        idx = max(0, bisect_left(offsets, t) - 1)
+    else:
+        idx = max(0, bisect_right(offsets, t) - 1)
+    start, end = regions[idx]
+    return min(end, start + max(0.0, t - offsets[idx]))
+
+
+def remap_segments(segments, regions):
+    """Rewrites segment (and word) start/end times in place onto the original timeline."""
+    if not segments or not regions:
+        return segments
+    offsets = _compact_offsets(regions)
+    for segment in segments:
+        if isinstance(segment.get("start"), (int, float)):
+            segment["start"] = map_to_original(segment["start"], regions, offsets)
+        if isinstance(segment.get("end"), (int, float)):
+            segment["end"] = map_to_original(segment["end"], regions, offsets, is_end=True)
+        for word in segment.get("words") or []:
+            if isinstance(word.get("start"), (int, float)):
+                word["start"] = map_to_original(word["start"], regions, offsets)
+            if isinstance(word.get("end"), (int, float)):
+                word["end"] = map_to_original(word["end"], regions, offsets, is_end=True)
+    return segments
+
+
+def prepare_speech_audio(audio_path, output_dir, min_skip_fraction=VAD_MIN_SKIP_FRACTION, ffmpeg_bin="ffmpeg"):
+    """
+    Runs the full VAD pre-pass for one job.
+    Returns (audio_path_to_transcribe, speech_regions_or_None, report_dict).
+    When too little silence is found the original audio is returned untouched.
+    """
+    regions, total_duration = detect_speech_regions(audio_path, ffmpeg_bin=ffmpeg_bin)
+    speech_seconds = speech_duration(regions)
+    skipped_fraction = 1.0 - (speech_seconds / total_duration) if total_duration > 0 else 0.0
+    report = {
+        "total_duration_sec": round(total_duration, 3),
+        "speech_duration_sec": round(speech_seconds, 3),
+        "silence_fraction": round(max(0.0, skipped_fraction), 4),
+        "skipped_fraction": 0.0,
+        "speech_regions": len(regions),
+        "applied": False,
+    }
+
+    if not regions or skipped_fraction < min_skip_fraction:
+        # Either too little silence to be worth a re-encode, or nothing rose above the
+        # noise floor at all (most likely a bad threshold) - transcribe the original.
+        return audio_path, None, report
+
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    speech_path = os.path.join(output_dir, f"{base_name}_speech.mp3")
+    cut_to_speech(audio_path, regions, speech_path, ffmpeg_bin=ffmpeg_bin)
+    report["applied"] = True
+    report["skipped_fraction"] = report["silence_fraction"]
+    return speech_path, regions, report
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Per-job scratch directories with a host-wide disk quota and an orphan janitor.
+
+Every ingest job works in its own directory, WORKSPACE_ROOT/<job key>, so
+concurrent jobs never share a file name, and cleanup is one rmtree instead
+of a list of remembered paths.
+
+    ws = Workspace(job_key).open(reserve_bytes)   # locks the directory, waits for quota
+    ws.file("audio.m4a")
+    ws.cleanup()                                  # deletes the directory
+
+Locking: open() holds an exclusive flock on the directory's .lock file for
+the life of the job. The kernel drops it when the process dies, however it
+dies, so a directory nobody holds a lock on belongs to no running job. A
+second open() of the same key (a duplicate request) raises WorkspaceBusy.
+
+Quota: open() waits until the jobs on this host, each counted as the larger
+of its reservation and its actual size, fit in WORKSPACE_QUOTA_MB, and the
+disk keeps WORKSPACE_MIN_FREE_MB free. After WORKSPACE_QUOTA_WAIT_SEC it
+raises WorkspaceFull instead.
+
+Janitor: janitor() runs at server start (gunicorn when_ready) and then at
+most every WORKSPACE_JANITOR_INTERVAL_SEC from open(). It deletes unlocked
+directories, i.e. those left behind by a crashed or killed worker. A job
+that can still be resumed from its checkpoint (mark_resumable()) keeps its
+directory for WORKSPACE_ORPHAN_HOURS after its last use.
+"""
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "job_workspaces")
+WORKSPACE_QUOTA_MB = float(os.getenv("WORKSPACE_QUOTA_MB", "10240"))  # 0 = no quota
+WORKSPACE_MIN_FREE_MB = float(os.getenv("WORKSPACE_MIN_FREE_MB", "1024"))
+WORKSPACE_JOB_RESERVE_MB = float(os.getenv("WORKSPACE_JOB_RESERVE_MB", "300"))  # When the job's size is unknown
+WORKSPACE_QUOTA_WAIT_SEC = float(os.getenv("WORKSPACE_QUOTA_WAIT_SEC", "60"))
+# Kept as long as the job's checkpoint (checkpoints.py) by default
+WORKSPACE_ORPHAN_HOURS = float(os.getenv("WORKSPACE_ORPHAN_HOURS", os.getenv("CHECKPOINT_RETAIN_HOURS", "24")))
+WORKSPACE_JANITOR_INTERVAL_SEC = float(os.getenv("WORKSPACE_JANITOR_INTERVAL_SEC", "900"))
+
+LOCK_FILE = ".lock"
+RESERVE_FILE = ".reserve"
+RESUMABLE_FILE = ".resumable"
+
+_janitor_lock = threading.Lock()
+_last_janitor = 0.0
+
+
+class WorkspaceBusy(RuntimeError):
+    """The job's directory is locked by another running attempt."""
+
+
+class WorkspaceFull(RuntimeError):
+    """The disk quota did not free up within WORKSPACE_QUOTA_WAIT_SEC."""
+
+
+def directory_name(job_key):
+    """A filesystem-safe, collision-free directory name for any job key."""
+    readable = re.sub(r"[^A-Za-z0-9_.-]", "_", job_key)[:48]
+    return f"{readable}-{hashlib.sha1(job_key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _tree_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _read_number(path, default=0.0):
+    try:
+        with open(path) as f:
+            return float(f.read().strip() or default)
+    except (OSError, ValueError):
+        return default
+
+
+class Workspace:
+    """The scratch directory of one job (keyed like its checkpoint, so a retry finds its files)."""
+
+    def __init__(self, job_key):
+        self.job_key = job_key
+        self.name = directory_name(job_key)
+        self.path = os.path.join(WORKSPACE_ROOT, self.name)
+        self.reserved = 0
+        self._lock_fd = None
+
+    def open(self, reserve_bytes=None, timeout=WORKSPACE_QUOTA_WAIT_SEC):
+        janitor()
+        self._lock()
+        try:
+            self._admit(int(reserve_bytes or WORKSPACE_JOB_RESERVE_MB * 1024 * 1024), timeout)
+        except BaseException:
+            self.cleanup()
+            raise
+        return self
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def rename(self, job_key):
+        """
+        Moves the (locked) directory to job_key's name, for a job whose key is only known once
+        its upload is saved. False when a directory of that key exists already.
+        """
+        name = directory_name(job_key)
+        path = os.path.join(WORKSPACE_ROOT, name)
+        try:
+            os.rename(self.path, path)  # .lock keeps its inode, so the flock stays held
+        except OSError as e:
+            if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                return False
+            raise
+        self.job_key, self.name, self.path = job_key, name, path
+        return True
+
+    def mark_resumable(self):
+        """Keep the directory after a failure or crash, for a retry to resume from (see checkpoints.py)."""
+        with open(os.path.join(self.path, RESUMABLE_FILE), "w") as f:
+            f.write(self.job_key)
+
+    def size(self):
+        return _tree_size(self.path)
+
+    def release(self):
+        """Unlocks the directory, leaving its files (for a resumable job; the janitor reclaims them later)."""
+        if self._lock_fd is not None:
+            os.utime(os.path.join(self.path, LOCK_FILE))
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def cleanup(self):
+        """Deletes the job's directory (the lock is held until it is gone)."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        lock_path = os.path.join(self.path, LOCK_FILE)
+        for _ in range(5):
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                os.close(fd)
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    raise WorkspaceBusy(f"Job {self.job_key} is already running on this host.")
+                raise
+            try:
+                # The janitor may have deleted the directory between our open() and flock()
+                if os.stat(lock_path).st_ino == os.fstat(fd).st_ino:
+                    self._lock_fd = fd
+                    os.utime(lock_path)
+                    return
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+            os.makedirs(self.path, exist_ok=True)
+        raise WorkspaceBusy(f"Could not lock the workspace of job {self.job_key}.")
+
+    def _admit(self, reserve_bytes, timeout):
+        quota = WORKSPACE_QUOTA_MB * 1024 * 1024
+        min_free = WORKSPACE_MIN_FREE_MB * 1024 * 1024
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            # One admission at a time on this host, so two workers cannot both take the last slot
+            with _root_lock():
+                used = usage(exclude=self.name)
+                free = shutil.disk_usage(WORKSPACE_ROOT).free
+                if (not quota or used + reserve_bytes <= quota) and free - reserve_bytes >= min_free:
+                    with open(os.path.join(self.path, RESERVE_FILE), "w") as f:
+                        f.write(str(reserve_bytes))
+                    self.reserved = reserve_bytes
+                    metrics.WORKSPACE_BYTES.set(used + reserve_bytes)
+                    metrics.WORKSPACE_ADMISSIONS.inc(outcome="waited" if waited else "admitted")
+                    return
+            if time.monotonic() >= deadline:
+                metrics.WORKSPACE_ADMISSIONS.inc(outcome="rejected")
+                raise WorkspaceFull(f"Scratch space is full ({used / 1e6:.0f} MB in use, {free / 1e6:.0f} MB free "
+                                    f"on disk); job {self.job_key} needs {reserve_bytes / 1e6:.0f} MB.")
+            if not waited:
+                logger.info("job %s waiting for scratch space (%.0f MB in use)", self.job_key, used / 1e6)
+                waited = True
+            time.sleep(1.0)
+
+
+class _root_lock:
+    """Host-wide lock (flock on WORKSPACE_ROOT/.admission) around quota decisions."""
+
+    def __enter__(self):
+        os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+        self._fd = os.open(os.path.join(WORKSPACE_ROOT, ".admission"), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self._fd)
+
+
+def usage(exclude=None):
+    """Bytes taken by all job workspaces on this host: each counts as max(reservation, actual size)."""
+    total = 0
+    if not os.path.isdir(WORKSPACE_ROOT):
+        return 0
+    for entry in os.scandir(WORKSPACE_ROOT):
+        if not entry.is_dir() or entry.name == exclude:
+            continue
+        total += max(_tree_size(entry.path), int(_read_number(os.path.join(entry.path, RESERVE_FILE))))
+    metrics.WORKSPACE_BYTES.set(total)
+    return total
+
+
+def janitor(force=False):
+    """Deletes workspaces no live job holds (see the module docstring); returns how many."""
+    global _last_janitor
+    with _janitor_lock:
+        if not force and time.monotonic() - _last_janitor < WORKSPACE_JANITOR_INTERVAL_SEC:
+            return 0
+        _last_janitor = time.monotonic()
+    removed = 0
+    now = time.time()
+    if os.path.isdir(WORKSPACE_ROOT):
+        for entry in os.scandir(WORKSPACE_ROOT):
+            if entry.is_dir() and _reclaim(entry.path, now):
+                removed += 1
+    if removed:
+        logger.info("janitor removed %d orphaned job workspaces", removed)
+    return removed
+
+
+def _reclaim(path, now):
+    lock_path = os.path.join(path, LOCK_FILE)
+    try:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        return False
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False  # A running job holds it
+        if os.path.exists(os.path.join(path, RESUMABLE_FILE)):
+            last_used = os.stat(lock_path).st_mtime
+            if now - last_used < WORKSPACE_ORPHAN_HOURS * 3600:
+                return False
+        elif now - os.stat(lock_path).st_mtime < 60:
+            return False  # Just created; its owner is about to lock it
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+    finally:
+        os.close(fd)
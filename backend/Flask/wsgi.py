@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI entry points for gunicorn, one per server role (see gunicorn.conf.py).
+
+    wsgi:app         every route; long-running ingests limited to INGEST_SLOTS per worker
+    wsgi:read_app    search, transcripts, edits; ingest routes answer 421
+    wsgi:ingest_app  ingest submission and job/playlist status; other routes answer 421
+
+In the split deployment the reverse proxy sends INGEST_ROUTE paths to the
+ingest pool and everything else to the read pool. The job and playlist
+status routes go to the ingest pool as well: the pipeline keeps its jobs in
+the memory of the worker that runs them, which is why that pool (like
+wsgi:app) runs a single worker. /metrics and /api/services are answered by
+both pools (each reports its own process).
+
+In the single-pool deployment (wsgi:app), a worker runs at most INGEST_SLOTS
+synchronous ingests at a time, so its remaining threads always serve reads;
+an ingest beyond that gets 503 with Retry-After instead of a thread.
+
+Importing this module imports app.py, which connects to nothing (see
+services.py), so it is safe to load in the gunicorn master (preload_app).
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+from app import app as flask_app
+
+logger = logging.getLogger(__name__)
+
+# Routes served by the ingest pool in the split deployment
+INGEST_ROUTE = re.compile(r"^/api/(generate-transcription|jobs|playlists|pipeline)(/|$)")
+# Routes both pools answer
+SHARED_ROUTE = re.compile(r"^/(metrics|api/services)$")
+# Requests that hold a thread for the whole ingest (minutes); /api/jobs only queues
+LONG_RUNNING = {("POST", "/api/generate-transcription")}
+
+INGEST_SLOTS = int(os.getenv("INGEST_SLOTS", "2"))  # Concurrent synchronous ingests per worker (wsgi:app)
+INGEST_RETRY_AFTER_SEC = int(os.getenv("INGEST_RETRY_AFTER_SEC", "30"))
+
+
+def _json_response(start_response, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    start_response(status, [("Content-Type", "application/json"),
+                            ("Content-Length", str(len(body))), *headers])
+    return [body]
+
+
+class RoleApp:
+    """Serves the Flask app for one role: "all", "read" or "ingest"."""
+
+    def __init__(self, wsgi_app, role, ingest_slots=INGEST_SLOTS):
+        if role not in ("all", "read", "ingest"):
+            raise ValueError(f"Unknown server role '{role}'; use all, read or ingest")
+        self.wsgi_app = wsgi_app
+        self.role = role
+        self.ingest_slots = ingest_slots
+        self._slots = threading.BoundedSemaphore(max(1, ingest_slots))
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if self.role != "all" and not SHARED_ROUTE.match(path):
+            is_ingest = bool(INGEST_ROUTE.match(path))
+            if is_ingest != (self.role == "ingest"):
+                return _json_response(start_response, "421 Misdirected Request", {
+                    "status": "error",
+                    "message": f"{path} is served by the {'ingest' if is_ingest else 'read'} pool, "
+                               f"not the {self.role} pool"})
+            return self.wsgi_app(environ, start_response)
+
+        if self.role == "all" and (environ.get("REQUEST_METHOD"), path) in LONG_RUNNING:
+            if not self._slots.acquire(blocking=False):
+                logger.warning("All %d ingest slots of this worker are busy; rejecting %s", self.ingest_slots, path)
+                return _json_response(start_response, "503 Service Unavailable", {
+                    "status": "error",
+                    "message": "Too many transcriptions in progress; try again later or use /api/jobs."},
+                    headers=[("Retry-After", str(INGEST_RETRY_AFTER_SEC))])
+            try:
+                # Flask's ingest responses are buffered JSON, so the work is done when this returns
+                return self.wsgi_app(environ, start_response)
+            finally:
+                self._slots.release()
+        return self.wsgi_app(environ, start_response)
+
+
+app = RoleApp(flask_app, "all")
+read_app = RoleApp(flask_app, "read")
+ingest_app = RoleApp(flask_app, "ingest")
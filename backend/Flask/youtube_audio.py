@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Audio-only YouTube downloads without the MP3 transcode.
+
+Both transcription backends accept the containers YouTube serves audio in
+(m4a/AAC and webm/Opus), so by default the best audio-only stream is kept
+as downloaded. Anything the API would not accept (e.g. a muxed video when no
+audio-only stream exists) is remuxed with `-c:a copy`; only codecs without a
+suitable container fall back to an MP3 encode.
+
+YOUTUBE_AUDIO_MODE=mp3 restores the old behaviour (192 kbps MP3 via yt-dlp's
+FFmpegExtractAudio postprocessor).
+"""
+import logging
+import os
+
+import media_tools
+from transcription_client import API_AUDIO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_AUDIO_MODE = os.getenv("YOUTUBE_AUDIO_MODE", "native").lower()  # "native" or "mp3"
+
+# Prefer audio-only streams in containers the transcription API accepts as-is
+NATIVE_FORMAT = "bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best"
+
+
+def _downloaded_path(ydl, info):
+    """Final file path of a download, as recorded by yt-dlp (after any postprocessing)."""
+    for download in info.get("requested_downloads") or []:
+        if download.get("filepath"):
+            return download["filepath"]
+    return info.get("filepath") or ydl.prepare_filename(info)
+
+
+def needs_remux(path, info):
+    """True when the file is not an audio-only file in a container the API accepts."""
+    has_video = (info.get("vcodec") or "none") != "none"
+    return has_video or os.path.splitext(path)[1].lower() not in API_AUDIO_EXTENSIONS
+
+
+def remux_audio(path, acodec, ffmpeg_bin="ffmpeg"):
+    """
+    Copies the audio stream of `path` into a container the API accepts, without
+    re-encoding when the codec allows it. Returns the new path; the input is removed.
+    """
+    output_path = media_tools.extract_audio(path, os.path.splitext(path)[0] + ".audio", acodec, ffmpeg_bin)
+    if output_path.endswith(".mp3") and not (acodec or "").startswith("mp3"):
+        logger.info("No stream-copy container for codec '%s'; encoded to MP3.", acodec)
+    os.remove(path)
+    return output_path
+
+
+def download_audio(url, output_template, ffmpeg_location=None, mode=None, quiet=False):
+    """
+    Downloads the audio of a single video to output_template (a yt-dlp outtmpl).
+    Returns (audio_path, info). Raises yt_dlp DownloadError on download failures.
+    """
+    mode = (mode or YOUTUBE_AUDIO_MODE).lower()
+    ydl_opts = {
+        "format": NATIVE_FORMAT if mode == "native" else "bestaudio/best",
+        "outtmpl": output_template,
+        "noplaylist": True,
+        "quiet": quiet,
+        "no_warnings": True,
+        "restrictfilenames": True,
+        "writethumbnail": False,
+        "keepvideo": False,
+    }
+    if mode == "mp3":
+        ydl_opts["postprocessors"] = [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",
+            "preferredquality": "192",
+        }]
+    if ffmpeg_location:
+        ydl_opts["ffmpeg_location"] = ffmpeg_location
+
+    import yt_dlp as youtube_dl  # Imported on first use; it is slow to load (see services.py)
+
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        audio_path = _downloaded_path(ydl, info)
+
+    if not audio_path or not os.path.exists(audio_path):
+        raise FileNotFoundError(f"yt-dlp reported '{audio_path}' but the file does not exist.")
+    if mode == "native" and needs_remux(audio_path, info):
+        ffmpeg_bin = ffmpeg_location if ffmpeg_location and not os.path.isdir(ffmpeg_location) else (
+            os.path.join(ffmpeg_location, "ffmpeg") if ffmpeg_location else "ffmpeg")
+        acodec = info.get("acodec")
+        if not acodec or acodec == "none":
+            # Generic extractors often do not report codecs; ask the file itself
+            acodec = media_tools.probe(audio_path)["audio_codec"]
+        logger.info("Remuxing %s (acodec=%s, vcodec=%s)", os.path.basename(audio_path), acodec, info.get('vcodec'))
+        audio_path = remux_audio(audio_path, acodec, ffmpeg_bin)
+    return audio_path, info
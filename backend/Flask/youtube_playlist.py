@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+YouTube playlist / channel enumeration and per-entry progress tracking.
+
+Entries are listed with yt-dlp's `extract_flat` mode, which only reads the
+playlist pages and never touches the media, so a channel with hundreds of
+talks is enumerated in a few requests. Channel URLs resolve to tabs
+(Videos, Live, ...) which are followed one level down.
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MAX_NESTING_DEPTH = 2  # channel -> tab -> videos
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_VIDEO_URL_RE = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|live/|embed/)|youtu\.be/)([A-Za-z0-9_-]{11})"
+)
+
+
+def youtube_video_id(url):
+    """Extracts the 11-character video id from a YouTube URL (or returns None)."""
+    if not url:
+        return None
+    if _VIDEO_ID_RE.match(url):
+        return url
+    match = _VIDEO_URL_RE.search(url)
+    return match.group(1) if match else None
+
+
+def watch_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def _is_nested_playlist(entry):
+    return entry.get("_type") == "playlist" or entry.get("ie_key") == "YoutubeTab"
+
+
+def list_playlist_entries(url, max_entries=None):
+    """
+    Lists the videos of a playlist or channel without downloading anything.
+    Returns a list of {"video_id", "title", "url", "duration"} dicts, de-duplicated
+    and in playlist order.
+    """
+    ydl_opts = {
+        "extract_flat": "in_playlist",
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+    }
+    entries = []
+    seen = set()
+
+    def collect(info, depth):
+        for entry in info.get("entries") or []:
+            if max_entries and len(entries) >= max_entries:
+                return
+            if not entry:
+                continue
+            if _is_nested_playlist(entry):
+                if depth >= MAX_NESTING_DEPTH:
+                    continue
+                if entry.get("entries") is None:
+                    entry = ydl.extract_info(entry["url"], download=False)
+                collect(entry, depth + 1)
+                continue
+            video_id = entry.get("id") or youtube_video_id(entry.get("url"))
+            if not video_id or video_id in seen:
+                continue
+            seen.add(video_id)
+            entries.append({
+                "video_id": video_id,
+                "title": entry.get("title"),
+                "url": watch_url(video_id),
+                "duration": entry.get("duration"),
+            })
+
+    import yt_dlp as youtube_dl  # Imported on first use; it is slow to load (see services.py)
+
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if info.get("_type") not in ("playlist", "multi_video"):
+            raise ValueError(f"URL is not a playlist or channel: {url}")
+        collect(info, 0)
+    return entries
+
+
+class PlaylistRun:
+    """Progress of one playlist/channel ingest: overall state plus one record per entry."""
+
+    def __init__(self, source, options):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.options = options
+        self.status = "enumerating"      # enumerating -> running -> finished | failed
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def set_entries(self, entries):
+        with self._lock:
+            self.entries = [dict(entry, index=i, status="pending", stage=None, pipeline_job_id=None,
+                                 job_id=None, error=None, stage_timings={})
+                            for i, entry in enumerate(entries)]
+
+    def update_entry(self, index, **fields):
+        with self._lock:
+            self.entries[index].update(fields)
+            entry = dict(self.entries[index])
+        logger.info("[playlist %s] entry %d/%d %s: %s%s", self.run_id, index + 1, len(self.entries),
+                    entry["video_id"], entry["status"], f" ({entry['error']})" if entry.get("error") else "")
+
+    def finish(self, status="finished", error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for entry in self.entries:
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            return counts
+
+    def to_dict(self, include_entries=True, live_job=None):
+        """live_job(pipeline_job_id) may return the PipelineJob to report its current stage."""
+        with self._lock:
+            entries = [dict(entry) for entry in self.entries]
+        if live_job:
+            for entry in entries:
+                if entry["status"] in ("queued", "running") and entry["pipeline_job_id"]:
+                    job = live_job(entry["pipeline_job_id"])
+                    if job:
+                        entry["status"] = job.status if job.status in ("queued", "running") else entry["status"]
+                        entry["stage"] = job.stage
+        payload = {
+            "playlist_run_id": self.run_id,
+            "source": self.source,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total_entries": len(entries),
+            "counts": self.counts(),
+        }
+        if include_entries:
+            payload["entries"] = entries
+        return payload
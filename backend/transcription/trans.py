@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 import os
 import sys
+import re
 import glob
 import argparse
 import subprocess
 import requests
 from datetime import datetime
-import yt_dlp as youtube_dl
-from google.cloud import translate_v2 as translate
 from dotenv import load_dotenv
 
+# Shared pipeline helpers live alongside the Flask app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Flask"))
+import vad
+import language_id
+import pipeline
+import scheduler
+import youtube_audio
+import media_tools
+import logging_setup
+import profiling
+import services
+from transcription_client import get_transcription_client, TranscriptionError
+
 load_dotenv()
 
 # --- Google Translate Setup ---
@@ -20,18 +32,12 @@ if not google_creds_path:
     google_creds_path = "/Users/tuckr/APIs/Google Cloud/swayambhu-451702-e759a9ee59ab.json"
     print("Warning: Using hardcoded Google Credentials path. Set GOOGLE_APPLICATION_CREDENTIALS env var.")
 
-if google_creds_path:
-    google_creds_path = os.path.expanduser(google_creds_path)
-    if os.path.exists(google_creds_path):
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_creds_path
-        google_client = translate.Client()
-        print(f"Using Google Credentials: {google_creds_path}")
-    else:
-        print(f"Error: Google Credentials file not found at {google_creds_path}")
-        google_client = None # Or sys.exit("Exiting: Google Credentials not found.")
-else:
-    print("Error: GOOGLE_APPLICATION_CREDENTIALS environment variable not set and no fallback path provided.")
-    google_client = None # Or sys.exit("Exiting: Google Credentials not configured.")
+# Backend calls share the host's slots with the Flask workers (Flask/scheduler.py), behind their interactive jobs
+SCHEDULER_CTX = {"priority": "bulk", "submitter": "trans.py"}
+
+# The client (and the Google SDK import) is only created when something is first translated
+translator = services.register("google_translate", lambda: services.google_translate_client(google_creds_path),
+                               required=False)
 
 
 # --- OpenAI Setup ---
@@ -51,6 +57,11 @@ def get_timestamp():
     """Generate a unique timestamp string."""
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
+def profile_job_id(source):
+    """Name of a --profile output: the input's base name plus a timestamp."""
+    base = os.path.splitext(os.path.basename(source.rstrip("/")))[0]
+    return f"{re.sub(r'[^A-Za-z0-9_-]', '_', base)[:60]}_{get_timestamp()}"
+
 def format_vtt_timestamp(seconds):
     """Convert seconds to VTT timestamp format (HH:MM:SS.mmm)."""
     hours = int(seconds // 3600)
@@ -79,7 +90,7 @@ def extract_audio_from_video(input_path):
         return output_audio_path
     print(f"Extracting audio from {input_path} to {output_audio_path}...")
     command = [
-        "ffmpeg", "-y", # Overwrite output without asking
+        media_tools.ffmpeg_bin(), "-y", # Overwrite output without asking
         "-i", input_path,
         "-vn", # No video
         "-acodec", "mp3",
@@ -103,47 +114,15 @@ def extract_audio_from_video(input_path):
 
 
 def download_audio(youtube_url):
-    """Download audio from a YouTube URL and convert it to MP3."""
-    # Define a safer filename based on URL or video ID if possible
-    # For simplicity, keeping a generic name, but could be improved
+    """Download the audio of a YouTube URL, keeping its native container (m4a/webm) when possible."""
     output_tmpl = os.path.join("audio_files", "%(title)s_%(id)s.%(ext)s")
-    mp3_output_path = "" # Will be determined after download
-
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': output_tmpl, # Template for filename
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192', # Corresponds to -ab 192k
-        }],
-        'noplaylist': True, # Prevent downloading entire playlists
-        'quiet': False, # Show yt-dlp output
-        'progress': True,
-    }
     print(f"Attempting to download YouTube audio from: {youtube_url}")
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(youtube_url, download=True)
-            # Construct the expected MP3 path based on the template and info_dict
-            base_filename = ydl.prepare_filename(info_dict).rsplit('.', 1)[0]
-            mp3_output_path = base_filename + ".mp3"
-
-        if os.path.exists(mp3_output_path):
-             print(f"Audio downloaded and saved as: {mp3_output_path}")
-             return mp3_output_path
-        else:
-             # Sometimes yt-dlp might save with slightly different name, search for the mp3
-             downloaded_files = glob.glob(os.path.join("audio_files", "*.mp3"))
-             if downloaded_files:
-                 # Assuming the latest mp3 in the folder is the one we just downloaded
-                 latest_file = max(downloaded_files, key=os.path.getctime)
-                 print(f"Audio likely saved as: {latest_file} (assuming latest)")
-                 return latest_file
-             else:
-                 print("Error: MP3 file not found after download attempt.")
-                 return None
-
+        # The output path comes from yt-dlp's info dict, no need to search the folder
+        with scheduler.backend_slot("youtube", SCHEDULER_CTX):
+            audio_path, _info = youtube_audio.download_audio(youtube_url, output_tmpl)
+        print(f"Audio downloaded and saved as: {audio_path}")
+        return audio_path
     except Exception as e:
         print(f"Error during YouTube download or processing: {e}")
         return None
@@ -152,23 +131,25 @@ def download_audio(youtube_url):
 # ---------------------
 # TRANSCRIPTION FUNCTIONS (Keep original transcribe_audio, no changes needed here)
 # ---------------------
-def transcribe_audio(audio_path, transcript_path, language_code=None, local=False):
+def transcribe_audio(audio_path, transcript_path, language_code=None, local=False, speech_regions=None,
+                     model_name="large"):
     """
     Transcribe audio and generate a VTT file.
-    When local is True, run local Whisper; otherwise, use the Whisper API.
+    When local is True, run local Whisper (model_name); otherwise, use the Whisper API.
+    speech_regions (from the VAD pre-pass) maps segment times back to the original audio.
     """
     if local:
         try:
-            import whisper # Keep import here to make local optional
             print(f"Transcribing (local) {audio_path} ...")
             # Consider smaller models for faster testing e.g., "base", "small", "medium"
-            model = whisper.load_model("large")
+            model = services.whisper_model(model_name)  # Loaded once, reused for every file of a --dir run
             # Use verbose=False for cleaner output unless debugging timestamps
-            result = model.transcribe(audio_path, word_timestamps=True, verbose=False)
+            result = model.transcribe(audio_path, language=language_code, word_timestamps=True, verbose=False)
             detected_language = result.get("language", "unknown")
             print(f"Detected language: {detected_language}")
 
             segments = result["segments"]
+            vad.remap_segments(segments, speech_regions)
             vtt_lines = ["WEBVTT", ""]
             for segment in segments:
                 start_time = format_vtt_timestamp(segment["start"])
@@ -183,9 +164,9 @@ def transcribe_audio(audio_path, transcript_path, language_code=None, local=Fals
             print(f"Saved initial VTT transcription to {temp_transcript_path}")
             return segments, detected_language, temp_transcript_path # Return path for renaming
 
-        except ImportError:
-             print("Error: 'openai-whisper' package not installed. Cannot use --local.")
-             print("Install it via: pip install -U openai-whisper")
+        except services.ServiceUnavailable as e:
+             print(f"Error: {e}. Cannot use --local.")
+             print("Is 'openai-whisper' installed? Install it via: pip install -U openai-whisper")
              return None, None, None
         except Exception as e:
             print(f"Error during local transcription: {e}")
@@ -196,29 +177,13 @@ def transcribe_audio(audio_path, transcript_path, language_code=None, local=Fals
             print("Error: OpenAI API key not set. Cannot use API transcription.")
             return None, None, None
         print(f"Transcribing via API {audio_path} ...")
-        url = "https://api.openai.com/v1/audio/transcriptions"
-        headers = {"Authorization": f"Bearer {openai_key}"}
-        data = {
-            "model": "whisper-1",
-            "response_format": "verbose_json", # Get segments and timestamps
-            # "response_format": "vtt", # Alternative: Get VTT directly
-            "timestamp_granularities": ["segment"] # Request segment-level timestamps
-        }
         if language_code:
-            data["language"] = language_code
             print(f"Using forced language for API: {language_code}")
 
         try:
-            with open(audio_path, "rb") as audio_data:
-                files = {"file": (os.path.basename(audio_path), audio_data)}
-                response = requests.post(url, headers=headers, data=data, files=files)
+            # Shared client: pooled session, connect/read timeouts and retry on 429/5xx
+            result = get_transcription_client(openai_key).transcribe(audio_path, language=language_code)
 
-            if response.status_code != 200:
-                print(f"Error: API returned status {response.status_code}")
-                print(f"Response: {response.text}")
-                return None, None, None
-
-            result = response.json()
             detected_language = result.get("language", "unknown")
             print(f"Detected language (API): {detected_language}")
             segments = result.get("segments", [])
@@ -230,6 +195,7 @@ def transcribe_audio(audio_path, transcript_path, language_code=None, local=Fals
                      print("API returned full text but no segments. Cannot create VTT.")
                      # Optionally save full text to a .txt file here
                 return None, detected_language, None # Return lang even if no segments
+            vad.remap_segments(segments, speech_regions)
 
             # --- Create VTT from verbose_json segments ---
             vtt_lines = ["WEBVTT", ""]
@@ -246,6 +212,9 @@ def transcribe_audio(audio_path, transcript_path, language_code=None, local=Fals
             print(f"Saved VTT transcription to {temp_transcript_path}")
             return segments, detected_language, temp_transcript_path # Return path
 
+        except TranscriptionError as e:
+            print(f"Error: {e}")
+            return None, None, None
         except requests.exceptions.RequestException as e:
             print(f"Network error during API transcription: {e}")
             return None, None, None
@@ -258,6 +227,7 @@ def transcribe_audio(audio_path, transcript_path, language_code=None, local=Fals
 # ---------------------
 def translate_text_google(text_list, target_language="en"):
     """Translates a list of texts using Google Translate."""
+    google_client = translator.get()
     if not google_client:
         print("Error: Google Translate client not initialized. Cannot translate.")
         return None # Indicate failure
@@ -269,11 +239,13 @@ def translate_text_google(text_list, target_language="en"):
             # Ensure all items are strings
             text_list = [str(item) for item in text_list]
             # Google Translate API handles batching internally
-            result = google_client.translate(text_list, target_language=target_language)
+            with scheduler.backend_slot("google_translate", SCHEDULER_CTX):
+                result = google_client.translate(text_list, target_language=target_language)
             # Extract translated text, handle potential errors if needed
             return [res['translatedText'] for res in result]
         else: # Single string input
-            result = google_client.translate(str(text_list), target_language=target_language)
+            with scheduler.backend_slot("google_translate", SCHEDULER_CTX):
+                result = google_client.translate(str(text_list), target_language=target_language)
             return result['translatedText']
     except Exception as e:
         print(f"Error during Google Translate API call: {e}")
@@ -404,13 +376,88 @@ def process_subtitle(vtt_file, target_lang_for_translation):
         print("Translation not requested for VTT file.")
 
 
+def transcribe_to_vtt(processed_audio_path, transcription_method=1, forced_lang_for_transcription=None, skip_silence=False):
+    """
+    Transcribe one audio file to original_<base>_<lang>.vtt.
+    Returns (segments, detected_lang, transcript_path); segments is None on failure.
+    """
+    base_name = os.path.splitext(os.path.basename(processed_audio_path))[0]
+    # Initial transcript path (before adding language code)
+    temp_transcript_path = os.path.join("transcripts", f"original_{base_name}_temp.vtt")
+
+    audio_to_transcribe = processed_audio_path
+    speech_regions = None
+    if skip_silence:
+        try:
+            audio_to_transcribe, speech_regions, vad_report = vad.prepare_speech_audio(
+                processed_audio_path, "audio_files", ffmpeg_bin=media_tools.ffmpeg_bin())
+            print(f"VAD: skipping {vad_report['skipped_fraction']:.1%} of "
+                  f"{vad_report['total_duration_sec']:.1f}s audio ({vad_report['speech_regions']} speech regions)")
+        except Exception as e:
+            print(f"Warning: VAD pre-pass failed, transcribing full audio: {e}")
+
+    # Language ID on a few sampled windows, unless --lang already says or the API transcribes (see Flask/language_id.py)
+    duration = sum(end - start for start, end in speech_regions) if speech_regions else None
+    try:
+        duration = duration or media_tools.require_audio(audio_to_transcribe)["duration_sec"]
+    except media_tools.MediaProbeError as e:
+        print(f"Warning: could not probe {audio_to_transcribe} for language ID: {e}")
+    use_local = (transcription_method == 2)
+    # One slot for the pre-pass (local runs only) and the transcription
+    with scheduler.backend_slot("whisper_local" if use_local else "openai", SCHEDULER_CTX):
+        language_plan = language_id.plan(audio_to_transcribe, duration, "large", hint=forced_lang_for_transcription,
+                                         api=not use_local, ffmpeg_bin=media_tools.ffmpeg_bin())
+        if language_plan["applied"]:
+            print(f"Language ID: {language_plan['language'] or 'inconclusive'} (top {language_plan['top_language']}, "
+                  f"confidence {language_plan['confidence']:.2f}, model {language_plan['model']})")
+
+        segments, detected_lang, temp_transcript_path_actual = transcribe_audio(
+            audio_to_transcribe,
+            temp_transcript_path,
+            language_code=language_plan["language"],
+            local=use_local,
+            speech_regions=speech_regions,
+            model_name=language_plan["model"]
+        )
+    if audio_to_transcribe != processed_audio_path and os.path.exists(audio_to_transcribe):
+        os.remove(audio_to_transcribe) # Speech-only cut is only needed for the transcription call
+
+    if segments is None or temp_transcript_path_actual is None:
+        print("Transcription failed. Cannot proceed with translation.")
+        return None, detected_lang, None
+
+    # Rename transcript file to include detected language
+    lang_code = detected_lang if isinstance(detected_lang, str) and detected_lang else "unknown"
+    final_transcript_name = f"original_{base_name}_{lang_code}.vtt"
+    final_transcript_path = os.path.join("transcripts", final_transcript_name)
+
+    try:
+        # Ensure the target directory exists
+        os.makedirs(os.path.dirname(final_transcript_path), exist_ok=True)
+        # Check if source exists before renaming
+        if os.path.exists(temp_transcript_path_actual):
+            os.rename(temp_transcript_path_actual, final_transcript_path)
+            transcript_path = final_transcript_path # Update path reference
+            print(f"Renamed transcript to: {final_transcript_name}")
+        else:
+            print(f"Warning: Temporary transcript file not found for renaming: {temp_transcript_path_actual}")
+            transcript_path = None # Indicate failure
+
+    except OSError as e:
+        print(f"Error renaming transcript file from {temp_transcript_path_actual} to {final_transcript_path}: {e}")
+        transcript_path = temp_transcript_path_actual # Keep the temp path if rename fails
+
+    return segments, detected_lang, transcript_path
+
+
 def process_audio(
     audio_method,                  # 0=video, 1=YouTube, 2=MP3, 3=VTT-only
     input_path=None,               # Path for file/video/mp3/vtt or Dir
     audio_url=None,                # URL for YouTube
     transcription_method=1,        # 1=API, 2=Local
     target_lang_for_translation=None, # NEW: Target language code ('en', 'ne', etc.) or None
-    forced_lang_for_transcription=None # Source language hint
+    forced_lang_for_transcription=None, # Source language hint
+    skip_silence=False             # Run the VAD pre-pass and only transcribe speech
 ):
     """Main processing function."""
 
@@ -452,52 +499,18 @@ def process_audio(
         return
 
     # --- Step 2: Transcription (Requires processed_audio_path) ---
-    segments = None
-    detected_lang = "unknown" # Default
-    transcript_path = None # Path to the originally generated transcript
-
-    if processed_audio_path:
-        base_name = os.path.splitext(os.path.basename(processed_audio_path))[0]
-        # Initial transcript path (before adding language code)
-        temp_transcript_path = os.path.join("transcripts", f"original_{base_name}_temp.vtt")
-
-        use_local = (transcription_method == 2)
-        segments, detected_lang, temp_transcript_path_actual = transcribe_audio(
-            processed_audio_path,
-            temp_transcript_path,
-            language_code=forced_lang_for_transcription,
-            local=use_local
-        )
-
-        if segments is None or temp_transcript_path_actual is None:
-            print("Transcription failed. Cannot proceed with translation.")
-            return
-
-        # Rename transcript file to include detected language
-        lang_code = detected_lang if isinstance(detected_lang, str) and detected_lang else "unknown"
-        final_transcript_name = f"original_{base_name}_{lang_code}.vtt"
-        final_transcript_path = os.path.join("transcripts", final_transcript_name)
-
-        try:
-            # Ensure the target directory exists
-            os.makedirs(os.path.dirname(final_transcript_path), exist_ok=True)
-            # Check if source exists before renaming
-            if os.path.exists(temp_transcript_path_actual):
-                os.rename(temp_transcript_path_actual, final_transcript_path)
-                transcript_path = final_transcript_path # Update path reference
-                print(f"Renamed transcript to: {final_transcript_name}")
-            else:
-                print(f"Warning: Temporary transcript file not found for renaming: {temp_transcript_path_actual}")
-                transcript_path = None # Indicate failure
-
-        except OSError as e:
-            print(f"Error renaming transcript file from {temp_transcript_path_actual} to {final_transcript_path}: {e}")
-            transcript_path = temp_transcript_path_actual # Keep the temp path if rename fails
-
-    else:
+    if not processed_audio_path:
         print("Error: No valid audio path obtained for transcription.")
         return
 
+    segments, detected_lang, transcript_path = transcribe_to_vtt(
+        processed_audio_path,
+        transcription_method=transcription_method,
+        forced_lang_for_transcription=forced_lang_for_transcription,
+        skip_silence=skip_silence
+    )
+    if segments is None:
+        return
 
     # --- Step 3: Translation (Requires segments) ---
     if target_lang_for_translation: # Check if a target language was provided
@@ -511,10 +524,60 @@ def process_audio(
         print("Translation not requested.")
 
 
+def process_directory_pipelined(
+    files_to_process,
+    transcription_method=1,
+    target_lang_for_translation=None,
+    forced_lang_for_transcription=None,
+    skip_silence=False,
+    jobs=2
+):
+    """
+    Process many video files with overlapping stages: while one file waits on the
+    transcription API, the next one is already being extracted with ffmpeg.
+    """
+    def extract_stage(ctx):
+        ctx["audio_path"] = extract_audio_from_video(ctx["input_path"])
+        if not ctx["audio_path"]:
+            raise RuntimeError(f"Audio extraction failed for {ctx['input_path']}")
+
+    def transcribe_stage(ctx):
+        segments, _, _ = transcribe_to_vtt(
+            ctx["audio_path"],
+            transcription_method=transcription_method,
+            forced_lang_for_transcription=forced_lang_for_transcription,
+            skip_silence=skip_silence
+        )
+        if segments is None:
+            raise RuntimeError(f"Transcription failed for {ctx['input_path']}")
+        ctx["segments"] = segments
+
+    def translate_stage(ctx):
+        if target_lang_for_translation and ctx["segments"]:
+            translate_vtt(ctx["segments"], target_lang_for_translation, source_file_path=ctx["input_path"])
+
+    stages = [
+        # ffmpeg is CPU bound: keep it near the core count; API stages mostly wait on the network
+        pipeline.Stage("extract", extract_stage, workers=min(jobs, os.cpu_count() or 1), queue_size=jobs),
+        pipeline.Stage("transcribe", transcribe_stage, workers=jobs, queue_size=jobs),
+        pipeline.Stage("translate", translate_stage, workers=jobs, queue_size=jobs),
+    ]
+    runner = pipeline.StagePipeline(stages)
+    submitted = [runner.submit({"input_path": path}, job_id=os.path.basename(path)) for path in files_to_process]
+    for job in submitted:
+        job.done.wait()
+        print(f"--- {job.job_id}: {job.status}" + (f" ({job.error})" if job.error else "") + " ---")
+    runner.shutdown()
+
+    for name, stats in runner.stats()["stages"].items():
+        print(f"Stage {name}: {stats['completed']} done, {stats['failed']} failed, avg {stats['avg_seconds']}s")
+
+
 # ---------------------
 # COMMAND-LINE INTERFACE (Updated)
 # ---------------------
 def main():
+    logging_setup.configure()  # Messages from the shared Flask-dir modules (remux, retries, ...)
     parser = argparse.ArgumentParser(
         description="Tool to process video/audio/subtitle files for transcription and translation.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter # Show defaults in help
@@ -543,6 +606,12 @@ def main():
     )
     parser.add_argument("--lang", type=str, metavar='LANG_CODE',
                          help="Hint for SOURCE language of the audio (e.g., 'en', 'ne') for transcription process. Affects Whisper API/model.")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="With --dir: number of files processed concurrently as a pipeline (1 = one at a time)")
+    parser.add_argument("--skip-silence", action="store_true",
+                        help="Detect silence with an energy-based VAD pass and only transcribe the speech regions")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample CPU stacks and trace allocations per job; writes a flamegraph and top allocations to profiles/")
 
     args = parser.parse_args()
 
@@ -619,27 +688,43 @@ def main():
             sys.exit(0) # Not an error, just nothing to do
 
         print(f"Found {len(files_to_process)} video file(s) to process.")
+        if args.jobs > 1:
+            # Stages run on pipeline worker threads: sample all of them, as one profile for the run
+            with profiling.profile_job(profile_job_id("directory"), args.profile, all_threads=True):
+                process_directory_pipelined(
+                    files_to_process,
+                    transcription_method=transcription_method,
+                    target_lang_for_translation=target_lang_for_translation,
+                    forced_lang_for_transcription=forced_lang_for_transcription,
+                    skip_silence=args.skip_silence,
+                    jobs=args.jobs
+                )
+            return
         for file_path in files_to_process:
             print(f"\n--- Processing file: {os.path.basename(file_path)} ---")
             # Call process_audio for each file in the directory
+            with profiling.profile_job(profile_job_id(file_path), args.profile):
+                process_audio(
+                    audio_method=0, # It's a video file
+                    input_path=file_path,
+                    transcription_method=transcription_method,
+                    target_lang_for_translation=target_lang_for_translation,
+                    forced_lang_for_transcription=forced_lang_for_transcription,
+                    skip_silence=args.skip_silence
+                )
+            print(f"--- Finished processing: {os.path.basename(file_path)} ---")
+
+    else: # Single File or URL Processing
+        with profiling.profile_job(profile_job_id(input_path or "youtube"), args.profile):
             process_audio(
-                audio_method=0, # It's a video file
-                input_path=file_path,
+                audio_method=audio_method,
+                input_path=input_path, # Will be None if method is 1 (youtube)
+                audio_url=audio_url,   # Will be None if method is 0, 2 or 3
                 transcription_method=transcription_method,
                 target_lang_for_translation=target_lang_for_translation,
-                forced_lang_for_transcription=forced_lang_for_transcription
+                forced_lang_for_transcription=forced_lang_for_transcription,
+                skip_silence=args.skip_silence
             )
-            print(f"--- Finished processing: {os.path.basename(file_path)} ---")
-
-    else: # Single File or URL Processing
-        process_audio(
-            audio_method=audio_method,
-            input_path=input_path, # Will be None if method is 1 (youtube)
-            audio_url=audio_url,   # Will be None if method is 0, 2 or 3
-            transcription_method=transcription_method,
-            target_lang_for_translation=target_lang_for_translation,
-            forced_lang_for_transcription=forced_lang_for_transcription
-        )
 
 if __name__ == "__main__":
     main()